@@ -0,0 +1,180 @@
+"""Evaluation harness of the diff scripts: runs Meteor on the evaluation files in parallel,
+and writes their results as JSON lines
+
+Each line is the record of a document: its id (the number in the file name), a hash of its
+content and of the Meteor code that processed it, and its results or error. Records are
+appended as soon as they are ready, so that an interrupted run is resumed where it stopped,
+and documents are only run again when they or the code of Meteor changed. At the end of a
+run, the file is rewritten in the order of document ids, with the last record of each
+document only.
+"""
+
+
+import functools
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, NotRequired, Optional, TypedDict
+
+import metadata_extract
+from metadata_extract.metadata import Results
+from metadata_extract.meteor import Meteor
+from metadata_extract.meteor_document import PageWindow
+from metadata_extract.snapshot import snapshot_of
+from src.scan import Scanner
+from src.worker_pool import WorkerPool
+
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class ResultRecord(TypedDict):
+    """Results or error of Meteor for an evaluation document"""
+    doc_id: int
+    hash: str
+    metadata: NotRequired[Results]
+    error: NotRequired[str]
+
+
+class RunCounts(NamedTuple):
+    """Number of documents run, of documents whose records were reused, and of errors"""
+    processed: int
+    reused: int
+    errors: int
+
+
+class SnapshotMeteor(Meteor):
+    """Meteor running from snapshots of the files, taken on first use"""
+
+    def __init__(self, snapshot_dir: str) -> None:
+        super().__init__()
+        self.snapshot_dir = snapshot_dir
+
+    def run(self, file_path: str, trace: bool = False,
+            window: Optional[PageWindow] = None) -> Results:
+        return super().run(snapshot_of(file_path, self.snapshot_dir), trace=trace, window=window)
+
+
+def create_meteor(snapshot_dir: Optional[str] = None) -> Meteor:
+    return SnapshotMeteor(snapshot_dir) if snapshot_dir else Meteor()
+
+
+def update_hash(digest: 'hashlib._Hash', path: Path) -> None:
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+
+def code_version() -> str:
+    """Returns a hash of the source and data files of the metadata_extract package"""
+    digest = hashlib.sha256()
+    package_dir = Path(metadata_extract.__file__).parent
+    for path in sorted(package_dir.rglob('*')):
+        if path.is_file() and '__pycache__' not in path.parts:
+            digest.update(str(path.relative_to(package_dir)).encode())
+            update_hash(digest, path)
+    return digest.hexdigest()
+
+
+def document_hash(path: str, version: str) -> str:
+    """Returns a hash of the document at path (a file, or a directory of files) and of the
+    version of Meteor"""
+    digest = hashlib.sha256(version.encode())
+    paths = sorted(Path(path).iterdir()) if os.path.isdir(path) else [Path(path)]
+    for file_path in paths:
+        digest.update(file_path.name.encode())
+        update_hash(digest, file_path)
+    return digest.hexdigest()
+
+
+def document_ids(folder: str) -> dict[int, str]:
+    """Returns the paths of the evaluation documents of folder by document id"""
+    documents = {}
+    for name in sorted(os.listdir(folder)):
+        try:
+            documents[int(name.split('.')[0])] = os.path.join(folder, name)
+        except ValueError:
+            print(f"Skipping file {name}, its name is not a document id")
+    return documents
+
+
+def read_records(path: str) -> dict[int, ResultRecord]:
+    """Returns the records of the JSON lines file at path by document id, the last record of
+    a document replacing earlier ones. An incomplete last line, from an interrupted run, is
+    removed."""
+    records: dict[int, ResultRecord] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r+', encoding='utf-8') as file:
+        position = 0
+        for line in iter(file.readline, ''):
+            try:
+                record: ResultRecord = json.loads(line)
+                records[record['doc_id']] = record
+            except (ValueError, KeyError):
+                file.truncate(position)
+                break
+            position = file.tell()
+    return records
+
+
+def write_records(path: str, records: dict[int, ResultRecord]) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        for doc_id in sorted(records):
+            file.write(json.dumps(records[doc_id], ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def run_documents(ids_by_path: dict[str, int],  # pylint: disable=too-many-arguments
+                  hashes: dict[int, str],
+                  records: dict[int, ResultRecord],
+                  output: str, jobs: int,
+                  snapshot_dir: Optional[str]) -> int:
+    """Runs Meteor on the documents, adds their records to records and appends them to output
+    as they are ready, returns the number of errors"""
+    errors = 0
+    pool = WorkerPool(size=jobs, create_meteor=functools.partial(create_meteor, snapshot_dir))
+    try:
+        with open(output, 'a', encoding='utf-8') as file:
+            for result in Scanner(pool.run, workers=jobs).process_all(ids_by_path):
+                doc_id = ids_by_path[result['path']]
+                record = ResultRecord(doc_id=doc_id, hash=hashes[doc_id])
+                if 'error' in result:
+                    # Some files might be corrupted and not return a response
+                    # They are recorded with their error and not included in the diff
+                    print(f"Error while processing file {result['path']}: {result['error']}")
+                    record['error'] = result['error']
+                    errors += 1
+                else:
+                    print(f"Processed file {result['path']}")
+                    record['metadata'] = result['results']
+                records[doc_id] = record
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                file.flush()
+    finally:
+        pool.close()
+    return errors
+
+
+def evaluate(folder: str, output: str, jobs: int,
+             snapshot_dir: Optional[str] = None) -> RunCounts:
+    """Runs Meteor with jobs worker processes on the documents of folder that changed since
+    their records in output were written, and updates output"""
+    version = code_version()
+    documents = document_ids(folder)
+    records = read_records(output)
+    with ThreadPoolExecutor(jobs) as executor:
+        hashes = dict(zip(documents, executor.map(
+            functools.partial(document_hash, version=version), documents.values())))
+    records = {doc_id: record for doc_id, record in records.items()
+               if hashes.get(doc_id) == record['hash']}
+    ids_by_path = {path: doc_id for doc_id, path in documents.items() if doc_id not in records}
+    reused = len(records)
+    errors = 0
+    if ids_by_path:
+        errors = run_documents(ids_by_path, hashes, records, output, jobs, snapshot_dir)
+    write_records(output, records)
+    return RunCounts(processed=len(ids_by_path), reused=reused, errors=errors)
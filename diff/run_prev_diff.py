@@ -2,45 +2,37 @@
 
 This script has to be executed with the previous version of Meteor, i.e.
 without the new feature being developed.
+With a snapshot directory, Meteor runs from snapshots of the files, taken on first use.
+Documents are run in parallel, and only when they or Meteor changed since the last run.
 """
 
 
 # pylint: disable=wrong-import-position, wrong-import-order
 
-import json
+import argparse
 import os
 import sys
+from typing import Optional
 from decouple import config
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from metadata_extract.meteor import Meteor  # noqa: E402
+from harness import evaluate  # noqa: E402
 
 
-# pylint: disable=broad-exception-caught, duplicate-code
-def create_previous_version_json() -> None:
-    meteor = Meteor()
-    response_data = []
-    pdf_folder_path = config('DIFF_FILES_FOLDER')
-    pdf_files = os.listdir(pdf_folder_path)
+PREVIOUS_RESULTS = 'diff/previous_results.jsonl'
 
-    for file in pdf_files:
-        print(f"Processing file {file}")
-        try:
-            response = meteor.run(pdf_folder_path + "/" + file)
-        except Exception as ex:
-            print(f"Error while processing file {file}: {ex}")
-            continue
-        result = {
-            'doc_id': int(file.split(".")[0]),
-            'metadata': response
-        }
-        response_data.append(result)
 
-    with open('diff/previous_results.json', 'w', encoding="UTF-8") as previous_results_file:
-        json.dump(response_data, previous_results_file, ensure_ascii=False, indent=2)
+def create_previous_version_json(jobs: int, snapshot_dir: Optional[str] = None) -> None:
+    counts = evaluate(config('DIFF_FILES_FOLDER'), PREVIOUS_RESULTS, jobs, snapshot_dir)
+    print(f"{counts.processed} files processed ({counts.errors} errors), "
+          f"{counts.reused} unchanged")
 
 
 if __name__ == '__main__':
-    create_previous_version_json()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--snapshots')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    create_previous_version_json(args.jobs, args.snapshots)
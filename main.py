@@ -1,9 +1,14 @@
 """Main module for FastAPI service"""
 
 
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
 import markdown
 from fastapi import FastAPI, Request, APIRouter
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from secure import secure
@@ -11,17 +16,45 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import Response
 
+from src import metrics
 from src.routes import extract
+from src.settings import get_settings
 from src.util import Utils
+from src.watcher import Watcher
 
 SWAGGER_URL = f"{Utils.get_environment_prefix()}/swagger-ui"
 allowed_origins = ["https://*.nb.no*", "http://*.nb.no*"]
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    watcher = None
+    if get_settings().WATCH_MOUNT_FOLDER and extract.utils.result_cache:
+        watcher = Watcher(
+            get_settings().MOUNT_FOLDER,
+            cache=extract.utils.result_cache,
+            create_meteor=Utils.create_meteor,
+            interval=get_settings().WATCH_INTERVAL_SECONDS,
+            is_busy=lambda: extract.admission.busy,
+            niceness=get_settings().WATCH_NICENESS,
+            timeout=get_settings().EXTRACTION_TIMEOUT_SECONDS,
+            # Only one of the processes sharing the result cache watches the folder
+            lock_file=get_settings().RESULT_CACHE_FILE + '.watcher.lock'
+        )
+        watcher.start()
+    yield
+    if watcher:
+        watcher.stop()
+    await extract.utils.fetcher.close()
+    metrics.mark_process_dead(os.getpid())
+
+
 app = FastAPI(
     title="METEOR",
     description="API documentation for METEOR",
     docs_url=SWAGGER_URL,
-    openapi_url=f"{Utils.get_environment_prefix()}/openapi.json"
+    openapi_url=f"{Utils.get_environment_prefix()}/openapi.json",
+    lifespan=lifespan
 )
 app.mount(
     f"{Utils.get_environment_prefix()}/static",
@@ -38,6 +71,42 @@ app.include_router(router=router)
 templates = Jinja2Templates(directory="templates")
 
 
+@app.middleware("http")
+async def record_request_metrics(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label with the route template, not the actual path, to keep cardinality low
+        route = request.scope.get('route')
+        endpoint = getattr(route, 'path', 'unmatched')
+        metrics.observe_request(request.method, endpoint, status, time.perf_counter() - start)
+
+
+@app.get(f"{Utils.get_environment_prefix()}/metrics", tags=["Monitoring"])
+def get_metrics() -> Response:
+    return Response(metrics.generate_latest(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get(f"{Utils.get_environment_prefix()}/health/live", tags=["Monitoring"])
+def get_liveness() -> dict[str, str]:
+    return {'status': 'ok'}
+
+
+@app.get(f"{Utils.get_environment_prefix()}/health/ready", tags=["Monitoring"])
+def get_readiness() -> Response:
+    """Ready once all extraction workers are warmed up"""
+    if not extract.utils.pool.ready:
+        return JSONResponse({'status': 'warming up'}, status_code=503)
+    return JSONResponse({'status': 'ok'})
+
+
 @app.get(f"{Utils.get_environment_prefix()}/doc", tags=["Documentation"])
 def get_documentation(request: Request) -> Response:
     doc_text = "\n"
@@ -80,5 +149,6 @@ def display_error_message_in_template(request: Request, exc: StarletteHTTPExcept
             },
             "root_path": Utils.get_environment_prefix()
         },
-        status_code=exc.status_code
+        status_code=exc.status_code,
+        headers=exc.headers
     )
@@ -0,0 +1,95 @@
+"""This module selects the page files of ALTO documents
+
+When the document has a METS file, its physical structure map gives the page files and their
+order. Otherwise, page numbers are read from the file names. Only the first and last pages
+are selected, without sorting all the files.
+"""
+
+
+import heapq
+import posixpath
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import IO, Iterable, Optional, TypeVar, Union
+
+from .archive import is_alto_file
+
+
+T = TypeVar('T')
+
+METS_FILE_NAMES = ['METS.xml', 'mets.xml']
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def local_name(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+
+def find_mets(directory: Path) -> Optional[Path]:
+    for name in METS_FILE_NAMES:
+        if (directory / name).is_file():
+            return directory / name
+    return None
+
+
+def page_number(file_name: str) -> Optional[int]:
+    """Returns the page number written in the last 4 characters of the file name, before
+    its extensions, or None for other files"""
+    digits = file_name.split('.')[0][-4:]
+    return int(digits) if len(digits) == 4 and digits.isdigit() else None
+
+
+def relative_location(href: str) -> str:
+    """Returns the normalized location of a METS file reference, which must be a path
+    relative to the METS file, without going out of its directory. Other locations (absolute
+    paths, file URLs to other directories, URLs) are rejected with a ValueError, so that METS
+    files cannot make Meteor read files out of the document."""
+    location = posixpath.normpath(href.removeprefix('file://'))
+    if posixpath.isabs(location) or location.split('/')[0] == '..' or '://' in location:
+        raise ValueError(f'METS file location out of the document: {href}')
+    return location
+
+
+def read_mets(source: Union[Path, IO[bytes]]) -> list[tuple[int, str]]:
+    """Returns the page numbers (ORDER attributes) and ALTO file locations, relative to the
+    METS file, of the pages in the physical structure map. Raises ValueError for locations
+    out of the directory of the METS file."""
+    root = ET.parse(source).getroot()
+    locations: dict[str, str] = {}
+    for file in root.iter():
+        if local_name(file.tag) != 'file':
+            continue
+        for flocat in file:
+            if local_name(flocat.tag) == 'FLocat':
+                href = flocat.get(XLINK_HREF) or flocat.get('href') or ''
+                locations[file.get('ID', '')] = href
+                break
+    struct_map = next((element for element in root.iter()
+                       if local_name(element.tag) == 'structMap'
+                       and element.get('TYPE', '').upper() == 'PHYSICAL'), None)
+    if struct_map is None:
+        return []
+    pages: list[tuple[int, str]] = []
+    divs = (div for div in struct_map.iter()
+            if local_name(div.tag) == 'div' and div.get('TYPE', '').lower() == 'page')
+    for index, div in enumerate(divs, start=1):
+        file_ids = (element.get('FILEID', '') for fptr in div
+                    if local_name(fptr.tag) == 'fptr' for element in fptr.iter())
+        alto_files = (locations[file_id] for file_id in file_ids
+                      if is_alto_file(locations.get(file_id, '')))
+        location = next(alto_files, None)
+        if location:
+            order = div.get('ORDER', '')
+            pages.append((int(order) if order.isdigit() else index,
+                          relative_location(location)))
+    return pages
+
+
+def select_pages(pages: Iterable[tuple[int, T]], start: int, end: int) -> list[tuple[int, T]]:
+    """Returns the first start and last end pages, in page order. All pages are returned if
+    there are fewer than start + end."""
+    pages = list(pages)
+    if len(pages) < start + end:
+        return sorted(pages, key=lambda page: page[0])
+    return heapq.nsmallest(start, pages, key=lambda page: page[0]) \
+        + heapq.nlargest(end, pages, key=lambda page: page[0])[::-1]
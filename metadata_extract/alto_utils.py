@@ -1,10 +1,12 @@
 """This module provides some text extraction methods from ALTO files"""
 
 
+import gzip
 import xml.etree.ElementTree as ET
 from functools import reduce
 from pathlib import Path
-from typing import Optional, TypedDict
+from typing import IO, Optional, TypedDict, Union, cast
+from .archive import is_gzipped
 from .models import SpanType
 
 
@@ -18,16 +20,179 @@ class BlockType(TypedDict):
     style: Optional[str]
 
 
+# Spans (text, bbox, style reference) and lines of text read from a part of a space
+SpanRefs = list[tuple[str, tuple[float, float, float, float], str]]
+PartLines = tuple[SpanRefs, list[str]]
+
+
+class AltoReader:  # pylint: disable=too-many-instance-attributes
+    """Parser target reading the styles, spans and full text of an ALTO file in a single
+    pass, without building its tree: words are merged as they are read, and only the
+    current line is kept. Gives the same results as AltoFile.parse_blocks.
+
+    As in AltoFile.get_styles and AltoFile.get_all_blocks, only the first Styles, Layout and
+    Page elements and the first space of each kind are read, and the blocks of a space are
+    read before the blocks of its composed blocks, in the order of AltoFile.SPACES.
+    """
+
+    # Roles of the elements that are read, from their parent's role and their tag
+    ROLES = {
+        ('root', 'Styles'): 'styles',
+        ('styles', 'TextStyle'): 'text_style',
+        ('root', 'Layout'): 'layout',
+        ('layout', 'Page'): 'page',
+        ('space', 'TextBlock'): 'block',
+        ('space', 'ComposedBlock'): 'composed_block',
+        ('composed_block', 'TextBlock'): 'composed_text_block',
+        ('block', 'TextLine'): 'line',
+        ('composed_text_block', 'TextLine'): 'line'
+    }
+    FIRST_ONLY = ('styles', 'layout', 'page', 'space')
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self) -> None:
+        self.styles: dict[str, dict[str, str]] = {'default': AltoFile.DEFAULT_STYLE}
+        # For each space, (text, bbox, style ref) of spans and lines, of its blocks and of
+        # the blocks in its composed blocks
+        self.spaces: dict[str, tuple[PartLines, PartLines]] = {
+            space: (([], []), ([], [])) for space in AltoFile.SPACES
+        }
+        self.current: PartLines = ([], [])
+        self.space = self.spaces['PrintSpace']
+        self.roles: list[Optional[str]] = []
+        self.seen: set[str] = set()
+        self.names: dict[str, str] = {}
+        self.block_style_ref = 'default'
+        self.texts: list[str] = []
+        self.bboxes: list[list[float]] = []
+        self.style_refs: list[Optional[str]] = []
+
+    @staticmethod
+    def read(source: Union[Path, IO[bytes]]
+             ) -> tuple[dict[str, dict[str, str]], list[SpanType], str]:
+        if isinstance(source, Path):
+            with AltoFile.open(source) as file:
+                return AltoReader.read(file)
+        reader = AltoReader()
+        parser = ET.XMLParser(target=reader)
+        while chunk := source.read(AltoReader.CHUNK_SIZE):
+            parser.feed(chunk)
+        parser.close()
+        return reader.results()
+
+    def local_name(self, tag: str) -> str:
+        if tag not in self.names:
+            self.names[tag] = tag.rpartition('}')[2]
+        return self.names[tag]
+
+    def start(self, tag: str, attrib: dict[str, str]) -> None:
+        if not self.roles:
+            self.roles.append('root')
+            return
+        parent_role = self.roles[-1]
+        if parent_role is None:
+            self.roles.append(None)
+            return
+        name = self.names.get(tag) or self.local_name(tag)
+        # Words are by far the most frequent elements
+        if parent_role == 'line':
+            if name == 'String':
+                self.roles.append('string')
+                self.add_word(attrib)
+            else:
+                self.roles.append(None)
+            return
+        if parent_role == 'page' and name in AltoFile.SPACES:
+            role: Optional[str] = 'space'
+        else:
+            role = AltoReader.ROLES.get((parent_role, name))
+        if role in AltoReader.FIRST_ONLY:
+            if name in self.seen:
+                role = None
+            self.seen.add(name)
+        self.roles.append(role)
+        self.enter(role, name, attrib)
+
+    def enter(self, role: Optional[str], name: str, attrib: dict[str, str]) -> None:
+        if role == 'line':
+            self.texts, self.bboxes, self.style_refs = [], [], []
+        elif role in ('block', 'composed_text_block'):
+            self.current = self.space[0] if role == 'block' else self.space[1]
+            self.block_style_ref = attrib.get('STYLEREFS', 'default')
+        elif role == 'space':
+            self.space = self.spaces[name]
+        elif role == 'text_style':
+            self.styles[attrib['ID']] = {
+                'font': attrib['FONTFAMILY'],
+                'fontsize': attrib['FONTSIZE']
+            }
+
+    def end(self, _: str) -> None:
+        if self.roles.pop() == 'line':
+            for text, bbox, style_ref in zip(self.texts, self.bboxes, self.style_refs):
+                self.current[0].append((text, (bbox[0], bbox[1], bbox[2], bbox[3]),
+                                        style_ref or self.block_style_ref))
+            self.current[1].append(' '.join(self.texts))
+
+    def add_word(self, attrib: dict[str, str]) -> None:
+        """Adds a word to the current line, merged with the previous one as in
+        AltoFile.merge"""
+        text = attrib['CONTENT']
+        bbox = AltoFile.position(attrib)
+        if self.bboxes and bbox[0] - self.bboxes[-1][2] < AltoFile.MAX_SPACING:
+            last = self.bboxes[-1]
+            last[1] = min(bbox[1], last[1])
+            last[2] = bbox[2]
+            last[3] = max(bbox[3], last[3])
+            self.texts[-1] += ' ' + text
+        else:
+            self.texts.append(text)
+            self.bboxes.append(bbox)
+            self.style_refs.append(attrib.get('STYLEREFS'))
+
+    def results(self) -> tuple[dict[str, dict[str, str]], list[SpanType], str]:
+        """Returns styles, spans and full text. Styles are only resolved at the end, since
+        they could come after the layout."""
+        spans: list[SpanType] = []
+        lines: list[str] = []
+        for parts in self.spaces.values():
+            for part_spans, part_lines in parts:
+                for text, bbox, style_ref in part_spans:
+                    style = self.styles[style_ref.split()[0]]
+                    spans.append({
+                        'text': text,
+                        'bbox': bbox,
+                        'font': style['font'],
+                        'size': float(style['fontsize'])
+                    })
+                lines.extend(part_lines)
+        return self.styles, spans, '\n'.join(lines)
+
+
 class AltoFile:
-    """Parses and stores the text content of an ALTO file"""
+    """Parses and stores the text content of an ALTO file
+
+    By default, the file is read in a single pass by AltoReader. With streaming set to
+    False, the whole tree is parsed and then walked, giving the same spans and text.
+    Namespaced ALTO files are read as unnamespaced ones.
+    """
 
     MAX_SPACING = 80  # Arbitrary value...
     SPACES = ['TopMargin', 'LeftMargin', 'RightMargin', 'BottomMargin', 'PrintSpace']
     DEFAULT_STYLE = {'font': 'default', 'fontsize': '1'}
 
-    def __init__(self, path: Path) -> None:
-        tree = ET.parse(path)
+    def __init__(self, source: Union[Path, IO[bytes]], streaming: bool = True) -> None:
+        if streaming:
+            self.styles, self.spans, self.full_text = AltoReader.read(source)
+            return
+        if isinstance(source, Path):
+            with AltoFile.open(source) as file:
+                tree = ET.parse(file)
+        else:
+            tree = ET.parse(source)
         self.root = tree.getroot()
+        for element in self.root.iter():
+            element.tag = element.tag.rpartition('}')[2]
         self.styles = self.get_styles()
         self.blocks = self.get_all_blocks()
         self.spans, self.full_text = self.parse_blocks()
@@ -92,20 +257,31 @@ class AltoFile:
             'size': float(style['fontsize'])
         }
 
+    @staticmethod
+    def open(path: Path) -> IO[bytes]:
+        """Opens an ALTO file, decompressed if it is a gzip file"""
+        if is_gzipped(path.name):
+            return cast(IO[bytes], gzip.open(path))
+        return open(path, 'rb')
+
     @staticmethod
     def get_position(element: ET.Element) -> list[float]:
+        return AltoFile.position(element.attrib)
+
+    @staticmethod
+    def position(attrib: dict[str, str]) -> list[float]:
         """Converts positions written as string-values HPOS/VPOS/WIDTH/HEIGHT to
         float-valued bounding-box [x0,y0,x1,y1]"""
 
         for att in ['HPOS', 'VPOS', 'WIDTH', 'HEIGHT']:
-            if att not in element.attrib:
+            if att not in attrib:
                 raise ValueError(f'Attribute {att} missing, cannot make bbox')
 
         return [
-            float(element.attrib['HPOS']),
-            float(element.attrib['VPOS']),
-            float(element.attrib['HPOS']) + float(element.attrib['WIDTH']),
-            float(element.attrib['VPOS']) + float(element.attrib['HEIGHT'])
+            float(attrib['HPOS']),
+            float(attrib['VPOS']),
+            float(attrib['HPOS']) + float(attrib['WIDTH']),
+            float(attrib['VPOS']) + float(attrib['HEIGHT'])
         ]
 
     @staticmethod
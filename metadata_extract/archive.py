@@ -0,0 +1,88 @@
+"""This module reads documents from ZIP and TAR archives and from gzip files
+
+Members are decompressed as they are read, archives are never unpacked to disk.
+"""
+
+
+import gzip
+import tarfile
+import zipfile
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Callable, Optional, Self, Type, TypeVar, cast
+
+
+T = TypeVar('T')
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+ALTO_SUFFIXES = ('.xml', '.xml.gz')
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_alto_file(name: str) -> bool:
+    return name.lower().endswith(ALTO_SUFFIXES)
+
+
+def is_gzipped(name: str) -> bool:
+    return name.lower().endswith('.gz')
+
+
+def decompressed(file: IO[bytes], name: str) -> IO[bytes]:
+    """Returns a file object decompressing file if name is a gzip file name"""
+    return cast(IO[bytes], gzip.GzipFile(fileobj=file, mode='rb')) if is_gzipped(name) else file
+
+
+class Archive:
+    """A ZIP or TAR archive (compressed or not), opened for reading its member files.
+    Archives are context managers."""
+
+    def __init__(self, path: Path) -> None:
+        self.zip: Optional[zipfile.ZipFile] = None
+        self.tar: Optional[tarfile.TarFile] = None
+        if zipfile.is_zipfile(path):
+            self.zip = zipfile.ZipFile(path)  # pylint: disable=consider-using-with
+            self.members = [info.filename for info in self.zip.infolist() if not info.is_dir()]
+        else:
+            self.tar = tarfile.open(path, 'r:*')  # pylint: disable=consider-using-with
+            self.members = [member.name for member in self.tar.getmembers() if member.isfile()]
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc_val: Optional[BaseException],
+                 exc_tb: Optional[TracebackType]) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.zip:
+            self.zip.close()
+        if self.tar:
+            self.tar.close()
+
+    def open(self, name: str) -> IO[bytes]:
+        if self.zip:
+            return self.zip.open(name)
+        file = self.tar.extractfile(name) if self.tar else None
+        if not file:
+            raise KeyError(name)
+        return file
+
+    def read(self, name: str) -> bytes:
+        """Returns the content of a member file, decompressed if it is a gzip file"""
+        with self.open(name) as file:
+            return decompressed(file, name).read()
+
+    def read_all(self, names: list[str], read: Callable[[IO[bytes]], T]) -> list[T]:
+        """Reads the member files, decompressed if they are gzip files, with read, and
+        returns the results in the order of names. Members are read in archive order, so
+        that compressed TAR archives are not read backwards."""
+        positions = {name: position for position, name in enumerate(self.members)}
+        results: dict[str, T] = {}
+        for name in sorted(names, key=positions.__getitem__):
+            with self.open(name) as file:
+                results[name] = read(decompressed(file, name))
+        return [results[name] for name in names]
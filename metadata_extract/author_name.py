@@ -68,8 +68,8 @@ def split_author_string(author_text: str) -> list[str]:
 
 def remove_duplicate_names(authors: list[str]) -> list[str]:
     """If a name is present multiple times per page it will be added multiple times to the list
-    This function removes all duplicate names"""
-    authors = list(set(authors))
+    This function removes all duplicate names, keeping the order of the first ones"""
+    authors = list(dict.fromkeys(authors))
     return authors
 
 
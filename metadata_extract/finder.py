@@ -3,10 +3,9 @@
 
 # pylint: disable=broad-exception-caught
 
+import time
 import traceback
 from typing import TypedDict, NotRequired, Optional, Callable
-from dateutil.parser import parse
-from dateparser.search import search_dates
 from . import text, author_name
 from .candidate import Candidate, Origin
 from .infopage import InfoPage
@@ -14,6 +13,7 @@ from .metadata import Metadata
 from .meteor_document import MeteorDocument
 from .registry import PublisherRegistry, RegistryType
 from .resource_loader import ResourceLoader
+from .trace import Tracer
 
 
 class CopyrightType(TypedDict):
@@ -27,30 +27,63 @@ class Finder:
 
     The only method called from outside is finder.extract_metadata, which calls
     all the inner methods in a defined order.
+
+    Unless exhaustive is set, heuristics that can no longer change the chosen value
+    of a field (see is_decided) are skipped. Each of them is run as a stage of the tracer.
+
+    When more pages of the document are read, extract_from_pages runs the heuristics that
+    search all pages on the new pages, for the required fields that are still missing.
     """
 
-    def __init__(self, doc: MeteorDocument,
+    REQUIRED_FIELDS = ['ISBN', 'publisher', 'year']
+
+    def __init__(self, doc: MeteorDocument,  # pylint: disable=too-many-arguments
                  registry: Optional[PublisherRegistry],
-                 detect_language: Callable[[str], Optional[str]]):
+                 detect_language: Callable[[str], Optional[str]],
+                 exhaustive: bool = False,
+                 tracer: Optional[Tracer] = None):
         self.doc = doc
         self.registry = registry
         self.detect_language = detect_language
+        self.exhaustive = exhaustive
+        self.tracer = tracer or Tracer(enabled=False)
         self.metadata = Metadata()
+        # Pages searched by the heuristics, all pages read except in extract_from_pages
+        self.pages = doc.pages
+
+    def is_decided(self, field: str) -> bool:
+        """Returns True if the candidates found so far already determine the value chosen
+        for `field`, meaning that heuristics only adding candidates for it can be skipped.
+        Always False in exhaustive mode."""
+        if self.exhaustive:
+            return False
+        if field == 'publisher' and not self.registry:
+            # Without registry, the first publisher candidate is always chosen
+            return 'publisher' in self.metadata.candidates
+        return self.metadata.is_final(field)
 
     def search_in_registry(self, name: str) -> list[RegistryType]:
         if not self.registry:
             return []
+        start = time.perf_counter()
         try:
             return self.registry.search(name)
         except Exception:
             print(traceback.format_exc())
             return []
+        finally:
+            self.tracer.count_registry_call(time.perf_counter() - start)
 
     def find_report_prefix(self) -> None:
-        """Looks in all pages for mention of publisher in the format <name>-report."""
-        for page_number in self.doc.pages:
+        """Looks in all pages for mention of publisher in the format <name>-report.
+        Text blocks are only extracted for the pages whose text contains the label."""
+        for page_number, page_text in self.pages.items():
+            if not text.report_label().search(page_text):
+                continue
             page = self.doc.get_page_object(page_number)
             for line in page.text_blocks:
+                if self.is_decided('publisher'):
+                    return
                 report_prefix = text.find_report_prefix(line.text)
                 if report_prefix:
                     if self.metadata.has_publisher(report_prefix):
@@ -78,7 +111,7 @@ class Finder:
 
     def find_isxn(self, identifier: str) -> None:
         """Looks for ISXN numbers in all pages."""
-        for number, page in self.doc.pages.items():
+        for number, page in self.pages.items():
             if identifier not in page:
                 continue
             page_object = self.doc.get_page_object(number)
@@ -93,7 +126,9 @@ class Finder:
     def find_publisher(self) -> None:
         """Looks in all pages for a publisher label, and adds associated value as a candidate.
         Returns after first value is found."""
-        for number, page in self.doc.pages.items():
+        if self.is_decided('publisher'):
+            return
+        for number, page in self.pages.items():
             for line in page.split('\n'):
                 match = text.publisher_label().match(line)
                 if match is not None:
@@ -138,15 +173,18 @@ class Finder:
 
     def parse_copyright(self) -> None:
         """Looks for a © symbol in all pages, then parses it as publisher name and year."""
-        for number, page in self.doc.pages.items():
+        for number, page in self.pages.items():
             for line in page.split('\n'):
+                if self.is_decided('year') and self.is_decided('publisher'):
+                    return
                 if '©' in line:
                     clean_line = text.clean_whitespace(line[line.index('©')+1:])
                     result = self.parse_copyright_line(clean_line)
                     if 'year' in result:
                         candidate = Candidate(result['year'], Origin.COPYRIGHT, page_nr=number)
                         self.metadata.add_candidate('year', candidate)
-                    if result['publisher'] and not self.metadata.has_publisher(result['publisher']):
+                    if result['publisher'] and not self.is_decided('publisher') \
+                       and not self.metadata.has_publisher(result['publisher']):
                         publisher = Candidate(result['publisher'], Origin.COPYRIGHT,
                                               page_nr=number)
                         publisher.reg_entries = self.search_in_registry(result['publisher'])
@@ -154,6 +192,8 @@ class Finder:
 
     def parse_copyright_line(self, copyright_line: str) -> CopyrightType:
         """Parses the ©-string as publisher name and year."""
+        # dateparser takes a while to import, only do it when a copyright line is found
+        from dateparser.search import search_dates  # pylint: disable=import-outside-toplevel
         result: CopyrightType = {'publisher': ''}
         found_date = search_dates(copyright_line, settings={'REQUIRE_PARTS': ['year']})
         if found_date is None:
@@ -202,6 +242,7 @@ class Finder:
         """Adds the PDF info modDate, or creationDate, as a candidate if it can be found in text."""
         if not self.doc.pdfinfo:
             return
+        from dateutil.parser import parse  # pylint: disable=import-outside-toplevel
         year = None
         if self.doc.pdfinfo['modDate']:
             year = parse(self.doc.pdfinfo['modDate'][2:14]).year
@@ -210,7 +251,7 @@ class Finder:
         if year is None:
             return
         found_on_page = 0
-        for number, page in self.doc.pages.items():
+        for number, page in self.pages.items():
             if str(year) in page:
                 found_on_page = number
                 break
@@ -234,11 +275,11 @@ class Finder:
         if not infopagenr:
             return
         infopage = InfoPage(self.doc.get_page_object(infopagenr))
-        title = infopage.find_title()
+        title = infopage.find_title() if not self.is_decided('title') else None
         if title:
             candidate = Candidate(title, Origin.INFO_PAGE, page_nr=infopagenr)
             self.metadata.add_candidate('title', candidate)
-        publisher = infopage.find_publisher()
+        publisher = infopage.find_publisher() if not self.is_decided('publisher') else None
         if publisher:
             cand = Candidate(publisher, Origin.INFO_PAGE, page_nr=infopagenr)
             cand.reg_entries = self.search_in_registry(publisher)
@@ -262,16 +303,45 @@ class Finder:
         Note: The calling order matters. For example find_author uses the title candidates, so
         title-related methods have to be called beforehand.
         """
-        self.find_title_from_page()
-        self.get_title_from_info()
-        self.get_author_from_info()
-        self.get_year_from_info()
-        self.find_isxn('ISBN')
-        self.find_isxn('ISSN')
-        self.read_info_page()
-        self.find_publisher()
-        self.parse_copyright()
-        self.find_report_prefix()
-        self.get_language()
-        self.find_author()
-        self.find_document_type()
+        stages: list[tuple[str, Callable[[], None]]] = [
+            ('find_title_from_page', self.find_title_from_page),
+            ('get_title_from_info', self.get_title_from_info),
+            ('get_author_from_info', self.get_author_from_info),
+            ('get_year_from_info', self.get_year_from_info),
+            ('find_isbn', lambda: self.find_isxn('ISBN')),
+            ('find_issn', lambda: self.find_isxn('ISSN')),
+            ('read_info_page', self.read_info_page),
+            ('find_publisher', self.find_publisher),
+            ('parse_copyright', self.parse_copyright),
+            ('find_report_prefix', self.find_report_prefix),
+            ('get_language', self.get_language),
+            ('find_author', self.find_author),
+            ('find_document_type', self.find_document_type)
+        ]
+        for name, stage in stages:
+            with self.tracer.stage(name):
+                stage()
+
+    def missing_fields(self) -> list[str]:
+        """Returns the required fields without any candidate"""
+        return [field for field in Finder.REQUIRED_FIELDS if field not in self.metadata.candidates]
+
+    def extract_from_pages(self, page_numbers: list[int]) -> None:
+        """Searches the pages for the missing required fields, with the heuristics that search
+        all pages. Other fields are only searched in the pages read first."""
+        missing = self.missing_fields()
+        stages: list[tuple[str, list[str], Callable[[], None]]] = [
+            ('get_year_from_info', ['year'], self.get_year_from_info),
+            ('find_isbn', ['ISBN'], lambda: self.find_isxn('ISBN')),
+            ('find_publisher', ['publisher'], self.find_publisher),
+            ('parse_copyright', ['year', 'publisher'], self.parse_copyright),
+            ('find_report_prefix', ['publisher'], self.find_report_prefix)
+        ]
+        self.pages = {number: self.doc.pages[number] for number in page_numbers}
+        try:
+            for name, fields, stage in stages:
+                if any(field in missing for field in fields):
+                    with self.tracer.stage(name):
+                        stage()
+        finally:
+            self.pages = self.doc.pages
@@ -142,7 +142,7 @@ class InfoPage:
 
     def group_by_font(self) -> Optional[str]:
         """Heuristic checking if a specific font is used for label blocks."""
-        fonts = {b.font for b in self.page.text_blocks}
+        fonts = dict.fromkeys(b.font for b in self.page.text_blocks)
         block_by_font = {}
         for font in fonts:
             block_by_font[font] = [b for b in self.page.text_blocks if b.font == font]
@@ -4,13 +4,19 @@ Handling and selecting the candidate values found in the document
 """
 
 
-from typing import Optional, TypedDict
+from typing import NotRequired, Optional, TypedDict
 from . import text
 from .candidate import Candidate, CandidateType, Origin
+from .trace import TraceType
+
+
+# Status of the results of PDF files without a usable text layer, which must be OCR-processed
+NO_TEXT_LAYER = 'NO_TEXT_LAYER'
 
 
 class Results(TypedDict):
-    """Type of Meteor output"""
+    """Type of Meteor output. The trace is only set when requested in Meteor.run, and the
+    status only for documents that cannot be read, such as NO_TEXT_LAYER"""
     year: Optional[CandidateType]
     language: Optional[CandidateType]
     title: Optional[CandidateType]
@@ -19,6 +25,8 @@ class Results(TypedDict):
     authors: list[CandidateType]
     isbn: Optional[CandidateType]
     issn: Optional[CandidateType]
+    trace: NotRequired[TraceType]
+    status: NotRequired[str]
 
 
 def new_results() -> Results:
@@ -54,6 +62,11 @@ class Metadata:
             return False
         return name in [c.value for c in self.candidates['publisher']]
 
+    def has_publisher_in_registry(self) -> bool:
+        if 'publisher' not in self.candidates:
+            return False
+        return any(c.reg_entries for c in self.candidates['publisher'])
+
     def has_publisher_from_infopage(self) -> bool:
         if 'publisher' not in self.candidates:
             return False
@@ -140,6 +153,27 @@ class Metadata:
             authors.append(entry)
         return authors
 
+    def is_final(self, field: str) -> bool:
+        """Returns True if no candidate added later for `field` can change the value chosen
+        by choose_best, given the selection precedence of the choose_* methods.
+
+        Only fields where a single top-ranked candidate always wins are handled: a title
+        from PDFINFO, a year from a copyright line and a publisher found in the registry.
+        """
+        if field == 'title':
+            return 'title' in self.candidates and any(
+                c.origin == Origin.PDFINFO and isinstance(c.value, str)
+                and not text.has_no_letters(c.value)
+                for c in self.candidates['title']
+            )
+        if field == 'year':
+            return 'year' in self.candidates and any(
+                c.origin == Origin.COPYRIGHT for c in self.candidates['year']
+            )
+        if field == 'publisher':
+            return self.has_publisher_in_registry()
+        return False
+
     def choose_best(self) -> None:
         self.results['year'] = self.rank_years()
         self.results['language'] = self.choose_language()
@@ -1,14 +1,28 @@
 """Main module for Meteor"""
 
 
-from typing import Optional, Callable
-import langdetect
-from langdetect.lang_detect_exception import LangDetectException
+import tempfile
+from typing import Optional, Callable, Self
 from .resource_loader import ResourceLoader
 from .registry import PublisherRegistry
-from .meteor_document import MeteorDocument
-from .metadata import Results
+from .meteor_document import MeteorDocument, PageWindow
+from .metadata import NO_TEXT_LAYER, Results, new_results
 from .finder import Finder
+from .text import compile_patterns
+from .trace import Tracer
+
+
+WARM_UP_TEXT = '''Rapport 2023:1
+Metadataekstrahering
+Ola Nordmann
+ISBN 978-82-8307-056-0
+© 2023 Nasjonalbiblioteket'''
+
+# The first and last 5 pages, as always read before adaptive windows
+FIXED_WINDOW = PageWindow(start=5, end=5, step=0, max_pages=10)
+# Starts with the first 2 and last 2 pages, and reads up to 3 more pages on each side while
+# ISBN, publisher or year is missing
+ADAPTIVE_WINDOW = PageWindow(start=2, end=2, step=3, max_pages=20)
 
 
 class Meteor:
@@ -18,15 +32,34 @@ class Meteor:
     language models.
     The `run` method will create a MeteorDocument, find candidate values for metadata
     and return the best ones as a Results object (TypedDict, JSON-serializable)
+
+    With exhaustive set, all heuristics are run even when their candidates cannot change
+    the results, which is useful when debugging or evaluating the heuristics.
+    The files of ALTO documents are read by up to alto_workers threads, which helps on
+    network volumes.
+
+    The pages read are given by a PageWindow, for all runs or for each run. With an
+    adaptive window (a step), Meteor starts with a few pages and reads more only while
+    the required fields of the Finder are missing.
+
+    PDF files without a usable text layer are not searched, their results are empty with
+    the NO_TEXT_LAYER status.
     """
 
-    def __init__(self, languages: Optional[list[str]] = None) -> None:
+    def __init__(self, languages: Optional[list[str]] = None, exhaustive: bool = False,
+                 alto_workers: int = 1, window: PageWindow = FIXED_WINDOW) -> None:
         self.registry: Optional[PublisherRegistry] = None
+        self.exhaustive = exhaustive
+        self.alto_workers = alto_workers
+        self.window = window
         ResourceLoader.load(languages)
         self.detect_language: Callable[[str], Optional[str]] = Meteor.__default_detect
 
     @staticmethod
     def __default_detect(text: str) -> Optional[str]:
+        # pylint: disable=import-outside-toplevel
+        import langdetect
+        from langdetect.lang_detect_exception import LangDetectException
         try:
             lang = langdetect.detect(text)
         except LangDetectException:
@@ -41,9 +74,51 @@ class Meteor:
     def set_language_detection_method(self, detect_language: Callable[[str], str]) -> None:
         self.detect_language = detect_language
 
-    def run(self, file_path: str) -> Results:
-        with MeteorDocument(file_path) as doc:
-            finder = Finder(doc, self.registry, self.detect_language)
+    def warm_up(self) -> Self:
+        """Loads everything that is otherwise loaded on first use: compiles all patterns,
+        checks the registry connection, and runs Meteor on a small generated PDF file so that
+        the lazily imported modules and the language profiles are ready."""
+        compile_patterns()
+        if self.registry:
+            self.registry.ping()
+        import fitz  # pylint: disable=import-outside-toplevel
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as file:
+            with fitz.open() as doc:
+                doc.new_page().insert_text((72, 72), WARM_UP_TEXT)
+                doc.save(file.name)
+            self.run(file.name)
+        return self
+
+    def run(self, file_path: str, trace: bool = False,
+            window: Optional[PageWindow] = None) -> Results:
+        """Extracts metadata from the file, reading the pages of window, or else of the
+        window of this Meteor. If trace is set, timings and counters for each stage are
+        added to the results."""
+        window = window or self.window
+        start = min(window['start'], window['max_pages'])
+        end = min(window['end'], window['max_pages'] - start)
+        tracer = Tracer(enabled=trace)
+        with tracer.stage('load_document'):
+            doc = MeteorDocument(file_path, start=start, end=end, tracer=tracer,
+                                 alto_workers=self.alto_workers)
+        with doc:
+            if not doc.text_layer:
+                results = new_results()
+                results['status'] = NO_TEXT_LAYER
+                if trace:
+                    results['trace'] = tracer.to_dict()
+                return results
+            finder = Finder(doc, self.registry, self.detect_language, self.exhaustive, tracer)
             finder.extract_metadata()
-            finder.metadata.choose_best()
-            return finder.metadata.results
+            while window['step'] > 0 and finder.missing_fields():
+                with tracer.stage('expand_window'):
+                    new_pages = doc.expand(window['step'], window['max_pages'])
+                if not new_pages:
+                    break
+                finder.extract_from_pages(new_pages)
+            with tracer.stage('choose_best'):
+                finder.metadata.choose_best()
+            results = finder.metadata.results
+        if trace:
+            results['trace'] = tracer.to_dict()
+        return results
@@ -4,35 +4,93 @@ Serves as an interface between the file on disk and the internal object used in
 """
 
 
-from pathlib import Path
+import gzip
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 from types import TracebackType
-from typing import Optional, Self, Type
-import fitz
-from .page import Page
+from typing import Any, Optional, Self, Type, TypedDict, TYPE_CHECKING
+from .page import Page, text_flags
+from .alto_pages import METS_FILE_NAMES, find_mets, read_mets, select_pages
+from .alto_pages import page_number as file_page_number
 from .alto_utils import AltoFile
+from .archive import Archive, is_alto_file, is_archive, is_gzipped
+from . import snapshot
+from .trace import Tracer
 
+if TYPE_CHECKING:
+    import fitz
 
-class MeteorDocument:
+
+class PageWindow(TypedDict):
+    """Pages read from a document: the first start and last end pages. With a step, up to
+    step more pages on each side are read while required fields are missing (see
+    Meteor.run), without reading more than max_pages in total."""
+    start: int
+    end: int
+    step: int
+    max_pages: int
+
+
+class MeteorDocument:  # pylint: disable=too-many-instance-attributes
     """This class represents the internal object on which Meteor heuristics are run.
 
     It is responsible for loading the file from disk and offers methods to load its
     content. MeteorDocuments are context managers, so they can be used in `with` statements.
+    Page extractions are counted in the optional tracer.
+
+    Documents are PDF files, directories of ALTO files, or ZIP or TAR archives containing
+    either, or snapshots of documents (see the snapshot module), whose pages are read as the
+    pages of the original document. PDF and ALTO files can be compressed with gzip. Only the
+    needed files are read from archives, see the archive module.
+    The files of an ALTO directory are read by up to alto_workers threads, which overlaps
+    their reads when they are on a network volume.
+    The pages that are not read are kept, so that more of them can be read with `expand`.
+    The TextPages extracted for the text of PDF pages are kept until their Page objects are
+    built from them.
+
+    Before reading a PDF file, a few of its pages are sampled to check that it has a usable
+    text layer. If not (scanned pages without OCR), no pages are read and text_layer is False.
     """
 
-    def __init__(self, file_path: str,
+    # Pages sampled among the pages to read, average number of characters per sampled page
+    # below which the text may not be usable (e.g. only page numbers or a scanner stamp), and
+    # part of the page area covered by images from which such pages are taken to be scanned
+    TEXT_LAYER_SAMPLE_PAGES = 5
+    MIN_CHARACTERS_PER_PAGE = 20
+    SCANNED_IMAGE_COVERAGE = 0.5
+
+    def __init__(self, file_path: str,  # pylint: disable=too-many-arguments
                  start: int = 5,
-                 end: int = 5):
+                 end: int = 5,
+                 tracer: Optional[Tracer] = None,
+                 alto_workers: int = 1):
         path = Path(file_path)
+        self.path = path
+        self.alto_workers = alto_workers
+        # Numbers and sources (page indexes, ALTO files or archive members) of unread pages
+        self.unread_pages: list[tuple[int, Any]] = []
+        self.tracer = tracer or Tracer(enabled=False)
         self.pdfinfo: Optional[dict[str, str]] = None
-        self.pdfdoc: Optional[fitz.Document] = None
+        self.pdfdoc: Optional['fitz.Document'] = None
+        # PDF pages and their TextPages, which only have weak references to them
+        self.textpages: dict[int, tuple['fitz.Page', 'fitz.TextPage']] = {}
+        self.text_layer = True
+        self.snapshot: Optional[snapshot.Snapshot] = None
         if path.is_dir():
             # TODO: handle errors
             self.pages, self.page_objects = self.__read_alto_pages(path, start, end)
+        elif path.is_file() and snapshot.is_snapshot(path.name):
+            self.__read_snapshot(path, start, end)
+        elif path.is_file() and is_archive(path.name):
+            with Archive(path) as archive:
+                self.__read_archive(archive, start, end)
+        elif path.is_file() and is_gzipped(path.name):
+            with gzip.open(path) as file:
+                self.__open_pdf(file.read(), start, end)
         elif path.is_file():
-            self.pdfdoc = fitz.open(file_path)
-            self.pdfinfo = self.pdfdoc.metadata
-            self.pages = self.__read_pdf_pages(start, end)
-            self.page_objects = {}
+            self.__open_pdf(file_path, start, end)
         else:
             raise ValueError('bad argument')
 
@@ -45,50 +103,211 @@ class MeteorDocument:
         self.close()
 
     def close(self) -> None:
+        self.textpages.clear()
         if self.pdfdoc:
             self.pdfdoc.close()
 
-    def __read_pdf_pages(self, start: int, end: int) -> dict[int, str]:
-        """Builds a dictionary associating page number to a string containing each page's text."""
+    def __open_pdf(self, source: str | bytes, start: int, end: int) -> None:
+        from fitz import open as open_pdf  # pylint: disable=import-outside-toplevel
+        if isinstance(source, bytes):
+            self.pdfdoc = open_pdf(stream=source, filetype='pdf')
+        else:
+            self.pdfdoc = open_pdf(source)
+        self.pdfinfo = self.pdfdoc.metadata
+        self.page_objects = {}
+        pages = [(page + 1, page) for page in range(self.pdfdoc.page_count)]
+        sample = self.__sample_text_layer(select_pages(pages, start, end))
+        self.text_layer = sample is not None
+        self.pages = self.__read_selected_pdf_pages(pages, start, end, sample) \
+            if sample is not None else {}
+
+    def __sample_text_layer(self, selected: list[tuple[int, int]]) -> Optional[dict[int, str]]:
+        """Returns the text of a few of the selected pages, spread over them, or None if they
+        show that the PDF document has no usable text layer: none of them uses a font, or they
+        have too few characters and images cover their pages. Fonts are looked up in the page
+        resources, without parsing the pages. Short born-digital documents, with few
+        characters and no page images, keep their text layer."""
         if not self.pdfdoc:
             raise ValueError('No PDF document set')
-        pages = {}
-        if self.pdfdoc.page_count < start + end:
-            for page in range(self.pdfdoc.page_count):
-                pages[page+1] = self.pdfdoc.get_page_text(page)
+        size = min(MeteorDocument.TEXT_LAYER_SAMPLE_PAGES, len(selected))
+        sample = [selected[index * (len(selected) - 1) // max(size - 1, 1)]
+                  for index in range(size)]
+        if not any(self.pdfdoc.get_page_fonts(page) for _, page in sample):
+            return None
+        texts = {page_nr: self.__page_text(page_nr, page) for page_nr, page in sample}
+        self.tracer.count_pages(len(texts))
+        characters = sum(len(''.join(page_text.split())) for page_text in texts.values())
+        if characters < MeteorDocument.MIN_CHARACTERS_PER_PAGE * len(texts) \
+                and all(self.__covered_by_images(page_nr) for page_nr in texts):
+            return None
+        return texts
+
+    def __covered_by_images(self, page_nr: int) -> bool:
+        pdf_page = self.textpages[page_nr][0]
+        page_area = abs(pdf_page.rect)
+        image_area = sum(abs(pdf_page.rect & image['bbox'])
+                         for image in pdf_page.get_image_info())
+        return bool(page_area) and \
+            image_area >= MeteorDocument.SCANNED_IMAGE_COVERAGE * page_area
+
+    def __read_archive(self, archive: Archive, start: int, end: int) -> None:
+        """Reads the ALTO files in the archive, or else its first PDF file"""
+        mets_name = next((name for name in archive.members
+                          if PurePosixPath(name).name in METS_FILE_NAMES), None)
+        if mets_name:
+            with archive.open(mets_name) as mets_file:
+                mets_dir = posixpath.dirname(mets_name)
+                pages = [(page_nr, posixpath.normpath(posixpath.join(mets_dir, location)))
+                         for page_nr, location in read_mets(mets_file)]
         else:
-            for page in range(start):
-                pages[page+1] = self.pdfdoc.get_page_text(page)
-            for page in range(self.pdfdoc.page_count-end, self.pdfdoc.page_count):
-                pages[page+1] = self.pdfdoc.get_page_text(page)
-        return pages
+            pages = [(page_nr, name) for name in archive.members
+                     if is_alto_file(name)
+                     and (page_nr := file_page_number(PurePosixPath(name).name)) is not None]
+        if pages:
+            self.pages, self.page_objects = self.__read_archive_alto_files(archive, pages,
+                                                                           start, end)
+            return
+        pdf_names = sorted(name for name in archive.members
+                           if name.lower().endswith(('.pdf', '.pdf.gz')))
+        if not pdf_names:
+            raise ValueError('No ALTO or PDF file in archive')
+        self.__open_pdf(archive.read(pdf_names[0]), start, end)
+
+    def __read_archive_alto_files(self, archive: Archive, pages: list[tuple[int, str]],
+                                  start: int, end: int
+                                  ) -> tuple[dict[int, str], dict[int, Page]]:
+        selected = select_pages(pages, start, end)
+        self.__keep_unread(pages, selected)
+        altos = archive.read_all([name for _, name in selected], AltoFile)
+        return self.__add_alto_pages([page_nr for page_nr, _ in selected], altos)
+
+    def __keep_unread(self, pages: list[tuple[int, Any]], selected: list[tuple[int, Any]]
+                      ) -> None:
+        selected_numbers = {page_nr for page_nr, _ in selected}
+        self.unread_pages = [page for page in pages if page[0] not in selected_numbers]
+
+    def expand(self, step: int, max_pages: int) -> list[int]:
+        """Reads up to step more pages after the first pages and before the last pages read,
+        without reading more than max_pages in total. Returns the numbers of the new pages,
+        in page order."""
+        budget = max(max_pages - len(self.pages), 0)
+        start = min(step, budget)
+        end = min(step, budget - start)
+        if not self.unread_pages or start + end == 0:
+            return []
+        unread = self.unread_pages
+        if self.snapshot:
+            new_pages = self.__read_selected_snapshot_pages(unread, start, end)
+        elif self.pdfdoc:
+            new_pages = self.__read_selected_pdf_pages(unread, start, end)
+        elif self.path.is_dir():
+            new_pages, page_objects = self.__read_selected_alto_files(unread, start, end)
+            self.page_objects.update(page_objects)
+        else:
+            with Archive(self.path) as archive:
+                new_pages, page_objects = self.__read_archive_alto_files(archive, unread,
+                                                                         start, end)
+            self.page_objects.update(page_objects)
+        self.pages = dict(sorted({**self.pages, **new_pages}.items()))
+        return sorted(new_pages)
+
+    def __read_selected_pdf_pages(self, pages: list[tuple[int, int]], start: int, end: int,
+                                  texts: Optional[dict[int, str]] = None) -> dict[int, str]:
+        """Builds a dictionary associating page number to a string containing each page's text,
+        for the selected pages. Texts already extracted are reused."""
+        if not self.pdfdoc:
+            raise ValueError('No PDF document set')
+        texts = texts or {}
+        selected = select_pages(pages, start, end)
+        self.__keep_unread(pages, selected)
+        pages_txt = {page_nr: texts[page_nr] if page_nr in texts
+                     else self.__page_text(page_nr, page) for page_nr, page in selected}
+        self.tracer.count_pages(len(pages_txt) - len(texts))
+        return pages_txt
+
+    def __read_snapshot(self, path: Path, start: int, end: int) -> None:
+        self.snapshot = snapshot.read(path)
+        self.pdfinfo = self.snapshot['pdfinfo']
+        self.text_layer = self.snapshot['text_layer']
+        self.page_objects = {}
+        self.pages = self.__read_selected_snapshot_pages(
+            [(page_nr, page_nr) for page_nr in self.snapshot['pages']], start, end)
+
+    def __read_selected_snapshot_pages(self, pages: list[tuple[int, int]], start: int, end: int
+                                       ) -> dict[int, str]:
+        if not self.snapshot:
+            raise ValueError('No snapshot set')
+        selected = select_pages(pages, start, end)
+        self.__keep_unread(pages, selected)
+        return {page_nr: self.snapshot['pages'][page_nr] for page_nr, _ in selected}
+
+    def __page_text(self, page_nr: int, page: int) -> str:
+        """Extracts the text of a PDF page, and keeps its TextPage for get_page_object"""
+        if not self.pdfdoc:
+            raise ValueError('No PDF document set')
+        pdf_page = self.pdfdoc.load_page(page)
+        textpage = pdf_page.get_textpage(flags=text_flags())
+        self.textpages[page_nr] = (pdf_page, textpage)
+        return str(textpage.extractText())
 
     def __read_alto_pages(self, path: Path, start: int, end: int
                           ) -> tuple[dict[int, str], dict[int, Page]]:
-        """Builds a dictionary associating page number to a string containing each page's text."""
-        pages_txt = {}
-        pages_objects = {}
-        alto_files = sorted(path.glob('*.xml'))
+        """Builds a dictionary associating page number to a string containing each page's text.
+        Pages are selected from the METS file if there is one, see the alto_pages module.
+        METS file locations resolved out of the directory (e.g. through symbolic links) are
+        rejected with a ValueError."""
+        mets_path = find_mets(path)
+        if mets_path:
+            directory = path.resolve()
+            pages = [(page_nr, path / location) for page_nr, location in read_mets(mets_path)]
+            for _, file_path in pages:
+                if not file_path.resolve().is_relative_to(directory):
+                    raise ValueError(f'METS file location out of the document: {file_path}')
+        else:
+            with os.scandir(path) as entries:
+                pages = [(page_nr, Path(entry.path)) for entry in entries
+                         if is_alto_file(entry.name)
+                         and (page_nr := file_page_number(entry.name)) is not None]
+        return self.__read_selected_alto_files(pages, start, end)
+
+    def __read_selected_alto_files(self, pages: list[tuple[int, Path]], start: int, end: int
+                                   ) -> tuple[dict[int, str], dict[int, Page]]:
+        selected = select_pages(pages, start, end)
+        self.__keep_unread(pages, selected)
+        files_to_read = [alto_file for _, alto_file in selected]
 
-        files_to_read = []
-        if len(alto_files) < start + end:
-            files_to_read = alto_files
+        if self.alto_workers > 1 and len(files_to_read) > 1:
+            with ThreadPoolExecutor(min(self.alto_workers, len(files_to_read))) as executor:
+                altos = list(executor.map(AltoFile, files_to_read))
         else:
-            files_to_read = alto_files[:start]
-            files_to_read.extend(alto_files[-end:])
+            altos = [AltoFile(alto_file) for alto_file in files_to_read]
 
-        for alto_file in files_to_read:
-            page_nr = int(alto_file.name.split('.')[0][-4:])
-            alto = AltoFile(alto_file)
+        return self.__add_alto_pages([page_nr for page_nr, _ in selected], altos)
+
+    def __add_alto_pages(self, page_numbers: list[int], altos: list[AltoFile]
+                         ) -> tuple[dict[int, str], dict[int, Page]]:
+        pages_txt = {}
+        pages_objects = {}
+        for page_nr, alto in zip(page_numbers, altos):
             pages_txt[page_nr] = alto.full_text
             pages_objects[page_nr] = Page(alto_file=alto)
+        self.tracer.count_pages(len(pages_objects))
 
         return pages_txt, pages_objects
 
     def get_page_object(self, page_number: int) -> Page:
         """Builds a Page object for page_number, and caches it in the page_objects attribute."""
+        if page_number not in self.page_objects and self.snapshot:
+            self.page_objects[page_number] = Page(
+                text_blocks=snapshot.text_blocks(self.snapshot, page_number))
         if page_number not in self.page_objects:
             if not self.pdfdoc:
                 raise ValueError('No PDF file to load page from')
-            self.page_objects[page_number] = Page(pdf_page=self.pdfdoc.load_page(page_number - 1))
+            if page_number in self.textpages:
+                pdf_page, textpage = self.textpages.pop(page_number)
+                self.page_objects[page_number] = Page(pdf_page=pdf_page, textpage=textpage)
+            else:
+                self.page_objects[page_number] = Page(
+                    pdf_page=self.pdfdoc.load_page(page_number - 1))
+                self.tracer.count_pages()
         return self.page_objects[page_number]
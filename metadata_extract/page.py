@@ -1,13 +1,23 @@
 """This module deals with pages, defined as sets of text elements."""
 
 
-from typing import Callable, Optional
-import fitz
+from typing import Callable, Optional, TYPE_CHECKING
 from . import text
 from .text import ValueAndContext
 from .alto_utils import AltoFile
 from .models import SpanType
 
+if TYPE_CHECKING:
+    import fitz
+
+
+def text_flags() -> int:
+    """Returns the flags of text extractions from PDF pages: those of the dict output,
+    without images. They are the flags of the plain text output, so that a single TextPage
+    gives both the text and the spans of a page."""
+    from fitz import TEXTFLAGS_DICT, TEXT_PRESERVE_IMAGES  # pylint: disable=import-outside-toplevel
+    return int(TEXTFLAGS_DICT & ~TEXT_PRESERVE_IMAGES)
+
 
 class TextBlock:
     """A single text element, similar to spans.
@@ -34,16 +44,26 @@ class Page:
     The methods provided use position information to find values in neighouring
     blocks, for example an ISBN value that is next to (horizontally or vertically)
     a block stating "ISBN:".
+
+    Spans of a PDF page are read from its TextPage when it was already extracted for the
+    text of the page, which saves interpreting the page again. Pages can also be made of
+    text blocks read from a snapshot, see the snapshot module.
     """
 
     # TODO: preserve full blocks instead of single lines?
     def __init__(self,
-                 pdf_page: Optional[fitz.Page] = None,
-                 alto_file: Optional[AltoFile] = None):
+                 pdf_page: Optional['fitz.Page'] = None,
+                 alto_file: Optional[AltoFile] = None,
+                 textpage: Optional['fitz.TextPage'] = None,
+                 text_blocks: Optional[list[TextBlock]] = None):
         self.text_blocks = []
-        if pdf_page:
-            page_text = pdf_page.get_text("dict",
-                                          flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+        if text_blocks is not None:
+            self.text_blocks = text_blocks
+        elif pdf_page:
+            if textpage:
+                page_text = pdf_page.get_text("dict", textpage=textpage)
+            else:
+                page_text = pdf_page.get_text("dict", flags=text_flags())
             for block in page_text["blocks"]:
                 if 'lines' not in block.keys():
                     continue
@@ -4,9 +4,12 @@ This module contains all classes and methods related to the registry database.
 """
 
 
-from typing import TypedDict, Optional, Union
+from typing import TypedDict, Optional, Union, TYPE_CHECKING
 import sqlite3
-from mysql.connector import MySQLConnection
+import threading
+
+if TYPE_CHECKING:
+    from mysql.connector import MySQLConnection
 
 
 class DBCredentials(TypedDict):
@@ -24,24 +27,40 @@ class RegistryType(TypedDict):
 
 
 class PublisherRegistry:
-    """Class handling connection and querying into the registry database"""
+    """Class handling connection and querying into the registry database
+
+    The connection is shared, so searches from several threads are serialized.
+    """
 
     def __init__(self,
                  registry_file: Optional[str] = None,
                  db_credentials: Optional[DBCredentials] = None):
-        self.connection: Union[sqlite3.Connection, MySQLConnection]
+        self.connection: Union[sqlite3.Connection, 'MySQLConnection']
+        self.is_mysql = False
         if registry_file:
             self.connection = sqlite3.connect(registry_file, check_same_thread=False)
             self.field = "LOWER(O1.name)"
         elif db_credentials:
-            self.connection = MySQLConnection(host=db_credentials['host'],
-                                              user=db_credentials['user'],
-                                              database=db_credentials['database'],
-                                              password=db_credentials['password'])
+            import mysql.connector  # pylint: disable=import-outside-toplevel
+            self.is_mysql = True
+            self.connection = mysql.connector.MySQLConnection(
+                host=db_credentials['host'],
+                user=db_credentials['user'],
+                database=db_credentials['database'],
+                password=db_credentials['password'])
             self.field = "O1.lower_name"
         else:
             raise RuntimeError("Missing database settings for registry")
         self.cursor = self.connection.cursor()
+        self.lock = threading.Lock()
+
+    def ping(self) -> None:
+        """Checks that the database answers, reconnecting to MySQL if needed"""
+        with self.lock:
+            if self.is_mysql:
+                self.connection.ping(reconnect=True)  # type: ignore[union-attr]
+            self.cursor.execute("SELECT 1")
+            self.cursor.fetchall()
 
     def search(self, pattern: str) -> list[RegistryType]:
         """Search the database for occurrences of pattern.
@@ -50,17 +69,17 @@ class PublisherRegistry:
         preferred name form of highest category at the top.
         """
 
-        if isinstance(self.connection, MySQLConnection):
-            self.connection.ping(reconnect=True)
-
         escaped_pattern = pattern.lower().replace("'", "''")
-        self.cursor.execute(
-            "SELECT DISTINCT O1.id, O2.name FROM " +
-            "organizations O1 JOIN organizations O2 USING(id) " +
-            f"WHERE {self.field} = '{escaped_pattern}' AND " +
-            "O2.standard=1 ORDER BY O1.outdated, O1.standard DESC, O1.category DESC"
-        )
-        rows = self.cursor.fetchall()
+        with self.lock:
+            if self.is_mysql:
+                self.connection.ping(reconnect=True)  # type: ignore[union-attr]
+            self.cursor.execute(
+                "SELECT DISTINCT O1.id, O2.name FROM " +
+                "organizations O1 JOIN organizations O2 USING(id) " +
+                f"WHERE {self.field} = '{escaped_pattern}' AND " +
+                "O2.standard=1 ORDER BY O1.outdated, O1.standard DESC, O1.category DESC"
+            )
+            rows = self.cursor.fetchall()
         results: list[RegistryType] = []
         for auth_id, name in rows:
             if not isinstance(name, str):
@@ -0,0 +1,165 @@
+"""This module saves MeteorDocuments in snapshot files, to run Meteor again without reading the
+original documents
+
+A snapshot holds the PDF metadata, the text of the first and last pages of the document, and
+their text blocks stored by columns: texts, indexes in a table of fonts, font sizes and
+bounding boxes. MeteorDocument reads snapshot files like the documents they were taken from,
+for all page windows within these pages.
+
+Snapshots are pickle files, made of a small header, which can be read alone, and the snapshot
+itself. The header holds the format version and the extraction version: a hash of the
+modules reading documents into the page texts and text blocks of MeteorDocuments, and of
+the PyMuPDF version, so that snapshots taken before a change to the extraction are taken
+again, but not after a change to the heuristics. They are meant for evaluation files,
+only read trusted files.
+"""
+
+
+import functools
+import hashlib
+import importlib.metadata
+import os
+import pickle
+from array import array
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Optional, TypedDict
+
+from .page import TextBlock
+
+if TYPE_CHECKING:
+    from .meteor_document import MeteorDocument
+
+
+SNAPSHOT_FORMAT = 'meteor-snapshot'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = '.snapshot'
+# Pages taken from the start and from the end of documents
+SNAPSHOT_PAGES = 20
+# Modules whose code gives the content of snapshots. The heuristics (e.g. the text and finder
+# modules) are left out, so that snapshots stay valid while they are changed.
+EXTRACTION_MODULES = ['alto_pages.py', 'alto_utils.py', 'archive.py', 'meteor_document.py',
+                      'models.py', 'page.py', 'snapshot.py']
+
+
+class BlockColumns(TypedDict):
+    """Text blocks of a page, by columns. Fonts are indexes in the fonts of the snapshot,
+    and bounding boxes are stored as 4 consecutive values."""
+    text: list[str]
+    font: 'array[int]'
+    size: 'array[float]'
+    bbox: 'array[float]'
+
+
+class Snapshot(TypedDict):
+    """Content of a MeteorDocument used by the Finder"""
+    pdfinfo: Optional[dict[str, str]]
+    text_layer: bool
+    pages: dict[int, str]
+    fonts: list[str]
+    blocks: dict[int, BlockColumns]
+
+
+@functools.cache
+def extraction_version() -> str:
+    """Returns a hash of the extraction modules and of the PyMuPDF version"""
+    digest = hashlib.sha256(importlib.metadata.version('PyMuPDF').encode())
+    package_dir = Path(__file__).parent
+    for name in EXTRACTION_MODULES:
+        digest.update(name.encode())
+        digest.update((package_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+def is_snapshot(name: str) -> bool:
+    return name.lower().endswith(SNAPSHOT_SUFFIX)
+
+
+def take(doc: 'MeteorDocument') -> Snapshot:
+    """Returns the snapshot of the pages read from the document, extracting their text
+    blocks"""
+    fonts: dict[str, int] = {}
+    blocks: dict[int, BlockColumns] = {}
+    for page_nr in doc.pages:
+        columns = BlockColumns(text=[], font=array('I'), size=array('d'), bbox=array('d'))
+        for block in doc.get_page_object(page_nr).text_blocks:
+            columns['text'].append(block.text)
+            columns['font'].append(fonts.setdefault(block.font, len(fonts)))
+            columns['size'].append(block.fontsize)
+            columns['bbox'].extend(block.bbox)
+        blocks[page_nr] = columns
+    return Snapshot(pdfinfo=doc.pdfinfo, text_layer=doc.text_layer, pages=dict(doc.pages),
+                    fonts=list(fonts), blocks=blocks)
+
+
+def text_blocks(snapshot: Snapshot, page_nr: int) -> list[TextBlock]:
+    columns = snapshot['blocks'][page_nr]
+    bbox = columns['bbox']
+    return [TextBlock({'text': text,
+                       'font': snapshot['fonts'][font],
+                       'size': size,
+                       'bbox': (bbox[4 * i], bbox[4 * i + 1], bbox[4 * i + 2], bbox[4 * i + 3])})
+            for i, (text, font, size)
+            in enumerate(zip(columns['text'], columns['font'], columns['size']))]
+
+
+def save(snapshot: Snapshot, path: Path) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as file:
+        pickle.dump({'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION,
+                     'extraction': extraction_version()}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_header(file: IO[bytes]) -> None:
+    header = pickle.load(file)
+    if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f'{file.name} is not a snapshot')
+    if header.get('version') != SNAPSHOT_VERSION \
+            or header.get('extraction') != extraction_version():
+        raise ValueError(f'{file.name} is a snapshot from another version of Meteor')
+
+
+def read(path: Path) -> Snapshot:
+    with open(path, 'rb') as file:
+        read_header(file)
+        snapshot: Snapshot = pickle.load(file)
+        return snapshot
+
+
+def modification_time(source_path: Path) -> float:
+    """Returns the modification time of a file, or the latest modification time of a
+    directory and its files, which can be changed without changing the directory"""
+    mtime = source_path.stat().st_mtime
+    if source_path.is_dir():
+        with os.scandir(source_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    mtime = max(mtime, entry.stat().st_mtime)
+    return mtime
+
+
+def is_current(path: Path, source_path: Path) -> bool:
+    """Returns True if the snapshot at path exists, was taken by this version of the
+    extraction and after the source document was last changed"""
+    try:
+        if path.stat().st_mtime < modification_time(source_path):
+            return False
+        with open(path, 'rb') as file:
+            read_header(file)
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+        return False
+    return True
+
+
+def snapshot_of(file_path: str, directory: str, pages: int = SNAPSHOT_PAGES) -> str:
+    """Returns the path of the snapshot of the document in directory, taking it with the
+    first and last pages first, unless it is current"""
+    source_path = Path(file_path)
+    path = Path(directory) / (source_path.name + SNAPSHOT_SUFFIX)
+    if not is_current(path, source_path):
+        # pylint: disable-next=import-outside-toplevel
+        from .meteor_document import MeteorDocument
+        with MeteorDocument(file_path, start=pages, end=pages) as doc:
+            save(take(doc), path)
+    return str(path)
@@ -41,6 +41,13 @@ def report_pattern() -> regex.regex.Pattern[str]:
     return __PATTERNS['report']
 
 
+def report_label() -> regex.regex.Pattern[str]:
+    """Label of report_pattern alone, to find the pages where it can match"""
+    if 'report_label' not in __PATTERNS:
+        __PATTERNS['report_label'] = regex.compile(fr'({__labels()["report"]})(?i)')
+    return __PATTERNS['report_label']
+
+
 def type_pattern_1() -> regex.regex.Pattern[str]:
     if 'type_pattern_1' not in __PATTERNS:
         __PATTERNS['type_pattern_1'] = regex.compile(
@@ -105,6 +112,14 @@ def photograph_label() -> regex.regex.Pattern[str]:
     return __PATTERNS['photograph']
 
 
+def compile_patterns() -> None:
+    """Compiles the patterns built from labels, which are otherwise compiled on first use"""
+    for get_pattern in (report_pattern, report_label, type_pattern_1, publisher_label, author_label,
+                        binding_word_pattern, special_char_and_binding_pattern,
+                        photograph_label):
+        get_pattern()
+
+
 def find_in_pages(title: str, pages: dict[int, str], max_pages: int = 3) -> int:
     """Tries to find the <title> argument in the pages dictionary.
 
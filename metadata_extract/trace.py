@@ -0,0 +1,81 @@
+"""Trace module
+
+Lightweight instrumentation of the extraction pipeline: loading of the document and each
+Finder stage are timed, and page extractions and registry calls are counted.
+"""
+
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, TypedDict
+
+
+class StageType(TypedDict):
+    """JSON-serializable measures for a single stage"""
+    name: str
+    wallTime: float
+    cpuTime: float
+    pagesTouched: int
+    registryCalls: int
+    registryTime: float
+
+
+class TraceType(TypedDict):
+    """JSON-serializable trace of a Meteor run. Times are given in seconds."""
+    wallTime: float
+    cpuTime: float
+    stages: list[StageType]
+
+
+class Tracer:
+    """Records measures for the stages of a Meteor run.
+
+    Stages are delimited with the `stage` context manager. Counters are incremented by the
+    MeteorDocument (page extractions) and the Finder (registry calls) and are attributed to
+    the current stage. A disabled tracer does nothing, so it can always be passed around.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: list[StageType] = []
+        self.__current: Optional[StageType] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        stage: StageType = {
+            'name': name,
+            'wallTime': 0.,
+            'cpuTime': 0.,
+            'pagesTouched': 0,
+            'registryCalls': 0,
+            'registryTime': 0.
+        }
+        self.__current = stage
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            stage['wallTime'] = time.perf_counter() - wall_start
+            stage['cpuTime'] = time.process_time() - cpu_start
+            self.__current = None
+            self.stages.append(stage)
+
+    def count_pages(self, number: int = 1) -> None:
+        if self.__current:
+            self.__current['pagesTouched'] += number
+
+    def count_registry_call(self, duration: float) -> None:
+        if self.__current:
+            self.__current['registryCalls'] += 1
+            self.__current['registryTime'] += duration
+
+    def to_dict(self) -> TraceType:
+        return {
+            'wallTime': sum(s['wallTime'] for s in self.stages),
+            'cpuTime': sum(s['cpuTime'] for s in self.stages),
+            'stages': self.stages
+        }
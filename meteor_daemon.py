@@ -0,0 +1,93 @@
+"""Script to run Meteor as a local daemon listening on a Unix socket, and to send it files
+
+usage: `python meteor_daemon.py serve [-s </path/to/socket>] [-j <number of workers>] \
+   [--timeout <seconds>] [-r </path/to/registry.db>] [-g] [-l <language codes>] [-e]`
+
+       `python meteor_daemon.py client [-s </path/to/socket>] [--send-data] [-t] \
+   /path/to/file.pdf ...`
+
+The daemon stops gracefully on SIGTERM or SIGINT, after finishing the requests in progress.
+See src/daemon.py for the protocol.
+"""
+
+
+import argparse
+import base64
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+from types import FrameType
+from typing import Any, Optional
+
+from src.daemon_client import send
+
+
+DEFAULT_SOCKET = '/tmp/meteor.sock'
+
+
+def serve(args: argparse.Namespace) -> None:
+    # Imported here so that the client does not pay for loading Meteor
+    # pylint: disable=import-outside-toplevel
+    from run_on_file import create_meteor
+    from src.daemon import DaemonServer
+
+    server = DaemonServer(args.socket, functools.partial(create_meteor, args),
+                          workers=args.jobs, timeout=args.timeout)
+
+    def stop(_signum: int, _frame: Optional[FrameType]) -> None:
+        threading.Thread(target=server.stop).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f'Listening on {args.socket}', file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def client(args: argparse.Namespace) -> None:
+    requests: list[dict[str, Any]] = []
+    for path in args.paths:
+        if args.send_data:
+            with open(path, 'rb') if path != '-' else sys.stdin.buffer as file:
+                requests.append({'data': base64.b64encode(file.read()).decode(),
+                                 'trace': args.trace})
+        else:
+            # The daemon resolves paths in its own working directory
+            requests.append({'path': os.path.abspath(path), 'trace': args.trace})
+    failed = False
+    for path, response in zip(args.paths, send(args.socket, requests)):
+        failed = failed or 'error' in response
+        print(json.dumps({'path': path, **response}, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+    serve_parser = subparsers.add_parser('serve')
+    serve_parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET)
+    serve_parser.add_argument('-j', '--jobs', type=int, default=1)
+    serve_parser.add_argument('--timeout', type=float, default=0)
+    serve_parser.add_argument('-r', '--registry')
+    serve_parser.add_argument('-g', '--giella', action="store_true")
+    serve_parser.add_argument('-l', '--langs')
+    serve_parser.add_argument('-e', '--exhaustive', action="store_true")
+    client_parser = subparsers.add_parser('client')
+    client_parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET)
+    client_parser.add_argument('--send-data', action="store_true")
+    client_parser.add_argument('-t', '--trace', action="store_true")
+    client_parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+    if args.mode == 'serve':
+        serve(args)
+    else:
+        client(args)
+
+
+if __name__ == '__main__':
+    main()
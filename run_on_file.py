@@ -1,37 +1,156 @@
-"""Simple script to run Meteor on a local file
+"""Script to run Meteor on local files
 
 usage: `python run_on_file.py /path/to/file.pdf \
    [-r </path/to/registry.db>] \
-   [-g] [-l <language codes>]`
+   [-g] [-l <language codes>] [-e] [-t]`
+
+With several files, directories (searched for PDF files and ALTO documents) or glob
+patterns, or with a list of paths in a file (`--files-from`, `-` for stdin), documents are
+processed in parallel by `-j` worker processes and results are written as JSON lines, one
+per document, to stdout or to the `-o` file. Documents already present in the output file
+are skipped, so an interrupted run can be resumed. Progress is shown on stderr.
+
+usage: `python run_on_file.py /path/to/folder '/path/to/**/*.pdf' \
+   [--files-from <list of paths>] [-o <output.jsonl>] [-j <number of workers>] \
+   [--timeout <seconds>] [other options above]`
 """
 
 
 import argparse
+import functools
+import glob
 import json
+import os
+import sys
+import time
+from typing import Iterator, Optional, TextIO
+
 from metadata_extract.meteor import Meteor
 from metadata_extract.registry import PublisherRegistry
+from src.scan import Scanner, find_documents, is_alto_document
+from src.worker_pool import WorkerPool
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('-r', '--registry')
+    parser.add_argument('-g', '--giella', action="store_true")
+    parser.add_argument('-l', '--langs')
+    parser.add_argument('-e', '--exhaustive', action="store_true")
+    parser.add_argument('-t', '--trace', action="store_true")
+    parser.add_argument('--files-from')
+    parser.add_argument('-o', '--output')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--timeout', type=float, default=0)
+    args = parser.parse_args()
+    if not args.paths and not args.files_from:
+        parser.error('no files given')
+    return args
+
+
+def create_meteor(args: argparse.Namespace) -> Meteor:
+    meteor = Meteor(exhaustive=args.exhaustive)
+    if args.registry:
+        registry = PublisherRegistry(registry_file=args.registry)
+        meteor.set_registry(registry)
+    if args.giella:
+        import gielladetect  # pylint: disable=import-outside-toplevel, import-error
+        langs = args.langs.split(',') if args.langs else None
+        meteor.set_language_detection_method(
+            lambda t: gielladetect.detect(t, langs=langs)
+        )
+    return meteor
+
+
+def expand(path: str) -> Iterator[str]:
+    """Yields the documents of a path: a file, an ALTO document, a directory to search
+    or a glob pattern"""
+    if os.path.isdir(path) and not is_alto_document(path):
+        yield from find_documents(path)
+    elif os.path.exists(path):
+        yield path
+    else:
+        for match in sorted(glob.glob(path, recursive=True)):
+            yield from expand(match)
+
+
+def collect_paths(args: argparse.Namespace) -> list[str]:
+    paths = list(args.paths)
+    if args.files_from:
+        with open(args.files_from, encoding='utf-8') if args.files_from != '-' \
+                else sys.stdin as files_from:
+            paths.extend(line.strip() for line in files_from if line.strip())
+    return list(dict.fromkeys(doc for path in paths for doc in expand(path)))
+
+
+def read_done(output: str) -> set[str]:
+    """Returns the paths of the documents in the output file. An incomplete last line,
+    from an interrupted run, is removed."""
+    done: set[str] = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, 'r+', encoding='utf-8') as outfile:
+        position = 0
+        for line in iter(outfile.readline, ''):
+            try:
+                done.add(json.loads(line)['path'])
+            except (ValueError, KeyError):
+                outfile.truncate(position)
+                break
+            position = outfile.tell()
+    return done
+
 
+def show_progress(done: int, total: int, errors: int, start: float) -> None:
+    elapsed = time.monotonic() - start
+    rate = done / elapsed if elapsed else 0
+    eta = (total - done) / rate if rate else 0
+    print(f'\r{done}/{total} documents, {errors} errors, {rate:.2f} documents/s, '
+          f'ETA {int(eta // 60)}m{int(eta % 60):02d}s', end='', file=sys.stderr, flush=True)
 
-parser = argparse.ArgumentParser()
-parser.add_argument('filename')
-parser.add_argument('-r', '--registry')
-parser.add_argument('-g', '--giella', action="store_true")
-parser.add_argument('-l', '--langs')
 
-args = parser.parse_args()
+def run_batch(args: argparse.Namespace, paths: list[str], out: TextIO) -> int:
+    """Processes the documents and writes their results to out, returns the number of
+    failed documents"""
+    pool = WorkerPool(size=args.jobs, create_meteor=functools.partial(create_meteor, args),
+                      timeout=args.timeout)
+    extract = functools.partial(pool.run, trace=args.trace)
+    errors = 0
+    start = time.monotonic()
+    try:
+        for count, result in enumerate(Scanner(extract, workers=args.jobs).process_all(paths)):
+            errors += 'error' in result
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            show_progress(count + 1, len(paths), errors, start)
+    finally:
+        pool.close()
+        print(file=sys.stderr)
+    return errors
 
-meteor = Meteor()
 
-if args.registry:
-    registry = PublisherRegistry(registry_file=args.registry)
-    meteor.set_registry(registry)
+def main() -> None:
+    args = parse_args()
+    single_document = len(args.paths) == 1 and list(expand(args.paths[0])) == args.paths
+    if single_document and not args.files_from and not args.output:
+        results = create_meteor(args).run(args.paths[0], trace=args.trace)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    paths = collect_paths(args)
+    output: Optional[TextIO] = None
+    if args.output:
+        done = read_done(args.output)
+        paths = [path for path in paths if path not in done]
+        print(f'{len(done)} documents already done', file=sys.stderr)
+        output = open(args.output, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+    try:
+        errors = run_batch(args, paths, output or sys.stdout)
+    finally:
+        if output:
+            output.close()
+    sys.exit(1 if errors else 0)
 
-if args.giella:
-    import gielladetect  # pylint: disable=import-error
-    langs = args.langs.split(',') if args.langs else None
-    meteor.set_language_detection_method(
-        lambda t: gielladetect.detect(t, langs=langs)
-    )
 
-r = meteor.run(args.filename)
-print(json.dumps(r, indent=2, ensure_ascii=False))
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Script to run Meteor on all PDF files and ALTO documents in a folder
+
+Results are printed as JSON lines, in the order they are ready. With a cache file,
+documents that did not change since an earlier scan are not extracted again.
+
+usage: `python scan_folder.py /path/to/folder \
+   [-r </path/to/registry.db>] \
+   [-g] [-l <language codes>] [-e] [-j <number of workers>] [-c </path/to/cache.db>]`
+"""
+
+
+import argparse
+import functools
+import json
+import os
+
+from run_on_file import create_meteor
+from src.result_cache import ResultCache
+from src.scan import Scanner
+from src.worker_pool import WorkerPool
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('directory')
+parser.add_argument('-r', '--registry')
+parser.add_argument('-g', '--giella', action="store_true")
+parser.add_argument('-l', '--langs')
+parser.add_argument('-e', '--exhaustive', action="store_true")
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+parser.add_argument('-c', '--cache')
+
+args = parser.parse_args()
+
+pool = WorkerPool(size=args.jobs, create_meteor=functools.partial(create_meteor, args))
+cache = ResultCache(args.cache) if args.cache else None
+try:
+    for result in Scanner(pool.run, workers=args.jobs, cache=cache).scan(args.directory):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+finally:
+    pool.close()
+    if cache:
+        cache.close()
@@ -0,0 +1,108 @@
+"""Admission control for the extraction endpoints"""
+
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.types import Message
+
+from src import metrics
+
+
+class AdmissionController:
+    """Limits the number of concurrent extractions and the total size of uploads in flight.
+
+    Requests wait for an extraction slot in a bounded queue. When the queue is full, or the
+    upload budget would be exceeded, they are rejected immediately with a Retry-After header
+    instead of piling up. A limit of 0 for max_bytes disables the upload budget.
+
+    Uploads are charged the bytes they declare in their Content-Length header up front, and
+    the bytes they send beyond that as they are received, so that chunked uploads without
+    the header are counted too.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int,
+                 max_bytes: int = 0, retry_after: int = 5) -> None:
+        self.semaphore = asyncio.Semaphore(max(max_concurrent, 1))
+        self.max_queued = max_queued
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self.queued = 0
+        self.in_flight_bytes = 0
+
+    @property
+    def busy(self) -> bool:
+        """True when requests are waiting for an extraction slot"""
+        return self.queued > 0
+
+    def reject(self, status_code: int, reason: str, detail: str) -> HTTPException:
+        metrics.ADMISSION_REJECTIONS.labels(reason).inc()
+        return HTTPException(status_code=status_code, detail=detail,
+                             headers={'Retry-After': str(self.retry_after)})
+
+    @staticmethod
+    def content_length(request: Request) -> int:
+        try:
+            return max(int(request.headers.get('content-length', 0)), 0)
+        except ValueError:
+            return 0
+
+    def reserve(self, reserved: int, size: int) -> None:
+        """Adds size bytes to the upload budget, for an upload which has already reserved
+        `reserved` bytes. An upload is always admitted if no other upload is in flight."""
+        others = self.in_flight_bytes - reserved
+        if self.max_bytes and others and self.in_flight_bytes + size > self.max_bytes:
+            raise self.reject(429, 'upload_bytes', 'Too many uploads in progress, retry later')
+        self.in_flight_bytes += size
+        metrics.UPLOAD_BYTES_IN_FLIGHT.inc(size)
+
+    @asynccontextmanager
+    async def upload(self, request: Request) -> AsyncIterator[Request]:
+        """Reserves the bytes of the request body in the upload budget while the request is
+        handled. The body must be read from the yielded request, which counts the bytes
+        received."""
+        reserved = 0
+        received = 0
+
+        def charge(size: int) -> None:
+            nonlocal reserved
+            self.reserve(reserved, size)
+            reserved += size
+
+        async def receive() -> Message:
+            nonlocal received
+            message = await request.receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > reserved:
+                    charge(received - reserved)
+            return message
+
+        charge(AdmissionController.content_length(request))
+        try:
+            yield Request(request.scope, receive)
+        finally:
+            self.in_flight_bytes -= reserved
+            metrics.UPLOAD_BYTES_IN_FLIGHT.dec(reserved)
+
+    @asynccontextmanager
+    async def extraction(self) -> AsyncIterator[None]:
+        """Waits for an extraction slot, or rejects the request if too many are waiting."""
+        if self.semaphore.locked() and self.queued >= self.max_queued:
+            raise self.reject(503, 'queue_full', 'Server busy, retry later')
+        self.queued += 1
+        metrics.EXTRACTION_QUEUE.inc()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+            metrics.EXTRACTION_QUEUE.dec()
+        metrics.EXTRACTIONS_IN_PROGRESS.inc()
+        try:
+            yield
+        finally:
+            metrics.EXTRACTIONS_IN_PROGRESS.dec()
+            self.semaphore.release()
@@ -0,0 +1,141 @@
+"""Local daemon keeping Meteor workers resident, for callers processing one file at a time
+
+The daemon listens on a Unix socket. Clients send one JSON request per line and get one JSON
+response per line, on the same connection:
+
+- `{"path": "/path/to/file.pdf"}` for a PDF file or an ALTO directory readable by the daemon,
+  given by its absolute path, since the daemon does not run in the directory of its clients,
+- `{"data": "<base64>"}` for the content of a PDF file,
+- `{"command": "ping"}` to check that the daemon is up.
+
+Requests can set `"trace": true`. Responses are `{"results": {...}}` or `{"error": "..."}`.
+See the daemon_client module for the client side.
+"""
+
+
+# pylint: disable=broad-exception-caught
+
+import base64
+import binascii
+import functools
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from typing import Any, Callable
+
+from metadata_extract.metadata import Results
+from metadata_extract.meteor import Meteor
+from src.worker_pool import WorkerPool
+
+
+class InvalidRequest(Exception):
+    """The request has no valid path, data or command"""
+
+
+def warmed_up(create_meteor: Callable[[], Meteor]) -> Meteor:
+    return create_meteor().warm_up()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handles the requests of one connection, until the client closes it"""
+
+    server: 'DaemonServer'
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.add_connection(self.connection)
+
+    def finish(self) -> None:
+        self.server.remove_connection(self.connection)
+        super().finish()
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.process(json.loads(line))
+            except (ValueError, TypeError) as exc:
+                response = {'error': f'Invalid request: {exc}'}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server processing files with a pool of workers, warmed up when they start.
+    On shutdown, requests in progress are finished before the workers are stopped."""
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, socket_path: str, create_meteor: Callable[[], Meteor],
+                 workers: int = 1, timeout: float = 0) -> None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.socket_path = socket_path
+        self.pool = WorkerPool(size=workers,
+                               create_meteor=functools.partial(warmed_up, create_meteor),
+                               timeout=timeout)
+        self.connections: set[socket.socket] = set()
+        self.lock = threading.Lock()
+        super().__init__(socket_path, RequestHandler)
+
+    def add_connection(self, connection: socket.socket) -> None:
+        with self.lock:
+            self.connections.add(connection)
+
+    def remove_connection(self, connection: socket.socket) -> None:
+        with self.lock:
+            self.connections.discard(connection)
+
+    def stop(self) -> None:
+        """Stops accepting connections, and closes the open ones for reading so that they
+        end after their current request. Must not be called from the serving thread."""
+        self.shutdown()
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+
+    def process(self, request: Any) -> dict[str, Any]:
+        """Returns the response to a decoded request, which may be any JSON value"""
+        if not isinstance(request, dict):
+            return {'error': 'Invalid request: a JSON object expected'}
+        if request.get('command') == 'ping':
+            return {'status': 'ok'}
+        try:
+            return {'results': self.extract(request)}
+        except InvalidRequest as exc:
+            return {'error': f'Invalid request: {exc}'}
+        except Exception as exc:
+            return {'error': repr(exc)}
+
+    def extract(self, request: dict[str, Any]) -> Results:
+        trace = bool(request.get('trace', False))
+        if 'path' in request:
+            if not isinstance(request['path'], str) or not os.path.isabs(request['path']):
+                raise InvalidRequest('the path must be absolute')
+            return self.pool.run(request['path'], trace)
+        if 'data' in request:
+            if not isinstance(request['data'], str):
+                raise InvalidRequest('the data must be a base64 string')
+            try:
+                data = base64.b64decode(request['data'], validate=True)
+            except binascii.Error as exc:
+                raise InvalidRequest(exc) from exc
+            with tempfile.NamedTemporaryFile(suffix='.pdf') as file:
+                file.write(data)
+                file.flush()
+                return self.pool.run(file.name, trace)
+        raise InvalidRequest('path, data or command expected')
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
@@ -0,0 +1,22 @@
+"""Client for the Meteor daemon, see the daemon module
+
+Only the standard library is imported, so that clients start quickly.
+"""
+
+
+import json
+import socket
+from typing import Any
+
+
+def send(socket_path: str, requests: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Sends requests to the daemon on one connection, and returns the responses"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile('rwb') as stream:
+            responses = []
+            for request in requests:
+                stream.write(json.dumps(request).encode() + b'\n')
+                stream.flush()
+                responses.append(json.loads(stream.readline()))
+    return responses
@@ -0,0 +1,138 @@
+"""Asynchronous fetching of files submitted by URL"""
+
+
+import asyncio
+import os
+from typing import Mapping, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from src import metrics
+from src.remote_pdf import RemotePdf, RangeRequestError, FileTooLarge
+
+
+# Response headers identifying a version of a file, and the request headers to send them back
+CONDITIONAL_HEADERS = {'ETag': 'If-None-Match', 'Last-Modified': 'If-Modified-Since'}
+
+
+class NotModified(Exception):
+    """The file has not changed since the validators were received"""
+
+
+def get_validators(headers: Mapping[str, Optional[str]]) -> dict[str, str]:
+    return {name: value for name in CONDITIONAL_HEADERS if (value := headers.get(name))}
+
+
+def conditional_headers(validators: dict[str, str]) -> dict[str, str]:
+    return {CONDITIONAL_HEADERS[name]: value for name, value in validators.items()}
+
+
+class Fetcher:
+    """Downloads files with a pool of HTTP connections shared by all requests.
+
+    A single streaming GET checks the size of the file, from the Content-Length header when
+    present and otherwise while reading, and downloads it. With use_range_requests, only the
+    parts of PDF files that Meteor reads are fetched when possible, see the remote_pdf module.
+    Files are opened, written and removed in threads, so that the event loop is never blocked
+    by the disk.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, size_limit: int,
+                 max_connections: int = 100,
+                 timeout: float = 300,
+                 use_range_requests: bool = False) -> None:
+        self.size_limit = size_limit
+        self.use_range_requests = use_range_requests
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout, connect=30),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections)
+        )
+
+    @staticmethod
+    def too_large() -> HTTPException:
+        return HTTPException(status_code=400, detail="File too large")
+
+    async def fetch(self, url: str, filepath: str,
+                    validators: Optional[dict[str, str]] = None,
+                    pages: tuple[int, int] = (5, 5)) -> dict[str, str]:
+        """Fetches the file to filepath, and returns its validators (ETag and Last-Modified
+        headers). With the validators of an earlier fetch, NotModified is raised if the server
+        replies that the file has not changed. With range requests, only the first and last
+        pages are fetched."""
+        if self.use_range_requests:
+            if validators:
+                await self.check_modified(url, validators)
+            partial_validators = await self.fetch_partial(url, filepath, pages)
+            if partial_validators is not None:
+                return partial_validators
+            validators = None
+        return await self.download(url, filepath, validators)
+
+    async def check_modified(self, url: str, validators: dict[str, str]) -> None:
+        try:
+            response = await self.client.head(url, headers=conditional_headers(validators))
+        except httpx.HTTPError:
+            return
+        if response.status_code == 304:
+            raise NotModified(url)
+
+    async def fetch_partial(self, url: str, filepath: str,
+                            pages: tuple[int, int] = (5, 5)) -> Optional[dict[str, str]]:
+        """Fetches only the parts of the file Meteor reads. Returns None if the server
+        or the file does not allow it."""
+        remote_pdf = RemotePdf(url, self.client, max_size=self.size_limit)
+        try:
+            await remote_pdf.save(filepath, *pages)
+        except FileTooLarge as exc:
+            raise Fetcher.too_large() from exc
+        except (RangeRequestError, httpx.HTTPError):
+            return None
+        metrics.REMOTE_FETCHES.labels('partial').inc()
+        metrics.REMOTE_BYTES.labels('partial').inc(remote_pdf.bytes_fetched)
+        return get_validators({'ETag': remote_pdf.etag, 'Last-Modified': remote_pdf.last_modified})
+
+    async def download(self, url: str, filepath: str,
+                       validators: Optional[dict[str, str]] = None) -> dict[str, str]:
+        downloaded_size = 0
+        headers = conditional_headers(validators) if validators else {}
+        try:
+            async with self.client.stream('GET', url, headers=headers) as response:
+                if validators and response.status_code == 304:
+                    raise NotModified(url)
+                if not response.is_success:
+                    raise HTTPException(status_code=400, detail="Unable to download file "
+                                                                f"(status {response.status_code})")
+                content_length = response.headers.get('Content-Length', '')
+                if content_length.isdigit() and int(content_length) > self.size_limit:
+                    raise Fetcher.too_large()
+                outfile = await asyncio.to_thread(open, filepath, 'wb')
+                try:
+                    async for chunk in response.aiter_bytes(Fetcher.CHUNK_SIZE):
+                        downloaded_size += len(chunk)
+                        if downloaded_size > self.size_limit:
+                            raise Fetcher.too_large()
+                        await asyncio.to_thread(outfile.write, chunk)
+                finally:
+                    await asyncio.to_thread(outfile.close)
+        except httpx.HTTPError as exc:
+            await asyncio.to_thread(Fetcher.remove, filepath)
+            raise HTTPException(status_code=400, detail="Unable to download file") from exc
+        except HTTPException:
+            await asyncio.to_thread(Fetcher.remove, filepath)
+            raise
+        metrics.REMOTE_FETCHES.labels('full').inc()
+        metrics.REMOTE_BYTES.labels('full').inc(downloaded_size)
+        return get_validators(response.headers)
+
+    @staticmethod
+    def remove(filepath: str) -> None:
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,170 @@
+"""Prometheus metrics for the FastAPI service
+
+When the service runs in several processes (e.g. `uvicorn --workers`), set the environment
+variable PROMETHEUS_MULTIPROC_DIR to a directory shared by all of them, so that the `/metrics`
+endpoint reports values collected across processes. Each process holds a shared lock on a file
+of the directory from the import of this module: the first process of the service, which finds
+no other lock, clears the values left by a previous run. The service removes the live gauges of
+its processes when they stop, and those of extraction workers when they are killed.
+"""
+
+
+import fcntl
+import glob
+import os
+from typing import IO, Optional
+
+import prometheus_client
+from prometheus_client import multiprocess, CollectorRegistry, Counter, Gauge, Histogram
+
+from metadata_extract.trace import TraceType
+
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+LOCK_FILE = 'meteor.lock'
+
+
+def lock_directory() -> Optional[IO[str]]:
+    """Clears the multiprocess directory if no other process of the service uses it, then
+    returns its lock file, opened with a shared lock held until the process exits. Processes
+    create their files in the directory once they hold the lock, so that none are removed."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not directory:
+        return None
+    # pylint: disable-next=consider-using-with
+    lock_file = open(os.path.join(directory, LOCK_FILE), 'a', encoding='utf-8')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+    except BlockingIOError:
+        pass
+    fcntl.flock(lock_file, fcntl.LOCK_SH)
+    return lock_file
+
+
+# Taken before the metrics below create the files of this process
+DIRECTORY_LOCK = lock_directory()
+
+REQUESTS = Counter(
+    'meteor_http_requests_total',
+    'Number of HTTP requests',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'meteor_http_request_duration_seconds',
+    'Duration of HTTP requests',
+    ['method', 'endpoint'],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+STAGE_DURATION = Histogram(
+    'meteor_stage_duration_seconds',
+    'Wall time spent in each extraction stage',
+    ['stage'],
+    buckets=(.001, .005, .01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+PAGES_PROCESSED = Counter(
+    'meteor_pages_processed_total',
+    'Number of pages extracted from documents'
+)
+DOCUMENT_SIZE = Histogram(
+    'meteor_document_size_bytes',
+    'Size of processed files',
+    buckets=tuple(2 ** n for n in range(14, 35, 2))
+)
+REGISTRY_CALLS = Counter(
+    'meteor_registry_calls_total',
+    'Number of queries to the publisher registry'
+)
+REGISTRY_SECONDS = Counter(
+    'meteor_registry_seconds_total',
+    'Time spent querying the publisher registry'
+)
+
+EXTRACTION_QUEUE = Gauge(
+    'meteor_extraction_queue_depth',
+    'Number of requests waiting for an extraction slot',
+    multiprocess_mode='livesum'
+)
+EXTRACTIONS_IN_PROGRESS = Gauge(
+    'meteor_extractions_in_progress',
+    'Number of extractions currently running',
+    multiprocess_mode='livesum'
+)
+UPLOAD_BYTES_IN_FLIGHT = Gauge(
+    'meteor_upload_bytes_in_flight',
+    'Total size of the requests currently being handled',
+    multiprocess_mode='livesum'
+)
+ADMISSION_REJECTIONS = Counter(
+    'meteor_admission_rejections_total',
+    'Number of requests rejected because the service is overloaded',
+    ['reason']
+)
+WORKER_RESTARTS = Counter(
+    'meteor_worker_restarts_total',
+    'Number of extraction workers killed and replaced',
+    ['reason']
+)
+REMOTE_FETCHES = Counter(
+    'meteor_remote_fetches_total',
+    'Number of remote files fetched with range requests (partial) or downloaded (full)',
+    ['mode']
+)
+REMOTE_BYTES = Counter(
+    'meteor_remote_bytes_total',
+    'Number of bytes fetched from remote files',
+    ['mode']
+)
+URL_CACHE_REQUESTS = Counter(
+    'meteor_url_cache_requests_total',
+    'Number of URL submissions by cache result: hit (not modified), modified or miss',
+    ['result']
+)
+RESULT_CACHE_REQUESTS = Counter(
+    'meteor_result_cache_requests_total',
+    'Number of lookups of files on disk in the result cache by /file and /scan, by result: '
+    'hit or miss',
+    ['result']
+)
+WATCHER_BACKLOG = Gauge(
+    'meteor_watcher_backlog',
+    'Number of new or changed documents waiting to be extracted by the watcher',
+    multiprocess_mode='livesum'
+)
+WATCHER_EXTRACTIONS = Counter(
+    'meteor_watcher_extractions_total',
+    'Number of documents extracted in advance by the watcher',
+    ['status']
+)
+
+
+def observe_request(method: str, endpoint: str, status: int, duration: float) -> None:
+    REQUESTS.labels(method, endpoint, str(status)).inc()
+    REQUEST_DURATION.labels(method, endpoint).observe(duration)
+
+
+def observe_trace(trace: TraceType, file_size: int) -> None:
+    """Records the measures of a traced Meteor run"""
+    if file_size:
+        DOCUMENT_SIZE.observe(file_size)
+    for stage in trace['stages']:
+        STAGE_DURATION.labels(stage['name']).observe(stage['wallTime'])
+        PAGES_PROCESSED.inc(stage['pagesTouched'])
+        if stage['registryCalls']:
+            REGISTRY_CALLS.inc(stage['registryCalls'])
+            REGISTRY_SECONDS.inc(stage['registryTime'])
+
+
+def generate_latest() -> bytes:
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+
+def mark_process_dead(pid: int) -> None:
+    """Removes the live gauges of a process which exited"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)  # type: ignore[no-untyped-call]
@@ -0,0 +1,440 @@
+"""Fetching of remote PDF files with HTTP range requests
+
+Meteor only reads the first and last pages of a document. For a remote file, RemotePdf
+fetches the trailer and the cross-reference sections, then only the objects needed to load
+these pages, and writes them at their original offsets in a sparse local file which MuPDF
+opens as usual. When this is not possible (no range support on the server, encrypted or
+malformed file, too many objects to fetch...), RangeRequestError is raised and the caller
+should fall back to a full download. The requests go through a shared httpx.AsyncClient.
+"""
+
+
+# pylint: disable=broad-exception-caught
+
+import asyncio
+import bisect
+import re
+import zlib
+from typing import Optional
+
+import fitz
+import httpx
+
+
+class RangeRequestError(Exception):
+    """The file cannot be fetched partially"""
+
+
+class FileTooLarge(Exception):
+    """The remote file is larger than allowed"""
+
+
+REF_PATTERN = re.compile(rb'(\d+)\s+(\d+)\s+R(?![A-Za-z])')
+# References that lead away from the selected pages: parent nodes in the page tree
+# and the page that an annotation or a structure element belongs to
+NO_FOLLOW_PATTERN = re.compile(rb'/(?:Parent|P|StructParent)\s+\d+\s+\d+\s+R(?![A-Za-z])')
+OBJ_PATTERN = re.compile(rb'\s*\d+\s+\d+\s+obj')
+STREAM_PATTERN = re.compile(rb'stream(?:\r\n|\n|\r)')
+PAGE_TYPE_PATTERN = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+PAGES_TYPE_PATTERN = re.compile(rb'/Type\s*/Pages(?![A-Za-z])')
+# Catalog entries MuPDF needs when opening a document or loading pages
+CATALOG_KEYS = [b'OCProperties', b'AcroForm']
+
+
+def get_int(dictionary: bytes, key: bytes) -> Optional[int]:
+    match = re.search(rb'/' + key + rb'\s+(\d+)(?![\d.])(?!\s+\d+\s+R)', dictionary)
+    return int(match.group(1)) if match else None
+
+
+def get_ref(dictionary: bytes, key: bytes) -> Optional[int]:
+    match = re.search(rb'/' + key + rb'\s+(\d+)\s+\d+\s+R(?![A-Za-z])', dictionary)
+    return int(match.group(1)) if match else None
+
+
+def get_array(dictionary: bytes, key: bytes) -> Optional[bytes]:
+    match = re.search(rb'/' + key + rb'\s*\[([^\]]*)\]', dictionary)
+    return match.group(1) if match else None
+
+
+def png_unpredict(data: bytes, columns: int) -> bytes:
+    """Reverses PNG predictors applied row by row, with one byte per pixel,
+    as used in cross-reference streams."""
+    output = bytearray()
+    previous = bytearray(columns)
+    for row_start in range(0, len(data), columns + 1):
+        filter_type = data[row_start]
+        row = bytearray(data[row_start + 1:row_start + 1 + columns])
+        for i, value in enumerate(row):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            up_left = previous[i - 1] if i else 0
+            if filter_type == 1:
+                row[i] = (value + left) & 0xFF
+            elif filter_type == 2:
+                row[i] = (value + up) & 0xFF
+            elif filter_type == 3:
+                row[i] = (value + (left + up) // 2) & 0xFF
+            elif filter_type == 4:
+                estimate = left + up - up_left
+                closest = min((abs(estimate - left), 0, left),
+                              (abs(estimate - up), 1, up),
+                              (abs(estimate - up_left), 2, up_left))[2]
+                row[i] = (value + closest) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+class RemotePdf:  # pylint: disable=too-many-instance-attributes
+    """A partial copy of a remote PDF file, fetched block by block with range requests"""
+
+    BLOCK_SIZE = 4 * 1024
+    # Reading a few more blocks is cheaper than sending another request
+    MAX_GAP_BLOCKS = 4
+    TAIL_BLOCKS = 8
+    MAX_REQUESTS = 200
+    MAX_CONCURRENT_REQUESTS = 4
+    MAX_FETCHED_RATIO = 0.5
+
+    def __init__(self, url: str, client: httpx.AsyncClient, max_size: int = 0) -> None:
+        self.url = url
+        self.client = client
+        self.max_size = max_size
+        self.size = 0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.blocks: dict[int, bytes] = {}
+        self.requests = 0
+        self.semaphore = asyncio.Semaphore(RemotePdf.MAX_CONCURRENT_REQUESTS)
+        # Object number -> (1, offset, 0) or (2, object stream number, index)
+        self.xref: dict[int, tuple[int, int, int]] = {}
+        self.offsets: list[int] = []
+        self.objects: dict[int, bytes] = {}
+        self.object_streams: dict[int, dict[int, bytes]] = {}
+
+    async def request(self, first: int, last: Optional[int] = None) -> httpx.Response:
+        """Requests bytes first to last (inclusive), or the last -first bytes if last is None"""
+        if self.requests >= self.MAX_REQUESTS:
+            raise RangeRequestError('Too many range requests')
+        self.requests += 1
+        byte_range = f'bytes={first}-{last}' if last is not None else f'bytes=-{-first}'
+        headers = {'Range': byte_range}
+        if self.etag:
+            # The server sends the full file if it has changed, which is rejected below
+            headers['If-Range'] = self.etag
+        request = self.client.build_request('GET', self.url, headers=headers)
+        async with self.semaphore:
+            response = await self.client.send(request, stream=True)
+            if response.status_code != 206:
+                # Do not read the body, it is likely the full file
+                await response.aclose()
+                raise RangeRequestError(f'Range request failed with status {response.status_code}')
+            await response.aread()
+        return response
+
+    async def fetch(self, spans: list[tuple[int, int]]) -> None:
+        """Fetches the blocks covering the given [start, end) spans, merging close ranges.
+        The ranges are requested concurrently."""
+        missing = sorted({
+            block for start, end in spans
+            for block in range(max(start, 0) // RemotePdf.BLOCK_SIZE,
+                               (min(end, self.size) - 1) // RemotePdf.BLOCK_SIZE + 1)
+            if block not in self.blocks
+        })
+        groups: list[list[int]] = []
+        for block in missing:
+            if groups and block - groups[-1][1] <= RemotePdf.MAX_GAP_BLOCKS + 1:
+                groups[-1][1] = block
+            else:
+                groups.append([block, block])
+        await asyncio.gather(*(self.fetch_blocks(first, last) for first, last in groups))
+        if self.bytes_fetched > self.size * self.MAX_FETCHED_RATIO:
+            raise RangeRequestError('Too large part of the file needed')
+
+    async def fetch_blocks(self, first_block: int, last_block: int) -> None:
+        start = first_block * RemotePdf.BLOCK_SIZE
+        end = min((last_block + 1) * RemotePdf.BLOCK_SIZE, self.size)
+        data = (await self.request(start, end - 1)).content
+        if len(data) != end - start:
+            raise RangeRequestError('Unexpected length of range response')
+        for block in range(first_block, last_block + 1):
+            offset = block * RemotePdf.BLOCK_SIZE - start
+            self.blocks[block] = data[offset:offset + RemotePdf.BLOCK_SIZE]
+
+    @property
+    def bytes_fetched(self) -> int:
+        return sum(len(data) for data in self.blocks.values())
+
+    async def read(self, start: int, end: int) -> bytes:
+        end = min(end, self.size)
+        await self.fetch([(start, end)])
+        first_block = start // RemotePdf.BLOCK_SIZE
+        last_block = (end - 1) // RemotePdf.BLOCK_SIZE
+        data = b''.join(self.blocks[block] for block in range(first_block, last_block + 1))
+        offset = first_block * RemotePdf.BLOCK_SIZE
+        return data[start - offset:end - offset]
+
+    async def read_until(self, start: int, keyword: bytes) -> bytes:
+        """Reads from start until after the first occurrence of keyword"""
+        length = RemotePdf.BLOCK_SIZE * RemotePdf.TAIL_BLOCKS
+        while True:
+            data = await self.read(start, start + length)
+            index = data.find(keyword)
+            if index >= 0:
+                return data[:index + len(keyword)]
+            if start + length >= self.size:
+                raise RangeRequestError(f'Keyword {keyword!r} not found')
+            length *= 2
+
+    async def fetch_tail(self) -> bytes:
+        response = await self.request(-RemotePdf.BLOCK_SIZE * RemotePdf.TAIL_BLOCKS)
+        content_range = response.headers.get('Content-Range', '')
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)', content_range)
+        if not match:
+            raise RangeRequestError('Missing or invalid Content-Range header')
+        self.size = int(match.group(3))
+        if self.max_size and self.size > self.max_size:
+            raise FileTooLarge(self.url)
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        data = response.content
+        start = int(match.group(1))
+        if start % RemotePdf.BLOCK_SIZE:
+            # Keep blocks aligned, the tail is read again through the block cache
+            await self.fetch([(start, self.size)])
+        else:
+            for i in range(0, len(data), RemotePdf.BLOCK_SIZE):
+                self.blocks[(start + i) // RemotePdf.BLOCK_SIZE] = \
+                    data[i:i + RemotePdf.BLOCK_SIZE]
+        return await self.read(max(self.size - 1024, 0), self.size)
+
+    @staticmethod
+    def stream_data(obj: bytes) -> bytes:
+        match = STREAM_PATTERN.search(obj)
+        if not match:
+            raise RangeRequestError('Stream expected')
+        end = obj.rfind(b'endstream')
+        data = obj[match.end():end if end > 0 else len(obj)]
+        dictionary = obj[:match.start()]
+        filters = re.search(rb'/Filter\s*(?:/(\w+)|\[([^\]]*)\])', dictionary)
+        if filters:
+            names = [filters.group(1)] if filters.group(1) else filters.group(2).split()
+            if [n.lstrip(b'/') for n in names] != [b'FlateDecode']:
+                raise RangeRequestError('Unsupported stream filter')
+            data = zlib.decompressobj().decompress(data)
+        predictor = get_int(dictionary, b'Predictor')
+        if predictor and predictor >= 10:
+            data = png_unpredict(data, get_int(dictionary, b'Columns') or 1)
+        return data
+
+    async def read_xref_table(self, offset: int) -> bytes:
+        """Parses a classic cross-reference table and returns its trailer"""
+        section = await self.read_until(offset, b'startxref')
+        table, _, trailer = section.partition(b'trailer')
+        lines = table.split()[1:]
+        position = 0
+        while position + 1 < len(lines):
+            first, count = int(lines[position]), int(lines[position + 1])
+            position += 2
+            for number in range(first, first + count):
+                offset_field, _, kind = lines[position:position + 3]
+                position += 3
+                if kind == b'n' and number not in self.xref:
+                    self.xref[number] = (1, int(offset_field), 0)
+        return trailer
+
+    async def read_xref_stream(self, offset: int) -> bytes:
+        """Parses a cross-reference stream and returns its dictionary"""
+        obj = await self.read_until(offset, b'endstream')
+        dictionary = obj[:STREAM_PATTERN.search(obj).start()]  # type: ignore[union-attr]
+        widths = [int(w) for w in (get_array(dictionary, b'W') or b'').split()]
+        if len(widths) != 3:
+            raise RangeRequestError('Invalid cross-reference stream')
+        index = [int(i) for i in (get_array(dictionary, b'Index') or b'').split()] \
+            or [0, get_int(dictionary, b'Size') or 0]
+        data = RemotePdf.stream_data(obj)
+        position = 0
+        for first, count in zip(index[::2], index[1::2]):
+            for number in range(first, first + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[position:position + width], 'big'))
+                    position += width
+                kind = fields[0] if widths[0] else 1
+                if kind in (1, 2) and number not in self.xref:
+                    self.xref[number] = (kind, fields[1], fields[2])
+        return dictionary
+
+    async def read_xref(self, startxref: int) -> bytes:
+        """Follows the chain of cross-reference sections, newest first, and returns the
+        newest trailer dictionary"""
+        newest_trailer = None
+        offset: Optional[int] = startxref
+        visited = set()
+        while offset is not None and offset not in visited:
+            visited.add(offset)
+            self.offsets.append(offset)
+            if (await self.read(offset, offset + 32)).lstrip().startswith(b'xref'):
+                trailer = await self.read_xref_table(offset)
+                xref_stream = get_int(trailer, b'XRefStm')
+                if xref_stream is not None:
+                    self.offsets.append(xref_stream)
+                    await self.read_xref_stream(xref_stream)
+            else:
+                trailer = await self.read_xref_stream(offset)
+            if newest_trailer is None:
+                newest_trailer = trailer
+            offset = get_int(trailer, b'Prev')
+        if newest_trailer is None:
+            raise RangeRequestError('No cross-reference section')
+        self.offsets.extend(o for kind, o, _ in self.xref.values() if kind == 1)
+        self.offsets.append(self.size)
+        self.offsets.sort()
+        return newest_trailer
+
+    def span(self, number: int) -> tuple[int, int]:
+        kind, offset, _ = self.xref[number]
+        if kind == 2:
+            return self.span(offset)
+        index = bisect.bisect_right(self.offsets, offset)
+        return offset, self.offsets[index] if index < len(self.offsets) else self.size
+
+    async def get_object(self, number: int) -> bytes:
+        """Returns the object content, without the stream data"""
+        if number not in self.objects:
+            kind, container, index = self.xref[number]
+            if kind == 2:
+                self.objects[number] = (await self.get_object_stream(container))[index]
+            else:
+                data = await self.read(*self.span(number))
+                match = OBJ_PATTERN.match(data)
+                if not match:
+                    raise RangeRequestError(f'Object {number} not found at its offset')
+                data = data[match.end():]
+                stream = STREAM_PATTERN.search(data)
+                end = data.find(b'endobj')
+                if stream and (end < 0 or stream.start() < end):
+                    end = stream.start()
+                self.objects[number] = data[:end] if end >= 0 else data
+        return self.objects[number]
+
+    async def get_object_stream(self, number: int) -> dict[int, bytes]:
+        """Returns the objects contained in an object stream, by index"""
+        if number not in self.object_streams:
+            data = await self.read(*self.span(number))
+            match = OBJ_PATTERN.match(data)
+            if not match:
+                raise RangeRequestError(f'Object stream {number} not found at its offset')
+            obj = data[match.end():]
+            first = get_int(obj, b'First') or 0
+            content = RemotePdf.stream_data(obj)
+            header = [int(n) for n in content[:first].split()]
+            offsets = header[1::2] + [len(content) - first]
+            self.object_streams[number] = {
+                i: content[first + offsets[i]:first + offsets[i + 1]]
+                for i in range(len(offsets) - 1)
+            }
+        return self.object_streams[number]
+
+    async def prefetch(self, numbers: list[int]) -> None:
+        await self.fetch([self.span(n) for n in numbers if n in self.xref])
+
+    async def find_page(self, node: int, index: int) -> int:
+        """Returns the object number of the page at `index` in the page tree below `node`.
+        All kids of the nodes on the path are loaded, since MuPDF reads them too."""
+        while True:
+            kids = [int(ref[0]) for ref in REF_PATTERN.findall(
+                get_array(await self.get_object(node), b'Kids') or b'')]
+            await self.prefetch(kids)
+            for kid in kids:
+                kid_object = await self.get_object(kid)
+                is_node = PAGES_TYPE_PATTERN.search(kid_object) or (
+                    not PAGE_TYPE_PATTERN.search(kid_object) and b'/Kids' in kid_object)
+                count = (get_int(kid_object, b'Count') or 0) if is_node else 1
+                if index < count:
+                    if not is_node:
+                        return kid
+                    node = kid
+                    break
+                index -= count
+            else:
+                raise RangeRequestError('Page not found in page tree')
+
+    async def collect(self, numbers: list[int], pages: set[int]) -> None:
+        """Loads the objects and all objects they refer to. Pages that are not selected
+        are loaded, but not their content."""
+        seen: set[int] = set()
+        frontier = numbers
+        while frontier:
+            frontier = [n for n in dict.fromkeys(frontier) if n in self.xref and n not in seen]
+            await self.prefetch(frontier)
+            next_frontier: list[int] = []
+            for number in frontier:
+                seen.add(number)
+                obj = await self.get_object(number)
+                if number not in pages and PAGE_TYPE_PATTERN.search(obj):
+                    continue
+                next_frontier.extend(
+                    int(ref[0]) for ref in REF_PATTERN.findall(NO_FOLLOW_PATTERN.sub(b'', obj))
+                )
+            frontier = next_frontier
+
+    async def load(self, start: int, end: int) -> list[int]:
+        """Fetches what is needed to read the first `start` and last `end` pages,
+        and returns the indices of these pages."""
+        tail = await self.fetch_tail()
+        await self.fetch([(0, RemotePdf.BLOCK_SIZE)])
+        startxref = re.findall(rb'startxref\s+(\d+)', tail)
+        if not startxref:
+            raise RangeRequestError('startxref not found')
+        trailer = await self.read_xref(int(startxref[-1]))
+        if b'/Encrypt' in trailer:
+            raise RangeRequestError('Encrypted file')
+        root = get_ref(trailer, b'Root')
+        if root is None:
+            raise RangeRequestError('No document catalog')
+        catalog = await self.get_object(root)
+        page_tree = get_ref(catalog, b'Pages')
+        if page_tree is None:
+            raise RangeRequestError('No page tree')
+        page_count = get_int(await self.get_object(page_tree), b'Count') or 0
+        if page_count < start + end:
+            indices = list(range(page_count))
+        else:
+            indices = list(range(start)) + list(range(page_count - end, page_count))
+        pages = [await self.find_page(page_tree, i) for i in indices]
+        to_collect = [ref for ref in (get_ref(catalog, k) for k in CATALOG_KEYS) if ref]
+        info = get_ref(trailer, b'Info')
+        if info is not None:
+            to_collect.append(info)
+        await self.collect(to_collect + pages, set(pages))
+        return indices
+
+    async def save(self, filepath: str, start: int = 5, end: int = 5) -> None:
+        """Fetches what is needed for the first `start` and last `end` pages and writes it
+        to a sparse file at filepath"""
+        try:
+            indices = await self.load(start, end)
+        except (RangeRequestError, FileTooLarge):
+            raise
+        except Exception as exc:
+            raise RangeRequestError('Unable to parse file') from exc
+        await asyncio.to_thread(self.write, filepath, indices)
+
+    def write(self, filepath: str, indices: list[int]) -> None:
+        """Writes the fetched blocks to a sparse file, and checks that MuPDF can read the
+        selected pages from it without having to repair the file."""
+        with open(filepath, 'wb') as outfile:
+            outfile.truncate(self.size)
+            for block, data in self.blocks.items():
+                outfile.seek(block * RemotePdf.BLOCK_SIZE)
+                outfile.write(data)
+        try:
+            with fitz.open(filepath) as doc:
+                for index in indices:
+                    doc.load_page(index).get_text()
+                repaired = doc.is_repaired
+        except Exception as exc:
+            raise RangeRequestError('MuPDF cannot read partial file') from exc
+        if repaired:
+            raise RangeRequestError('MuPDF had to repair partial file')
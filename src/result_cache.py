@@ -0,0 +1,76 @@
+"""Cache of extraction results for files on disk"""
+
+
+import json
+import os
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+from metadata_extract.archive import is_alto_file
+from metadata_extract.metadata import Results
+
+
+class DocumentKey(NamedTuple):
+    """Identifies a version of a document: a file or a directory of ALTO files"""
+    path: str
+    size: int
+    mtime: float
+
+
+def document_key(path: str) -> DocumentKey:
+    """Returns the key of the document at path. The size and modification time of an ALTO
+    document are the total size and latest modification time of its XML files."""
+    path = os.path.realpath(path)
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return DocumentKey(path, stat.st_size, stat.st_mtime)
+    size, mtime = 0, os.stat(path).st_mtime
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if is_alto_file(entry.name) and entry.is_file():
+                stat = entry.stat()
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime)
+    return DocumentKey(path, size, mtime)
+
+
+class ResultCache:
+    """Results stored in a SQLite file, keyed by the path, size and modification time of
+    the document, so that changed documents are extracted again.
+
+    The connection is shared, so accesses from several threads are serialized. Several
+    processes can use the same file.
+    """
+
+    def __init__(self, cache_file: str) -> None:
+        self.connection = sqlite3.connect(cache_file, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime REAL, results TEXT)'
+            )
+
+    def get(self, key: DocumentKey) -> Optional[Results]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT results FROM results WHERE path = ? AND size = ? AND mtime = ?', key
+            ).fetchone()
+        if row is None:
+            return None
+        results: Results = json.loads(row[0])
+        return results
+
+    def put(self, key: DocumentKey, results: Results) -> None:
+        results = results.copy()
+        results.pop('trace', None)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                (*key, json.dumps(results, ensure_ascii=False))
+            )
+
+    def close(self) -> None:
+        self.connection.close()
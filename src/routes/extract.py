@@ -3,20 +3,51 @@
 
 # pylint: disable=broad-exception-caught
 
-from typing import Annotated, Optional
+import json
+import os
+from typing import Annotated, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from starlette.datastructures import UploadFile
 from starlette.requests import Request
-from starlette.responses import HTMLResponse, JSONResponse, Response
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from starlette.templating import _TemplateResponse, Jinja2Templates
 
+from metadata_extract.meteor_document import PageWindow
+from src.admission import AdmissionController
 from src.settings import get_settings, Settings
 from src.util import Utils
+from src.worker_pool import ExtractionTimeout
 
 router = APIRouter(tags=['Extract metadata from file'])
 templates = Jinja2Templates(directory="templates")
 utils = Utils()
+admission = AdmissionController(
+    max_concurrent=get_settings().MAX_CONCURRENT_EXTRACTIONS,
+    max_queued=get_settings().MAX_QUEUED_EXTRACTIONS,
+    max_bytes=get_settings().MAX_UPLOADS_IN_FLIGHT_MB * 1024 * 1024,
+    retry_after=get_settings().RETRY_AFTER_SECONDS
+)
+
+
+def uploaded_files(values: list[Union[UploadFile, str]]) -> list[UploadFile]:
+    return [value for value in values if isinstance(value, UploadFile)]
+
+
+def page_window(
+        start: Annotated[Optional[int], Query(ge=1)] = None,
+        end: Annotated[Optional[int], Query(ge=0)] = None,
+        step: Annotated[Optional[int], Query(ge=0)] = None,
+        max_pages: Annotated[Optional[int], Query(ge=1)] = None
+) -> Optional[PageWindow]:
+    """Pages read for a request: the first `start` and last `end` pages, and with a `step`,
+    up to `step` more pages on each side while ISBN, publisher or year is missing, without
+    reading more than `max_pages` pages (at most MAX_PAGES). Unset values are taken from the
+    settings."""
+    if start is None and end is None and step is None and max_pages is None:
+        return None
+    return Utils.page_window(start, end, step, max_pages)
 
 
 @router.post("/", response_class=HTMLResponse)
@@ -24,26 +55,29 @@ async def post_pdf_html(
         request: Request
 ) -> _TemplateResponse:
     """
-    Extract metadata from a PDF from either
-    an uploaded file or a URL and display
+    Extract metadata from a PDF or an ALTO document from either
+    uploaded files or a URL and display
     it in an HTML template
     """
-    form = await request.form()
-    file_input = form.get('fileInput')
-    file_url = form.get('fileUrl')
-
-    if file_url != "" and isinstance(file_url, str):
-        utils.verify_url(file_url)
-        filename: Optional[str] = file_url
-        filepath = utils.download_file(file_url)
-        results = utils.process_and_remove(filename, filepath)
-    elif file_input is not None and isinstance(file_input, UploadFile):
-        utils.verify_file(file_input)
-        filename = file_input.filename
-        filepath = utils.save_file(file_input)
-        results = utils.process_and_remove(filename, filepath)
-    else:
-        raise HTTPException(400)
+    async with admission.upload(request) as counted_request:
+        form = await counted_request.form()
+        file_input = uploaded_files(form.getlist('fileInput'))
+        file_url = form.get('fileUrl')
+
+        if file_url != "" and isinstance(file_url, str):
+            filename: Optional[str] = file_url
+            # The extraction slot is only taken once the file is downloaded
+            filepath = await utils.download_file(file_url)
+            async with admission.extraction():
+                results = await run_in_threadpool(utils.process_and_remove, filename, filepath)
+        elif file_input:
+            utils.verify_files(file_input)
+            filename = ', '.join(str(file.filename) for file in file_input)
+            async with admission.extraction():
+                filepath = await run_in_threadpool(utils.save_files, file_input)
+                results = await run_in_threadpool(utils.process_and_remove, filename, filepath)
+        else:
+            raise HTTPException(400)
     return templates.TemplateResponse(
         "index.html",
         {
@@ -60,38 +94,78 @@ async def post_pdf_html(
 
 @router.post("/json", response_class=JSONResponse)
 async def post_pdf_json(
-        request: Request
+        request: Request,
+        window: Annotated[Optional[PageWindow], Depends(page_window)],
+        trace: bool = False
 ) -> Response:
     """
-    Extract metadata from a PDF file and return it as JSON
+    Extract metadata from a PDF file or an ALTO document (a ZIP archive, or its XML files
+    as several `fileInput` parts) and return it as JSON. PDF files without a text layer
+    get empty results with the `NO_TEXT_LAYER` status and the 422 status code.
+    With `?trace=1`, timings for each extraction stage are included.
+    The pages read can be set with `start`, `end`, `step` and `max_pages`.
     """
-    form = await request.form()
-    file_input = form.get('fileInput')
-    file_url = form.get('fileUrl')
-
-    if file_url != "" and isinstance(file_url, str):
-        utils.verify_url(file_url)
-        filepath = utils.download_file(file_url)
-        results = utils.process_and_remove(file_url, filepath, delete_immediately=True)
-    elif file_input is not None and isinstance(file_input, UploadFile):
-        utils.verify_file(file_input)
-        filepath = utils.save_file(file_input)
-        results = utils.process_and_remove(file_input.filename, filepath, delete_immediately=True)
-    else:
-        raise HTTPException(400)
-    return JSONResponse(results)
+    async with admission.upload(request) as counted_request:
+        form = await counted_request.form()
+        file_input = uploaded_files(form.getlist('fileInput'))
+        file_url = form.get('fileUrl')
+
+        if file_url != "" and isinstance(file_url, str):
+            results = await utils.process_url(file_url, trace=trace, window=window,
+                                              extraction_slot=admission.extraction)
+        elif file_input:
+            utils.verify_files(file_input)
+            async with admission.extraction():
+                filepath = await run_in_threadpool(utils.save_files, file_input)
+                results = await run_in_threadpool(utils.process_and_remove,
+                                                  file_input[0].filename, filepath,
+                                                  delete_immediately=True, trace=trace,
+                                                  window=window)
+        else:
+            raise HTTPException(400)
+    return JSONResponse(results, status_code=Utils.status_code(results))
 
 
 @router.get("/file/{file_name}", response_class=JSONResponse, status_code=200)
 async def get_metadata_from_file_on_disk(
         file_name: str,
-        conf: Annotated[Settings, Depends(get_settings)]
+        conf: Annotated[Settings, Depends(get_settings)],
+        window: Annotated[Optional[PageWindow], Depends(page_window)],
+        trace: bool = False
 ) -> JSONResponse:
     """
-    Extract metadata from a file on disk and return it as JSON
+    Extract metadata from a file on disk and return it as JSON, with the 422 status code
+    for PDF files without a text layer.
+    With `?trace=1`, timings for each extraction stage are included.
+    The pages read can be set with `start`, `end`, `step` and `max_pages`.
+    """
+    async with admission.extraction():
+        try:
+            results = await run_in_threadpool(utils.extract_file,
+                                              conf.MOUNT_FOLDER + '/' + file_name, trace=trace,
+                                              window=window)
+        except ExtractionTimeout:
+            return JSONResponse({"error": f"Timeout while processing {file_name}"},
+                                status_code=504)
+        except Exception:
+            return JSONResponse({"error": f"Error while processing {file_name}"})
+    return JSONResponse(results, status_code=Utils.status_code(results))
+
+
+@router.get("/scan/{directory:path}", response_class=StreamingResponse, status_code=200)
+def scan_directory(
+        directory: str,
+        conf: Annotated[Settings, Depends(get_settings)]
+) -> StreamingResponse:
+    """
+    Extract metadata from all PDF files and ALTO documents (directories of ALTO files)
+    in a directory of the mounted folder. Results are streamed as JSON lines, in the
+    order they are ready, with paths relative to the directory.
     """
-    try:
-        results = utils.meteor.run(conf.MOUNT_FOLDER + '/' + file_name)
-    except Exception:
-        return JSONResponse({"error": f"Error while processing {file_name}"})
-    return JSONResponse(results)
+    mount_folder = os.path.realpath(conf.MOUNT_FOLDER)
+    path = os.path.realpath(os.path.join(mount_folder, directory))
+    if os.path.commonpath([mount_folder, path]) != mount_folder or not os.path.isdir(path):
+        raise HTTPException(status_code=404, detail=f"No directory {directory}")
+    lines = (json.dumps(result, ensure_ascii=False) + '\n'
+             for result in utils.scanner.scan(path))
+    return StreamingResponse(lines, media_type='application/x-ndjson')
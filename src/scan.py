@@ -0,0 +1,113 @@
+"""Extraction of all documents in a directory"""
+
+
+# pylint: disable=broad-exception-caught
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, NotRequired, Optional, TypedDict
+
+from metadata_extract.archive import is_alto_file, is_archive
+from metadata_extract.metadata import Results
+from src import metrics
+from src.result_cache import ResultCache, document_key
+
+
+class ScanResult(TypedDict):
+    """Results or error for one document, with its path relative to the scanned directory
+    if any"""
+    path: str
+    cached: bool
+    results: NotRequired[Results]
+    error: NotRequired[str]
+
+
+def is_alto_document(path: str) -> bool:
+    with os.scandir(path) as entries:
+        return any(is_alto_file(e.name) and e.is_file() for e in entries)
+
+
+def is_document_file(name: str) -> bool:
+    return name.lower().endswith(('.pdf', '.pdf.gz')) or is_archive(name)
+
+
+def list_directory(path: str) -> tuple[list[str], list[str]]:
+    """Returns the documents directly in directory path (files, then ALTO documents) and its
+    other subdirectories, in a stable order. Symbolic links to directories are not
+    followed."""
+    files, alto_dirs, subdirs = [], [], []
+    try:
+        with os.scandir(path) as scanned:
+            entries = sorted(scanned, key=lambda entry: entry.name)
+    except OSError:
+        return [], []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                if is_alto_document(entry.path):
+                    alto_dirs.append(entry.path)
+                elif not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif is_document_file(entry.name):
+                files.append(entry.path)
+        except OSError:
+            continue
+    return files + alto_dirs, subdirs
+
+
+def find_documents(directory: str) -> Iterator[str]:
+    """Yields the PDF files (possibly gzipped), archives and ALTO documents (directories of
+    XML files) below directory, in a stable order. Directories of ALTO files are not
+    searched further."""
+    documents, subdirs = list_directory(directory)
+    yield from documents
+    for subdir in subdirs:
+        yield from find_documents(subdir)
+
+
+class Scanner:
+    """Extracts the documents of a directory in parallel with the extract function, which
+    must be thread-safe (e.g. WorkerPool.run). Results are streamed as they are ready,
+    and documents that did not change since they were cached are not extracted again."""
+
+    def __init__(self, extract: Callable[[str], Results],
+                 workers: int,
+                 cache: Optional[ResultCache] = None) -> None:
+        self.extract = extract
+        self.workers = max(workers, 1)
+        self.cache = cache
+
+    def process(self, path: str, relative_path: str) -> ScanResult:
+        try:
+            key = document_key(path)
+            if self.cache:
+                cached_results = self.cache.get(key)
+                metrics.RESULT_CACHE_REQUESTS.labels(
+                    'miss' if cached_results is None else 'hit').inc()
+                if cached_results is not None:
+                    return ScanResult(path=relative_path, cached=True, results=cached_results)
+            results = self.extract(path)
+            if self.cache:
+                self.cache.put(key, results)
+            return ScanResult(path=relative_path, cached=False, results=results)
+        except Exception as exc:
+            return ScanResult(path=relative_path, cached=False, error=repr(exc))
+
+    def scan(self, directory: str) -> Iterator[ScanResult]:
+        return self.process_all(find_documents(directory), directory)
+
+    def process_all(self, paths: Iterable[str], directory: str = '') -> Iterator[ScanResult]:
+        """Extracts the documents at paths, and yields their results in the order they are
+        ready. Paths in the results are relative to directory, if given."""
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending: set[Future[ScanResult]] = set()
+            for path in paths:
+                relative_path = os.path.relpath(path, directory) if directory else path
+                pending.add(executor.submit(self.process, path, relative_path))
+                # Only a few documents are kept in flight, so that results stream steadily
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from (future.result() for future in done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
@@ -25,6 +25,27 @@ class Settings(BaseSettings):
     USE_GIELLADETECT: bool = False
     GIELLADETECT_LANGS: str = ""
     CUSTOM_PATH: str = ""
+    MAX_CONCURRENT_EXTRACTIONS: int = 1
+    MAX_QUEUED_EXTRACTIONS: int = 10
+    MAX_UPLOADS_IN_FLIGHT_MB: int = 0
+    RETRY_AFTER_SECONDS: int = 5
+    EXTRACTION_TIMEOUT_SECONDS: int = 300
+    EXTRACTION_MEMORY_LIMIT_MB: int = 0
+    MAX_DOWNLOAD_CONNECTIONS: int = 100
+    USE_RANGE_REQUESTS: bool = False
+    URL_CACHE_MAX_ENTRIES: int = 1000
+    URL_CACHE_MAX_AGE_SECONDS: int = 86400
+    RESULT_CACHE_FILE: str = ""
+    WATCH_MOUNT_FOLDER: bool = False
+    WATCH_INTERVAL_SECONDS: int = 30
+    WATCH_NICENESS: int = 10
+    SCAN_WORKERS: int = 1
+    SCAN_NICENESS: int = 10
+    ALTO_READ_WORKERS: int = 1
+    PAGE_WINDOW_START: int = 5
+    PAGE_WINDOW_END: int = 5
+    PAGE_WINDOW_STEP: int = 0
+    MAX_PAGES: int = 20
 
 
 settings = Settings()
@@ -0,0 +1,50 @@
+"""Cache of extraction results for files submitted by URL"""
+
+
+import time
+from collections import OrderedDict
+from typing import Optional, TypedDict
+
+from metadata_extract.metadata import Results
+
+
+class CacheEntry(TypedDict):
+    """Results for a URL, with the validators (ETag and Last-Modified headers) of the file"""
+    validators: dict[str, str]
+    results: Results
+    time: float
+
+
+class UrlCache:
+    """Results of files submitted by URL, to be used when the server replies to a conditional
+    request that the file has not been modified.
+
+    Entries older than max_age seconds are not used, and the least recently used entries are
+    dropped when there are more than max_entries. A limit of 0 for max_entries disables the cache.
+    """
+
+    def __init__(self, max_entries: int, max_age: float) -> None:
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        if time.time() - entry['time'] > self.max_age:
+            del self.entries[url]
+            return None
+        self.entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, validators: dict[str, str], results: Results) -> None:
+        """Stores the results, unless the server did not send any validators for the file"""
+        if not self.max_entries or not validators:
+            return
+        results = results.copy()
+        results.pop('trace', None)
+        self.entries[url] = CacheEntry(validators=validators, results=results, time=time.time())
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -3,33 +3,93 @@
 
 # pylint: disable=broad-exception-caught
 
+import contextlib
 import traceback
 import os
+import shutil
+import tarfile
 import threading
 import uuid
-from typing import TypedDict, Optional, Union
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Any, Callable, TypedDict, Optional, Union, cast
 
-import requests
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from starlette.datastructures import UploadFile
 
-from metadata_extract.metadata import Results
+from metadata_extract.alto_pages import METS_FILE_NAMES, page_number, read_mets
+from metadata_extract.metadata import NO_TEXT_LAYER, Results
 from metadata_extract.meteor import Meteor
+from metadata_extract.meteor_document import PageWindow
 from metadata_extract.registry import PublisherRegistry
+from src import metrics
+from src.fetcher import Fetcher, NotModified
+from src.result_cache import ResultCache, document_key
+from src.scan import Scanner
 from src.settings import get_settings
+from src.url_cache import UrlCache, CacheEntry
+from src.worker_pool import WorkerPool, ExtractionTimeout, ExtractionMemoryError, preload
+
+
+# The data shared by the workers of the service is loaded once, before they are forked
+preload(['src.worker_preload'])
 
 
 class Utils:
-    """Helper methods for API endpoints"""
+    """Helper methods for API endpoints
+
+    Files are processed in isolated worker processes, see the worker_pool module.
+    Files submitted by URL are fetched asynchronously, see the fetcher module, and their
+    results are cached as long as they do not change, see the url_cache module.
+    Results for files on disk are cached with RESULT_CACHE_FILE, see the result_cache module.
+
+    The pages read from documents are given by the PAGE_WINDOW settings, see page_window,
+    and can be set for each request. Results read with another window are not cached.
+
+    The resources, patterns and language profiles are loaded before the workers are forked,
+    see the worker_preload module. Meteor is then warmed up in each worker, which is only
+    ready after that, see the /health/ready endpoint.
+
+    /scan requests run in their own pool of SCAN_WORKERS workers, with a lower CPU priority
+    (SCAN_NICENESS), started on the first scan, so that scans do not take the workers of the
+    requests let through by admission control.
+    """
 
     def __init__(self) -> None:
-        self.meteor = Meteor(languages=Utils.get_languages())
+        self.pool = WorkerPool(
+            size=get_settings().MAX_CONCURRENT_EXTRACTIONS,
+            create_meteor=Utils.create_meteor,
+            timeout=get_settings().EXTRACTION_TIMEOUT_SECONDS,
+            memory_limit_mb=get_settings().EXTRACTION_MEMORY_LIMIT_MB
+        )
+        self.fetcher = Fetcher(
+            size_limit=int(get_settings().MAX_FILE_SIZE_MB) * 1024 * 1024,
+            max_connections=get_settings().MAX_DOWNLOAD_CONNECTIONS,
+            use_range_requests=get_settings().USE_RANGE_REQUESTS
+        )
+        self.url_cache = UrlCache(
+            max_entries=get_settings().URL_CACHE_MAX_ENTRIES,
+            max_age=get_settings().URL_CACHE_MAX_AGE_SECONDS
+        )
+        self.result_cache = ResultCache(get_settings().RESULT_CACHE_FILE) \
+            if get_settings().RESULT_CACHE_FILE else None
+        self.scan_pool: Optional[WorkerPool] = None
+        self.scan_pool_lock = threading.Lock()
+        self.scanner = Scanner(self.scan_extract, workers=get_settings().SCAN_WORKERS,
+                               cache=self.result_cache)
+
+    @staticmethod
+    def create_meteor() -> Meteor:
+        meteor = Meteor(languages=Utils.get_languages(),
+                        alto_workers=get_settings().ALTO_READ_WORKERS,
+                        window=Utils.page_window())
         if get_settings().REGISTRY_FILE:
-            self.meteor.set_registry(
+            meteor.set_registry(
                 PublisherRegistry(registry_file=get_settings().REGISTRY_FILE)
             )
         elif get_settings().REGISTRY_HOST:
-            self.meteor.set_registry(
+            meteor.set_registry(
                 PublisherRegistry(
                     db_credentials={
                         'host': get_settings().REGISTRY_HOST,
@@ -44,9 +104,10 @@ class Utils:
             langs = None
             if get_settings().GIELLADETECT_LANGS:
                 langs = get_settings().GIELLADETECT_LANGS.split(',')
-            self.meteor.set_language_detection_method(
+            meteor.set_language_detection_method(
                 lambda t: gielladetect.detect(t, langs=langs)
             )
+        return meteor.warm_up()
 
     @staticmethod
     def get_languages() -> Optional[list[str]]:
@@ -54,81 +115,231 @@ class Utils:
             return None
         return get_settings().LANGUAGES.split(',')
 
+    @staticmethod
+    def page_window(start: Optional[int] = None, end: Optional[int] = None,
+                    step: Optional[int] = None, max_pages: Optional[int] = None) -> PageWindow:
+        """Returns a page window with the given values, and the values of the settings for
+        the others. No more than MAX_PAGES pages are read."""
+        conf = get_settings()
+        return PageWindow(
+            start=conf.PAGE_WINDOW_START if start is None else start,
+            end=conf.PAGE_WINDOW_END if end is None else end,
+            step=conf.PAGE_WINDOW_STEP if step is None else step,
+            max_pages=min(conf.MAX_PAGES if max_pages is None else max_pages, conf.MAX_PAGES)
+        )
+
+    @staticmethod
+    def pages_to_fetch(window: PageWindow) -> tuple[int, int]:
+        """Returns the numbers of first and last pages that can be read with the window"""
+        if window['step'] > 0:
+            return window['max_pages'], window['max_pages']
+        return window['start'], window['end']
+
+    @staticmethod
+    def status_code(results: Union['Utils.Error', Results]) -> int:
+        """Returns 422 for PDF files without a text layer, so that clients can send them to
+        OCR, and else 200"""
+        return 422 if results.get('status') == NO_TEXT_LAYER else 200
+
     @staticmethod
     def get_environment_prefix() -> str:
         if get_settings().ENVIRONMENT not in ["stage", "prod"]:
             return ""
         return get_settings().CUSTOM_PATH or "/meteor"
 
+    # Content types of files uploaded alone, and the suffixes they are saved with
+    UPLOAD_SUFFIXES = {
+        'application/pdf': '.pdf',
+        'application/zip': '.zip',
+        'application/x-zip-compressed': '.zip'
+    }
+    ALTO_CONTENT_TYPES = ('application/xml', 'text/xml')
+
     @staticmethod
-    def verify_file(file: UploadFile) -> None:
+    def verify_files(files: list[UploadFile]) -> None:
+        """Checks that the upload is either a single PDF file or ZIP archive, or the XML files
+        of an ALTO document, and that it is not larger than MAX_FILE_SIZE_MB"""
         size_limit = int(get_settings().MAX_FILE_SIZE_MB)
-        if not file:
+        if not files:
             raise HTTPException(status_code=400, detail="No file provided")
-        if file.content_type != 'application/pdf':
-            raise HTTPException(status_code=400, detail="File must be a PDF")
-        if file.size is not None and file.size > size_limit * 1024 * 1024:
+        if len(files) > 1 or files[0].content_type not in Utils.UPLOAD_SUFFIXES:
+            Utils.verify_alto_files(files)
+        if sum(file.size or 0 for file in files) > size_limit * 1024 * 1024:
             raise HTTPException(status_code=400, detail="File too large")
 
     @staticmethod
-    def verify_url(url: str) -> None:
-        size_limit = int(get_settings().MAX_FILE_SIZE_MB)
-        if not url:
-            raise HTTPException(status_code=400, detail="No URL provided")
-        # Try to verify the length using a HEAD request.
-        # If it fails for any reason (e.g. no Content-Length header), let it pass.
+    def verify_alto_files(files: list[UploadFile]) -> None:
+        if any(file.content_type not in Utils.ALTO_CONTENT_TYPES for file in files):
+            raise HTTPException(status_code=400,
+                                detail="File must be a PDF, a ZIP archive or ALTO XML files")
+        names = [os.path.basename(file.filename or '') for file in files]
+        if '' in names or len(set(names)) < len(names):
+            raise HTTPException(status_code=400, detail="ALTO files must have distinct names")
+        if not any(name in METS_FILE_NAMES or page_number(name) is not None for name in names):
+            raise HTTPException(status_code=400, detail="ALTO files must be named with "
+                                                        "page numbers, or include a METS file")
+        for file, name in zip(files, names):
+            if name in METS_FILE_NAMES:
+                Utils.verify_mets_file(file)
+
+    @staticmethod
+    def verify_mets_file(file: UploadFile) -> None:
+        """Checks that the locations of the METS file are within the uploaded document"""
+        file.file.seek(0)
         try:
-            response = requests.head(url, allow_redirects=True, timeout=30)
-            if 'Content-Length' in response.headers:
-                content_size = response.headers['Content-Length']
-                if int(content_size) > size_limit * 1024 * 1024:
-                    raise HTTPException(status_code=400, detail="File too large")
-        except requests.exceptions.RequestException:
-            pass
+            read_mets(file.file)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid METS file: {exc}") from exc
+        except ET.ParseError as exc:
+            raise HTTPException(status_code=400, detail="Invalid METS file") from exc
+        finally:
+            file.file.seek(0)
 
     @staticmethod
-    def save_file(uploaded_file: UploadFile) -> str:
-        file_id = str(uuid.uuid1()) + '.pdf'
-        filepath = os.path.join(get_settings().UPLOAD_FOLDER, file_id)
+    def save_files(files: list[UploadFile]) -> str:
+        """Saves a PDF file or ZIP archive in UPLOAD_FOLDER, or ALTO files in a directory of
+        UPLOAD_FOLDER, and returns the path. Files are copied in chunks."""
+        file_id = str(uuid.uuid1())
+        if len(files) == 1 and files[0].content_type in Utils.UPLOAD_SUFFIXES:
+            filepath = os.path.join(get_settings().UPLOAD_FOLDER,
+                                    file_id + Utils.UPLOAD_SUFFIXES[str(files[0].content_type)])
+            Utils.copy_file(files[0], filepath)
+            return filepath
+        directory = os.path.join(get_settings().UPLOAD_FOLDER, file_id)
+        os.mkdir(directory)
+        for file in files:
+            Utils.copy_file(file, os.path.join(directory, os.path.basename(str(file.filename))))
+        return directory
+
+    @staticmethod
+    def copy_file(uploaded_file: UploadFile, filepath: str) -> None:
+        uploaded_file.file.seek(0)
         with open(filepath, 'wb') as outfile:
-            outfile.write(uploaded_file.file.read())
-        return filepath
+            shutil.copyfileobj(uploaded_file.file, outfile)
 
     @staticmethod
-    def download_file(url: str) -> str:
-        size_limit = int(get_settings().MAX_FILE_SIZE_MB)
+    def remove(path: str) -> None:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    @staticmethod
+    def with_archive_suffix(filepath: str) -> str:
+        """Renames a downloaded file to a ZIP or TAR archive name if it is one, so that it is
+        read as an ALTO package, and returns its path"""
+        if zipfile.is_zipfile(filepath):
+            suffix = '.zip'
+        elif tarfile.is_tarfile(filepath):
+            suffix = '.tar'
+        else:
+            return filepath
+        archive_path = os.path.splitext(filepath)[0] + suffix
+        os.replace(filepath, archive_path)
+        return archive_path
+
+    async def download_file(self, url: str) -> str:
         file_id = str(uuid.uuid1()) + '.pdf'
         filepath = os.path.join(get_settings().UPLOAD_FOLDER, file_id)
-        response = requests.get(url, timeout=300, stream=True)
-        downloaded_size = 0
-        if response.ok:
-            with open(filepath, 'wb') as outfile:
-                for chunk in response.iter_content(chunk_size=1024*1024):
-                    downloaded_size += len(chunk)
-                    if downloaded_size > size_limit * 1024 * 1024:
-                        raise HTTPException(status_code=400, detail="File too large")
-                    outfile.write(chunk)
-        return filepath
+        await self.fetcher.fetch(url, filepath, pages=Utils.pages_to_fetch(Utils.page_window()))
+        return Utils.with_archive_suffix(filepath)
+
+    def extract(self, filepath: str, trace: bool = False,
+                window: Optional[PageWindow] = None,
+                pool: Optional[WorkerPool] = None) -> Results:
+        """Runs Meteor on the file, in the request pool unless another pool is given, and
+        records metrics from its trace. The trace is only kept in the results if requested."""
+        results = (pool or self.pool).run(filepath, trace=True, window=window)
+        run_trace = results['trace'] if trace else results.pop('trace')
+        metrics.observe_trace(run_trace,
+                              os.path.getsize(filepath) if os.path.isfile(filepath) else 0)
+        return results
+
+    def scan_extract(self, filepath: str) -> Results:
+        """Extracts a document of a /scan request in the scan pool"""
+        with self.scan_pool_lock:
+            if self.scan_pool is None:
+                self.scan_pool = WorkerPool(
+                    size=get_settings().SCAN_WORKERS,
+                    create_meteor=Utils.create_meteor,
+                    timeout=get_settings().EXTRACTION_TIMEOUT_SECONDS,
+                    memory_limit_mb=get_settings().EXTRACTION_MEMORY_LIMIT_MB,
+                    niceness=get_settings().SCAN_NICENESS
+                )
+        return self.extract(filepath, pool=self.scan_pool)
+
+    def extract_file(self, filepath: str, trace: bool = False,
+                     window: Optional[PageWindow] = None) -> Results:
+        """Extracts a file from disk, or returns its cached results if it has not changed.
+        Traced runs and runs with a page window are never cached."""
+        if not self.result_cache or trace or window:
+            return self.extract(filepath, trace=trace, window=window)
+        key = document_key(filepath)
+        results = self.result_cache.get(key)
+        metrics.RESULT_CACHE_REQUESTS.labels('miss' if results is None else 'hit').inc()
+        if results is None:
+            results = self.extract(filepath)
+            self.result_cache.put(key, results)
+        return results
 
     class Error(TypedDict):
         """Store an error message"""
         error: str
 
-    def process_and_remove(
+    def process_and_remove(  # pylint: disable=too-many-arguments
             self,
             filename: Optional[str],
             filepath: str,
-            delete_immediately: bool = False
+            delete_immediately: bool = False,
+            trace: bool = False,
+            window: Optional[PageWindow] = None
     ) -> Union[Error, Results]:
         try:
-            results = self.meteor.run(filepath)
+            results = self.extract(filepath, trace=trace, window=window)
             return results
+        except ExtractionTimeout as exc:
+            raise HTTPException(detail=f'Timeout while processing file {filename}',
+                                status_code=504) from exc
+        except ExtractionMemoryError as exc:
+            raise HTTPException(detail=f'Memory limit exceeded while processing file {filename}',
+                                status_code=500) from exc
         except Exception as exc:
             print(traceback.format_exc())
             raise HTTPException(detail=f'Error while processing file {filename}',
                                 status_code=500) from exc
         finally:
             if delete_immediately:
-                os.remove(filepath)
+                Utils.remove(filepath)
             else:
-                threading.Timer(5, lambda: os.remove(filepath)).start()
+                threading.Timer(5, Utils.remove, [filepath]).start()
+
+    async def process_url(self, url: str, trace: bool = False,
+                          window: Optional[PageWindow] = None,
+                          extraction_slot: Callable[[], contextlib.AbstractAsyncContextManager[Any]]
+                          = contextlib.nullcontext) -> Union[Error, Results]:
+        """Downloads and processes the file, unless the server replies that it has not changed
+        since its results were cached. The file is deleted after processing. extraction_slot
+        is only entered for processing, after the download. Traced runs and runs with a page
+        window neither use nor update the cache."""
+        use_cache = not trace and not window
+        entry = self.url_cache.get(url) if use_cache else None
+        file_id = str(uuid.uuid1()) + '.pdf'
+        filepath = os.path.join(get_settings().UPLOAD_FOLDER, file_id)
+        try:
+            validators = await self.fetcher.fetch(url, filepath,
+                                                  entry['validators'] if entry else None,
+                                                  Utils.pages_to_fetch(window
+                                                                       or Utils.page_window()))
+        except NotModified:
+            metrics.URL_CACHE_REQUESTS.labels('hit').inc()
+            return cast(CacheEntry, entry)['results']
+        if use_cache:
+            metrics.URL_CACHE_REQUESTS.labels('modified' if entry else 'miss').inc()
+        filepath = Utils.with_archive_suffix(filepath)
+        async with extraction_slot():
+            results = await run_in_threadpool(self.process_and_remove, url, filepath,
+                                              delete_immediately=True, trace=trace,
+                                              window=window)
+        if use_cache:
+            self.url_cache.put(url, validators, cast(Results, results))
+        return results
@@ -0,0 +1,216 @@
+"""Background extraction of new documents in the mounted folder
+
+The watcher polls the folder, and extracts new or changed documents into the result cache
+in a worker process of low CPU priority, so that later requests for them are cache hits.
+"""
+
+
+# pylint: disable=broad-exception-caught
+
+import collections
+import fcntl
+import os
+import threading
+import time
+import traceback
+from typing import IO, Callable, NamedTuple, Optional
+
+from metadata_extract.meteor import Meteor
+from src import metrics
+from src.result_cache import DocumentKey, ResultCache, document_key
+from src.scan import list_directory
+from src.worker_pool import WorkerPool
+
+
+class Listing(NamedTuple):
+    """Documents and subdirectories of a directory, listed at its modification time"""
+    mtime: float
+    documents: list[str]
+    subdirs: list[str]
+
+
+class Retry(NamedTuple):
+    """Failed extractions of a document, and when to try again"""
+    key: DocumentKey
+    attempts: int
+    at: float
+
+
+class Watcher:  # pylint: disable=too-many-instance-attributes
+    """Polls directory every `interval` seconds for new or changed documents.
+
+    Documents present at the first poll are not extracted. A document is only extracted
+    once its size and modification time are the same at two polls in a row, so that files
+    being copied are not read too early. Extractions wait while is_busy returns True, e.g.
+    when interactive requests are waiting. Failed extractions are tried again after a delay
+    doubling each time, up to MAX_ATTEMPTS times.
+
+    Directories are only listed again when their modification time changed, and documents
+    in them are only checked again until they are extracted, so that a poll mostly stats
+    directories. Files rewritten in place, or added to ALTO documents, do not change the
+    modification time of the directory listing them, so every FULL_SCAN_POLLS polls, all
+    documents are checked.
+
+    With a lock file, only the process holding the lock watches the directory, e.g. the
+    first of the processes of a service sharing a result cache.
+    """
+
+    BUSY_WAIT = 1.0
+    FULL_SCAN_POLLS = 10
+    MAX_ATTEMPTS = 5
+    MAX_RETRY_DELAY = 3600.0
+
+    def __init__(self, directory: str,  # pylint: disable=too-many-arguments
+                 cache: ResultCache,
+                 create_meteor: Callable[[], Meteor],
+                 interval: float = 30,
+                 is_busy: Callable[[], bool] = lambda: False,
+                 niceness: int = 10,
+                 timeout: float = 0,
+                 lock_file: Optional[str] = None) -> None:
+        self.directory = directory
+        self.cache = cache
+        self.create_meteor = create_meteor
+        self.interval = interval
+        self.is_busy = is_busy
+        self.niceness = niceness
+        self.timeout = timeout
+        self.lock_file = lock_file
+        self.lock: Optional[IO[str]] = None
+        self.pool: Optional[WorkerPool] = None
+        self.polls = 0
+        self.listings: dict[str, Listing] = {}
+        self.keys: dict[str, DocumentKey] = {}
+        self.seen: Optional[dict[str, DocumentKey]] = None
+        self.handled: dict[str, DocumentKey] = {}
+        self.retries: dict[str, Retry] = {}
+        self.backlog: collections.deque[DocumentKey] = collections.deque()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='watcher', daemon=True)
+
+    def settled(self, key: DocumentKey) -> bool:
+        return self.handled.get(key.path) == key
+
+    def list_documents(self) -> dict[str, DocumentKey]:
+        """Returns the keys of the documents below the directory, by the paths they are
+        listed with. Listings of unchanged directories and keys of settled documents are
+        taken from the previous poll, unless it is time for a full scan."""
+        full_scan = self.polls % Watcher.FULL_SCAN_POLLS == 0
+        listings: dict[str, Listing] = {}
+        keys: dict[str, DocumentKey] = {}
+        directories = [self.directory]
+        while directories:
+            directory = directories.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            previous = self.listings.get(directory)
+            changed = full_scan or previous is None or previous.mtime != mtime
+            listing = previous if previous and not changed \
+                else Listing(mtime, *list_directory(directory))
+            listings[directory] = listing
+            directories.extend(listing.subdirs)
+            for path in listing.documents:
+                key = self.keys.get(path)
+                if changed or key is None or not self.settled(key):
+                    try:
+                        key = document_key(path)
+                    except OSError:
+                        continue
+                keys[path] = key
+        self.listings = listings
+        self.keys = keys
+        self.polls += 1
+        return keys
+
+    def poll(self) -> None:
+        current = {key.path: key for key in self.list_documents().values()}
+        if self.seen is None:
+            self.handled = dict(current)
+        for path, key in current.items():
+            if self.seen is not None and self.seen.get(path) == key \
+                    and self.handled.get(path) != key:
+                self.handled[path] = key
+                self.retries.pop(path, None)
+                self.backlog.append(key)
+        self.handled = {path: key for path, key in self.handled.items() if path in current}
+        now = time.monotonic()
+        for path, retry in list(self.retries.items()):
+            if not self.settled(retry.key):
+                del self.retries[path]
+            elif retry.at <= now:
+                self.backlog.append(retry.key)
+                self.retries[path] = retry._replace(at=float('inf'))
+        self.seen = current
+        metrics.WATCHER_BACKLOG.set(len(self.backlog))
+
+    def process(self, key: DocumentKey) -> None:
+        if self.cache.get(key) is not None:
+            return
+        if self.pool is None:
+            self.pool = WorkerPool(size=1, create_meteor=self.create_meteor,
+                                   timeout=self.timeout, niceness=self.niceness)
+        try:
+            self.cache.put(key, self.pool.run(key.path))
+            self.retries.pop(key.path, None)
+            metrics.WATCHER_EXTRACTIONS.labels('ok').inc()
+        except Exception:
+            print(traceback.format_exc())
+            metrics.WATCHER_EXTRACTIONS.labels('error').inc()
+            self.schedule_retry(key)
+
+    def schedule_retry(self, key: DocumentKey) -> None:
+        retry = self.retries.get(key.path)
+        attempts = retry.attempts + 1 if retry and retry.key == key else 1
+        if attempts >= Watcher.MAX_ATTEMPTS:
+            self.retries.pop(key.path, None)
+            return
+        delay = min(self.interval * 2 ** attempts, Watcher.MAX_RETRY_DELAY)
+        self.retries[key.path] = Retry(key, attempts, time.monotonic() + delay)
+
+    def run(self) -> None:
+        next_poll = 0.0
+        while not self.stopped.is_set():
+            if time.monotonic() >= next_poll:
+                try:
+                    self.poll()
+                except OSError:
+                    print(traceback.format_exc())
+                next_poll = time.monotonic() + self.interval
+            if self.backlog and not self.is_busy():
+                self.process(self.backlog.popleft())
+                metrics.WATCHER_BACKLOG.set(len(self.backlog))
+                continue
+            wait = Watcher.BUSY_WAIT if self.backlog else next_poll - time.monotonic()
+            self.stopped.wait(max(wait, 0))
+
+    def take_lock(self) -> bool:
+        if not self.lock_file:
+            return True
+        lock = open(self.lock_file, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self.lock = lock
+        return True
+
+    def start(self) -> bool:
+        """Starts watching, unless another process holds the lock file. Returns whether the
+        watcher was started."""
+        if not self.take_lock():
+            return False
+        self.thread.start()
+        return True
+
+    def stop(self) -> None:
+        if self.thread.is_alive():
+            self.stopped.set()
+            self.thread.join()
+        if self.pool:
+            self.pool.close()
+        if self.lock:
+            self.lock.close()
+            self.lock = None
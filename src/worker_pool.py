@@ -0,0 +1,220 @@
+"""Isolated execution of Meteor in worker processes
+
+Each extraction runs in a worker process under a wall-clock deadline and a memory ceiling.
+A worker exceeding its budget is killed and replaced, so that pathological files cannot
+block the service.
+
+Workers are forked from a forkserver process, which is single-threaded and imports the heavy
+modules once, and never from the calling process: the service starts workers from several
+threads, and a process forked while another thread holds a lock could deadlock on it. The
+create_meteor callables given to the pools must therefore be picklable (module-level
+functions, classes or partials of them). More modules can be imported by the forkserver with
+`preload`, e.g. to load data shared by the workers in copy-on-write pages.
+"""
+
+
+# pylint: disable=broad-exception-caught
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Event
+from typing import Callable, Optional
+
+from metadata_extract.metadata import Results
+from metadata_extract.meteor import Meteor
+from metadata_extract.meteor_document import PageWindow
+from src import metrics
+
+
+PRELOAD_MODULES = ['metadata_extract.meteor', 'fitz', 'langdetect', 'dateparser']
+CONTEXT = multiprocessing.get_context('forkserver')
+CONTEXT.set_forkserver_preload(PRELOAD_MODULES)
+
+
+def preload(modules: list[str]) -> None:
+    """Adds modules imported by the forkserver before it forks the workers. Only effective
+    before the first worker of the process is started."""
+    CONTEXT.set_forkserver_preload(PRELOAD_MODULES + modules)
+
+
+class ExtractionTimeout(Exception):
+    """The extraction did not finish before the deadline"""
+
+
+class ExtractionMemoryError(Exception):
+    """The worker used more memory than allowed"""
+
+
+class WorkerCrashed(Exception):
+    """The worker process died while processing the file"""
+
+
+class ExtractionFailed(Exception):
+    """Meteor raised an exception, the traceback from the worker is the message"""
+
+
+def worker_main(conn: Connection, create_meteor: Callable[[], Meteor], ready: Event,
+                niceness: int = 0) -> None:
+    """Main loop of worker processes: sets ready once Meteor is created, then receives
+    (filepath, trace, window) tasks and sends back (status, payload) tuples, until the connection
+    is closed."""
+    if niceness:
+        os.nice(niceness)
+    meteor = create_meteor()
+    ready.set()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        filepath, trace, window = task
+        try:
+            conn.send(('ok', meteor.run(filepath, trace=trace, window=window)))
+        except MemoryError:
+            conn.send(('memory', None))
+            return
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+
+class Worker:
+    """Handle on a single worker process"""
+
+    POLL_INTERVAL = 0.2
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def __init__(self, create_meteor: Callable[[], Meteor], niceness: int = 0) -> None:
+        self.conn, child_conn = CONTEXT.Pipe()
+        self.ready = CONTEXT.Event()
+        self.process = CONTEXT.Process(target=worker_main,
+                                       args=(child_conn, create_meteor, self.ready, niceness),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def rss(self) -> Optional[int]:
+        """Resident memory of the worker in bytes, if it can be read from /proc"""
+        try:
+            with open(f'/proc/{self.process.pid}/statm', encoding='ascii') as statm:
+                return int(statm.read().split()[1]) * Worker.PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def wait_ready(self, filepath: str) -> None:
+        """Waits until the worker has created its Meteor object, so that its warm-up does not
+        count against the time budget of its first task"""
+        while not self.ready.wait(Worker.POLL_INTERVAL):
+            if not self.process.is_alive():
+                raise WorkerCrashed(filepath)
+
+    def run(self, filepath: str,  # pylint: disable=too-many-arguments
+            trace: bool, timeout: float, memory_limit: int,
+            window: Optional[PageWindow] = None) -> Results:
+        self.wait_ready(filepath)
+        self.conn.send((filepath, trace, window))
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(Worker.POLL_INTERVAL):
+            if timeout and time.monotonic() > deadline:
+                raise ExtractionTimeout(filepath)
+            if memory_limit and (self.rss() or 0) > memory_limit:
+                raise ExtractionMemoryError(filepath)
+            if not self.process.is_alive():
+                raise WorkerCrashed(filepath)
+        try:
+            status, payload = self.conn.recv()
+        except EOFError as exc:
+            raise WorkerCrashed(filepath) from exc
+        if status == 'memory':
+            raise ExtractionMemoryError(filepath)
+        if status == 'error':
+            raise ExtractionFailed(payload)
+        return payload  # type: ignore[no-any-return]
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        if self.process.pid:
+            metrics.mark_process_dead(self.process.pid)
+
+
+class WorkerPool:
+    """A fixed-size pool of workers. `run` blocks until a worker is available, so it is
+    meant to be called from threads (e.g. with run_in_threadpool).
+    Workers of a pool with a positive niceness run at a lower CPU priority.
+
+    The idle queue holds the workers waiting for a task, and None for each worker that died
+    and could not be replaced (e.g. when fork fails), which is started again by the next
+    task instead."""
+
+    def __init__(self, size: int,  # pylint: disable=too-many-arguments
+                 create_meteor: Callable[[], Meteor],
+                 timeout: float = 0,
+                 memory_limit_mb: int = 0,
+                 niceness: int = 0) -> None:
+        self.create_meteor = create_meteor
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.niceness = niceness
+        self.idle: queue.Queue[Optional[Worker]] = queue.Queue()
+        self.initial_workers = [Worker(create_meteor, niceness) for _ in range(max(size, 1))]
+        for worker in self.initial_workers:
+            self.idle.put(worker)
+
+    @property
+    def ready(self) -> bool:
+        """Whether all workers have created their Meteor object once. Replacing a worker
+        later does not make the pool not ready again."""
+        return all(worker.ready.is_set() for worker in self.initial_workers)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for worker in self.initial_workers:
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            if not worker.ready.wait(remaining):
+                return False
+        return True
+
+    def acquire(self) -> Worker:
+        worker = self.idle.get()
+        if worker is None:
+            try:
+                worker = Worker(self.create_meteor, self.niceness)
+            except BaseException:
+                self.idle.put(None)
+                raise
+        return worker
+
+    def release(self, worker: Worker) -> None:
+        """Puts the worker back in the idle queue if it is alive, else a new worker"""
+        if worker.process.is_alive():
+            self.idle.put(worker)
+            return
+        replacement = None
+        try:
+            replacement = Worker(self.create_meteor, self.niceness)
+        except Exception:
+            print(traceback.format_exc())
+        self.idle.put(replacement)
+
+    def run(self, filepath: str, trace: bool = False,
+            window: Optional[PageWindow] = None) -> Results:
+        worker = self.acquire()
+        try:
+            return worker.run(filepath, trace, self.timeout, self.memory_limit, window)
+        except (ExtractionTimeout, ExtractionMemoryError, WorkerCrashed) as exc:
+            metrics.WORKER_RESTARTS.labels(type(exc).__name__).inc()
+            worker.kill()
+            raise
+        finally:
+            self.release(worker)
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            worker = self.idle.get()
+            if worker:
+                worker.kill()
@@ -0,0 +1,20 @@
+"""Imported by the forkserver of the service before it forks the extraction workers: loads
+the resources for the LANGUAGES setting, compiles the patterns built from them and loads the
+langdetect profiles, so that the workers share them in copy-on-write pages instead of loading
+them again. The objects loaded are then frozen, so that the garbage collector of the workers
+does not write to their pages."""
+
+
+import gc
+
+from langdetect.detector_factory import init_factory
+
+from metadata_extract.resource_loader import ResourceLoader
+from metadata_extract.text import compile_patterns
+from src.settings import get_settings
+
+
+ResourceLoader.load(get_settings().LANGUAGES.split(',') if get_settings().LANGUAGES else None)
+compile_patterns()
+init_factory()
+gc.freeze()
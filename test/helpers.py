@@ -0,0 +1,18 @@
+"""Helpers shared by the tests"""
+
+
+import fitz
+
+
+CHAPTER = 'Kapittel {} om metadata i rapporter'
+
+
+def write_pdf(path, page_count=1, texts=None):
+    """Writes a PDF file with page_count pages, each with its text in texts by page number,
+    or else a chapter text, and returns its path"""
+    texts = texts or {}
+    with fitz.open() as doc:
+        for page_nr in range(1, page_count + 1):
+            doc.new_page().insert_text((72, 72), texts.get(page_nr, CHAPTER.format(page_nr)))
+        doc.save(path)
+    return str(path)
@@ -0,0 +1,87 @@
+"""Test that the admission controller queues and rejects requests"""
+
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.admission import AdmissionController
+
+
+def test_queue_is_bounded():
+    async def scenario() -> None:
+        admission = AdmissionController(max_concurrent=1, max_queued=1, retry_after=7)
+        release = asyncio.Event()
+
+        async def extract() -> None:
+            async with admission.extraction():
+                await release.wait()
+
+        running = asyncio.create_task(extract())
+        waiting = asyncio.create_task(extract())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            async with admission.extraction():
+                pass
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {'Retry-After': '7'}
+
+        release.set()
+        await asyncio.gather(running, waiting)
+        assert admission.queued == 0
+
+    asyncio.run(scenario())
+
+
+def upload_request(body_size, content_length=None, chunk_size=50):
+    """Returns a request with a body of body_size bytes, received in chunks"""
+    headers = [(b'content-length', str(content_length).encode())] \
+        if content_length is not None else []
+    chunks = [b'x' * min(chunk_size, body_size - offset)
+              for offset in range(0, body_size, chunk_size)]
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({'type': 'http', 'method': 'POST', 'headers': headers}, receive)
+
+
+def test_upload_budget():
+    async def scenario() -> None:
+        admission = AdmissionController(max_concurrent=1, max_queued=1, max_bytes=100)
+        async with admission.upload(upload_request(150, 150)):
+            with pytest.raises(HTTPException) as exc_info:
+                async with admission.upload(upload_request(10, 10)):
+                    pass
+            assert exc_info.value.status_code == 429
+        async with admission.upload(upload_request(60, 60)):
+            async with admission.upload(upload_request(40, 40)) as request:
+                assert len(await request.body()) == 40
+                assert admission.in_flight_bytes == 100
+        assert admission.in_flight_bytes == 0
+
+    asyncio.run(scenario())
+
+
+def test_chunked_uploads_are_counted():
+    async def scenario() -> None:
+        admission = AdmissionController(max_concurrent=1, max_queued=1, max_bytes=100)
+        async with admission.upload(upload_request(150)) as request:
+            assert admission.in_flight_bytes == 0
+            assert len(await request.body()) == 150
+            assert admission.in_flight_bytes == 150
+        async with admission.upload(upload_request(60, 60)):
+            with pytest.raises(HTTPException) as exc_info:
+                async with admission.upload(upload_request(150)) as request:
+                    await request.body()
+            assert exc_info.value.status_code == 429
+            assert admission.in_flight_bytes == 60
+        assert admission.in_flight_bytes == 0
+
+    asyncio.run(scenario())
@@ -3,7 +3,11 @@
 """Test the output from Meteor.run on sample Alto files"""
 
 
+from pathlib import Path
+
+from metadata_extract.alto_utils import AltoFile
 from metadata_extract.meteor import Meteor
+from metadata_extract.meteor_document import MeteorDocument
 
 
 meteor = Meteor()
@@ -118,3 +122,87 @@ def test_issn():
             "pageNumber": 2
         }
     }
+
+
+# Layout before styles, spaces out of schema order, composed blocks, second page and
+# nested composed blocks, which are not read
+NAMESPACED_ALTO = """<?xml version="1.0" encoding="UTF-8"?>
+<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#">
+  <Layout>
+    <Page ID="P1">
+      <PrintSpace>
+        <ComposedBlock>
+          <TextBlock STYLEREFS="T2 PAR">
+            <TextLine>
+              <String CONTENT="Composed" HPOS="10" VPOS="10" WIDTH="50" HEIGHT="10"/>
+            </TextLine>
+          </TextBlock>
+          <ComposedBlock>
+            <TextBlock>
+              <TextLine>
+                <String CONTENT="Nested" HPOS="10" VPOS="10" WIDTH="50" HEIGHT="10"/>
+              </TextLine>
+            </TextBlock>
+          </ComposedBlock>
+        </ComposedBlock>
+        <TextBlock STYLEREFS="T1">
+          <TextLine>
+            <String CONTENT="Rapport" HPOS="10" VPOS="20" WIDTH="50" HEIGHT="10"/>
+            <SP/>
+            <String CONTENT="2023" HPOS="70" VPOS="18" WIDTH="30" HEIGHT="14"/>
+            <String CONTENT="Far" HPOS="300" VPOS="20" WIDTH="30" HEIGHT="10" STYLEREFS="T2"/>
+          </TextLine>
+          <TextLine/>
+        </TextBlock>
+      </PrintSpace>
+      <TopMargin>
+        <TextBlock>
+          <TextLine>
+            <String CONTENT="Header" HPOS="10" VPOS="1" WIDTH="50" HEIGHT="5"/>
+          </TextLine>
+        </TextBlock>
+      </TopMargin>
+    </Page>
+    <Page ID="P2">
+      <PrintSpace>
+        <TextBlock>
+          <TextLine>
+            <String CONTENT="Ignored" HPOS="10" VPOS="10" WIDTH="50" HEIGHT="10"/>
+          </TextLine>
+        </TextBlock>
+      </PrintSpace>
+    </Page>
+  </Layout>
+  <Styles>
+    <TextStyle ID="T1" FONTSIZE="12" FONTFAMILY="Times"/>
+    <TextStyle ID="T2" FONTSIZE="8.5" FONTFAMILY="Arial"/>
+    <ParagraphStyle ID="PAR" ALIGN="Left"/>
+  </Styles>
+</alto>
+"""
+
+
+def test_streaming_reader_matches_tree_parser(tmp_path):
+    alto_path = tmp_path / 'alto_0001.xml'
+    alto_path.write_text(NAMESPACED_ALTO, encoding='utf-8')
+    paths = [*sorted(Path('test/resources/alto_report').glob('*.xml')), alto_path]
+    for path in paths:
+        streamed, parsed = AltoFile(path), AltoFile(path, streaming=False)
+        assert streamed.spans == parsed.spans
+        assert streamed.full_text == parsed.full_text
+        assert streamed.styles == parsed.styles
+    assert streamed.full_text == 'Header\nRapport 2023 Far\n\nComposed'
+    assert streamed.spans[1] == {
+        'text': 'Rapport 2023', 'bbox': (10.0, 18.0, 100.0, 32.0), 'font': 'Times', 'size': 12.0
+    }
+    assert streamed.spans[2]['font'] == 'Arial'
+
+
+def test_parallel_page_reads():
+    doc = MeteorDocument('test/resources/alto_report')
+    parallel_doc = MeteorDocument('test/resources/alto_report', alto_workers=4)
+    assert list(parallel_doc.pages.items()) == list(doc.pages.items())
+    assert [(page_nr, [vars(block) for block in page.text_blocks])
+            for page_nr, page in parallel_doc.page_objects.items()] \
+        == [(page_nr, [vars(block) for block in page.text_blocks])
+            for page_nr, page in doc.page_objects.items()]
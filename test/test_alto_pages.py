@@ -0,0 +1,98 @@
+"""Test the selection of the page files of ALTO documents, from a METS file or from the
+file names"""
+
+
+import shutil
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from metadata_extract.alto_pages import page_number, read_mets, select_pages
+from metadata_extract.meteor_document import MeteorDocument
+
+
+ALTO_DIR = Path('test/resources/alto_report')
+
+METS = """<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink">
+  <mets:fileSec>
+    <mets:fileGrp USE="IMAGE">
+      <mets:file ID="IMG1"><mets:FLocat LOCTYPE="URL" xlink:href="img/cover.jp2"/></mets:file>
+    </mets:fileGrp>
+    <mets:fileGrp USE="ALTO">
+      <mets:file ID="ALTO1"><mets:FLocat LOCTYPE="URL" xlink:href="file://./alto/cover.xml"/>
+      </mets:file>
+      <mets:file ID="ALTO2"><mets:FLocat LOCTYPE="URL" xlink:href="alto/colophon.xml"/>
+      </mets:file>
+    </mets:fileGrp>
+  </mets:fileSec>
+  <mets:structMap TYPE="LOGICAL">
+    <mets:div TYPE="page" ORDER="9"><mets:fptr FILEID="ALTO2"/></mets:div>
+  </mets:structMap>
+  <mets:structMap TYPE="PHYSICAL">
+    <mets:div TYPE="book">
+      <mets:div TYPE="page" ORDER="1">
+        <mets:fptr FILEID="IMG1"/>
+        <mets:fptr><mets:area FILEID="ALTO1"/></mets:fptr>
+      </mets:div>
+      <mets:div TYPE="page" ORDER="2"><mets:fptr FILEID="ALTO2"/></mets:div>
+    </mets:div>
+  </mets:structMap>
+</mets:mets>
+"""
+
+
+def document_content(path):
+    with MeteorDocument(str(path)) as doc:
+        return doc.pages, {page_nr: [vars(block) for block in page.text_blocks]
+                           for page_nr, page in doc.page_objects.items()}
+
+
+def test_page_number():
+    assert page_number('alto_report_0012.xml.gz') == 12
+    assert page_number('METS.xml') is None
+
+
+def test_select_pages():
+    pages = [(number, f'{number:04}.xml') for number in range(30, 0, -1)]
+    assert [number for number, _ in select_pages(pages, 5, 5)] == [1, 2, 3, 4, 5,
+                                                                   26, 27, 28, 29, 30]
+    assert [number for number, _ in select_pages(pages[-8:], 5, 5)] == list(range(1, 9))
+
+
+def test_pages_from_mets(tmp_path):
+    (tmp_path / 'alto').mkdir()
+    (tmp_path / 'METS.xml').write_text(METS, encoding='utf-8')
+    shutil.copy(ALTO_DIR / 'alto_report_0001.xml', tmp_path / 'alto' / 'cover.xml')
+    shutil.copy(ALTO_DIR / 'alto_report_0002.xml', tmp_path / 'alto' / 'colophon.xml')
+    assert read_mets(tmp_path / 'METS.xml') == [(1, 'alto/cover.xml'), (2, 'alto/colophon.xml')]
+    expected = document_content(ALTO_DIR)
+    assert document_content(tmp_path) == expected
+
+    with zipfile.ZipFile(tmp_path / 'package.zip', 'w') as archive:
+        for name in ['METS.xml', 'alto/cover.xml', 'alto/colophon.xml']:
+            archive.write(tmp_path / name, f'package/{name}')
+    assert document_content(tmp_path / 'package.zip') == expected
+
+
+def test_other_files_are_ignored(tmp_path):
+    shutil.copytree(ALTO_DIR, tmp_path / 'alto')
+    (tmp_path / 'alto' / 'notes.xml').write_text('<notes/>', encoding='utf-8')
+    assert document_content(tmp_path / 'alto') == document_content(ALTO_DIR)
+
+
+@pytest.mark.parametrize('href', ['{outside}/cover.xml', 'file://{outside}/cover.xml',
+                                  '../outside/cover.xml', 'alto/../../outside/cover.xml',
+                                  'link/cover.xml'])
+def test_locations_out_of_the_document_are_rejected(tmp_path, href):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    shutil.copy(ALTO_DIR / 'alto_report_0001.xml', outside / 'cover.xml')
+    document = tmp_path / 'document'
+    document.mkdir()
+    (document / 'link').symlink_to(outside)
+    (document / 'METS.xml').write_text(
+        METS.replace('file://./alto/cover.xml', href.format(outside=outside)), encoding='utf-8')
+    with pytest.raises(ValueError, match='out of the document'):
+        MeteorDocument(str(document))
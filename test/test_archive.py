@@ -0,0 +1,71 @@
+"""Test that documents read from archives and gzip files give the same results as the
+original files"""
+
+
+import gzip
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from metadata_extract.meteor_document import MeteorDocument
+
+
+ALTO_DIR = Path('test/resources/alto_report')
+ALTO_FILES = sorted(ALTO_DIR.glob('*.xml'))
+
+
+def document_content(path):
+    with MeteorDocument(str(path)) as doc:
+        return doc.pages, {page_nr: [vars(block) for block in page.text_blocks]
+                           for page_nr, page in doc.page_objects.items()}
+
+
+@pytest.mark.parametrize('archive_name', ['alto.zip', 'alto.tar', 'alto.tar.gz'])
+def test_alto_archives(tmp_path, archive_name):
+    archive_path = tmp_path / archive_name
+    if archive_name.endswith('.zip'):
+        with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('package/METS.txt', 'not a page')
+            for alto_file in reversed(ALTO_FILES):
+                archive.write(alto_file, f'package/{alto_file.name}')
+    else:
+        with tarfile.open(archive_path, 'w:gz' if archive_name.endswith('.gz') else 'w') as archive:
+            for alto_file in reversed(ALTO_FILES):
+                archive.add(alto_file, f'package/{alto_file.name}')
+    assert document_content(archive_path) == document_content(ALTO_DIR)
+
+
+def test_gzipped_alto_files(tmp_path):
+    for alto_file in ALTO_FILES:
+        with open(alto_file, 'rb') as infile, gzip.open(tmp_path / f'{alto_file.name}.gz',
+                                                        'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+    assert document_content(tmp_path) == document_content(ALTO_DIR)
+
+    with zipfile.ZipFile(tmp_path / 'alto.zip', 'w') as archive:
+        for alto_file in ALTO_FILES:
+            archive.write(tmp_path / f'{alto_file.name}.gz', f'{alto_file.name}.gz')
+    assert document_content(tmp_path / 'alto.zip') == document_content(ALTO_DIR)
+
+
+def test_pdf_in_archive_and_gzip_file(tmp_path):
+    with MeteorDocument('test/resources/report.pdf') as doc:
+        expected = doc.pages, doc.pdfinfo
+    with open('test/resources/report.pdf', 'rb') as infile, \
+            gzip.open(tmp_path / 'report.pdf.gz', 'wb') as outfile:
+        shutil.copyfileobj(infile, outfile)
+    with tarfile.open(tmp_path / 'report.tgz', 'w:gz') as archive:
+        archive.add('test/resources/report.pdf', 'report.pdf')
+    for path in [tmp_path / 'report.pdf.gz', tmp_path / 'report.tgz']:
+        with MeteorDocument(str(path)) as doc:
+            assert (doc.pages, doc.pdfinfo) == expected
+
+
+def test_archive_without_document(tmp_path):
+    with zipfile.ZipFile(tmp_path / 'empty.zip', 'w') as archive:
+        archive.writestr('readme.txt', 'nothing here')
+    with pytest.raises(ValueError):
+        MeteorDocument(str(tmp_path / 'empty.zip'))
@@ -0,0 +1,54 @@
+"""Test the local daemon and its client"""
+
+
+import base64
+import os
+import socket
+import threading
+
+from metadata_extract.meteor import Meteor
+from src.daemon import DaemonServer
+from src.daemon_client import send
+
+
+def test_requests_and_shutdown(tmp_path):
+    socket_path = str(tmp_path / 'meteor.sock')
+    server = DaemonServer(socket_path, Meteor)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with open('test/resources/report.pdf', 'rb') as file:
+            data = base64.b64encode(file.read()).decode()
+        responses = send(socket_path, [
+            {'command': 'ping'},
+            {'path': os.path.abspath('test/resources/report.pdf')},
+            {'path': 'test/resources/report.pdf'},
+            {'data': data, 'trace': True},
+            {'data': 'not base64'},
+            {'file': 'test/resources/report.pdf'},
+            [1, 2],
+            'x',
+            {'path': 1},
+            {'command': 'ping'}
+        ])
+        expected = Meteor().run('test/resources/report.pdf')
+        assert responses[0] == {'status': 'ok'}
+        assert responses[1] == {'results': expected}
+        assert responses[2] == {'error': 'Invalid request: the path must be absolute'}
+        assert 'trace' in responses[3]['results']
+        assert 'error' in responses[4] and 'error' in responses[5]
+        # Requests which are not JSON objects get an error, on the same connection
+        assert responses[6] == responses[7] == {'error': 'Invalid request: a JSON object expected'}
+        assert responses[8] == {'error': 'Invalid request: the path must be absolute'}
+        assert responses[9] == {'status': 'ok'}
+
+        # An idle connection does not prevent the daemon from stopping
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(socket_path)
+            server.stop()
+            thread.join()
+            server.server_close()
+    finally:
+        if thread.is_alive():
+            server.stop()
+    assert not os.path.exists(socket_path)
@@ -0,0 +1,71 @@
+"""Test that the evaluation harness of the diff scripts only runs documents that changed, and
+resumes interrupted runs"""
+
+
+import json
+
+from diff import harness
+from .helpers import write_pdf
+
+
+def write_document(path, isbn):
+    write_pdf(path, texts={1: f'ISBN {isbn}\nKapittel om metadata i rapporter'})
+
+
+def isbns(records):
+    return {doc_id: record['metadata']['isbn']['value'] for doc_id, record in records.items()
+            if 'metadata' in record}
+
+
+def test_incremental_runs(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    write_document(folder / '1.pdf', '978-82-8307-056-0')
+    write_document(folder / '2.pdf', '978-82-7945-200-7')
+    (folder / 'README.txt').write_text('Evaluation files')
+    output = str(tmp_path / 'results.jsonl')
+
+    assert harness.evaluate(str(folder), output, jobs=2) == (2, 0, 0)
+    records = harness.read_records(output)
+    assert isbns(records) == {1: '9788283070560', 2: '9788279452007'}
+    with open(output, encoding='utf-8') as file:
+        assert [json.loads(line)['doc_id'] for line in file] == [1, 2]
+
+    assert harness.evaluate(str(folder), output, jobs=2) == (0, 2, 0)
+    assert harness.read_records(output) == records
+
+    write_document(folder / '2.pdf', '978-82-8307-057-7')
+    (folder / '3.pdf').write_bytes(b'%PDF-1.7 broken')
+    assert harness.evaluate(str(folder), output, jobs=2) == (2, 1, 1)
+    records = harness.read_records(output)
+    assert isbns(records) == {1: '9788283070560', 2: '9788283070577'}
+    assert 'error' in records[3]
+
+
+def test_interrupted_run(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    write_document(folder / '1.pdf', '978-82-8307-056-0')
+    write_document(folder / '2.pdf', '978-82-7945-200-7')
+    output = str(tmp_path / 'results.jsonl')
+    harness.evaluate(str(folder), output, jobs=1)
+    with open(output, encoding='utf-8') as file:
+        first_line = file.readline()
+    with open(output, 'w', encoding='utf-8') as file:
+        file.write(first_line + '{"doc_id": 2, "ha')
+    assert list(harness.read_records(output)) == [1]
+    assert harness.evaluate(str(folder), output, jobs=1) == (1, 1, 0)
+    assert list(harness.read_records(output)) == [1, 2]
+
+
+def test_snapshots(tmp_path):
+    folder = tmp_path / 'files'
+    folder.mkdir()
+    write_document(folder / '1.pdf', '978-82-8307-056-0')
+    snapshot_dir = tmp_path / 'snapshots'
+    snapshot_dir.mkdir()
+    output = str(tmp_path / 'results.jsonl')
+    assert harness.evaluate(str(folder), output, jobs=1, snapshot_dir=str(snapshot_dir)) \
+        == (1, 0, 0)
+    assert (snapshot_dir / '1.pdf.snapshot').exists()
+    assert isbns(harness.read_records(output)) == {1: '9788283070560'}
@@ -0,0 +1,38 @@
+"""Test candidate selection in the metadata module, and that skipping decided fields
+does not change results"""
+
+
+from metadata_extract.candidate import Candidate, Origin
+from metadata_extract.metadata import Metadata
+from metadata_extract.meteor import Meteor
+
+
+def test_title_is_final_with_pdfinfo_title():
+    metadata = Metadata()
+    metadata.add_candidate('title', Candidate('Front page title', Origin.FRONT_PAGE))
+    assert metadata.is_final('title') is False
+    metadata.add_candidate('title', Candidate('Title from info', Origin.PDFINFO, page_nr=1))
+    assert metadata.is_final('title') is True
+
+
+def test_year_is_final_with_copyright_year():
+    metadata = Metadata()
+    metadata.add_candidate('year', Candidate(2020, Origin.PDFINFO, page_nr=1))
+    assert metadata.is_final('year') is False
+    metadata.add_candidate('year', Candidate(2021, Origin.COPYRIGHT, page_nr=2))
+    assert metadata.is_final('year') is True
+
+
+def test_publisher_is_final_with_registry_entry():
+    metadata = Metadata()
+    metadata.add_candidate('publisher', Candidate('NB', Origin.PAGE, page_nr=1))
+    assert metadata.is_final('publisher') is False
+    publisher = Candidate('Nasjonalbiblioteket', Origin.COPYRIGHT, page_nr=2)
+    publisher.reg_entries = [{'authId': 1, 'name': 'Nasjonalbiblioteket'}]
+    metadata.add_candidate('publisher', publisher)
+    assert metadata.is_final('publisher') is True
+
+
+def test_exhaustive_run_gives_same_results():
+    for path in ['test/resources/report.pdf', 'test/resources/alto_report']:
+        assert Meteor().run(path) == Meteor(exhaustive=True).run(path)
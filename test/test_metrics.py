@@ -0,0 +1,59 @@
+"""Test that traces of Meteor runs are recorded as Prometheus metrics, and that values of
+processes which exited are removed from the multiprocess directory"""
+
+
+import fcntl
+import os
+import subprocess
+import sys
+
+from metadata_extract.meteor import Meteor
+from src import metrics
+
+
+def run_process(directory, code):
+    """Runs code in a process using the metrics, and returns the files of the multiprocess
+    directory before the process marks itself dead"""
+    code = (f'import os\nfrom src import metrics\n{code}\n'
+            f'print(",".join(sorted(os.listdir({str(directory)!r}))))\n'
+            'metrics.mark_process_dead(os.getpid())')
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                          check=True, env=os.environ | {'PROMETHEUS_MULTIPROC_DIR': str(directory)}
+                          ).stdout.strip().split(',')
+
+
+def test_observe_trace():
+    results = Meteor().run('test/resources/report.pdf', trace=True)
+    metrics.observe_trace(results['trace'], 1000)
+    output = metrics.generate_latest().decode()
+    assert 'meteor_stage_duration_seconds_count{stage="load_document"}' in output
+    assert 'meteor_document_size_bytes_count 1.0' in output
+    assert 'meteor_pages_processed_total' in output
+
+
+def test_first_process_clears_directory(tmp_path):
+    (tmp_path / 'counter_1.db').write_bytes(b'')
+    (tmp_path / 'gauge_livesum_1.db').write_bytes(b'')
+    files = run_process(tmp_path, 'metrics.EXTRACTION_QUEUE.inc()')
+    assert 'counter_1.db' not in files and 'gauge_livesum_1.db' not in files
+    assert any(name.startswith('gauge_livesum_') for name in files)
+    assert sorted(os.listdir(tmp_path)) == [name for name in files
+                                            if not name.startswith('gauge_livesum_')]
+
+
+def test_other_processes_keep_directory(tmp_path):
+    (tmp_path / 'counter_1.db').write_bytes(b'')
+    with open(tmp_path / metrics.LOCK_FILE, 'a', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        assert 'counter_1.db' in run_process(tmp_path, '')
+    assert 'counter_1.db' in os.listdir(tmp_path)
+
+
+def test_killed_workers_are_marked_dead(tmp_path):
+    files = run_process(tmp_path, 'from src.util import Utils\n'
+                                  'from src.worker_pool import WorkerPool\n'
+                                  'pool = WorkerPool(size=1, create_meteor=Utils.create_meteor)\n'
+                                  'pool.wait_ready()\n'
+                                  'pool.close()')
+    # Only the live gauges of the process running the pool are left
+    assert len([name for name in files if name.startswith('gauge_livesum_')]) == 1
@@ -0,0 +1,40 @@
+"""Test that text blocks of PDF pages are the same when read from the TextPages extracted for
+the text of the pages, and that they are only extracted for the pages that need them"""
+
+
+import fitz
+
+from metadata_extract.finder import Finder
+from metadata_extract.meteor_document import MeteorDocument
+from metadata_extract.page import Page
+from metadata_extract.resource_loader import ResourceLoader
+
+
+def test_text_blocks_from_shared_textpages():
+    with MeteorDocument('test/resources/report.pdf') as doc, \
+            fitz.open('test/resources/report.pdf') as pdf:
+        for page_nr in doc.pages:
+            assert page_nr in doc.textpages
+            page = doc.get_page_object(page_nr)
+            assert page_nr not in doc.textpages
+            expected = Page(pdf_page=pdf.load_page(page_nr - 1))
+            assert [vars(block) for block in page.text_blocks] \
+                == [vars(block) for block in expected.text_blocks]
+
+
+def test_report_prefix_pages(tmp_path):
+    ResourceLoader.load()
+    path = tmp_path / 'report.pdf'
+    with fitz.open() as pdf:
+        for page_nr in range(1, 7):
+            pdf.new_page().insert_text((72, 72), 'NIBIO-rapport 2021: metadata' if page_nr == 3
+                                       else f'Kapittel {page_nr} om metadata i tekster')
+        pdf.save(path)
+    with MeteorDocument(str(path)) as doc:
+        finder = Finder(doc, None, lambda _: None)
+        finder.find_report_prefix()
+        assert list(doc.page_objects) == [3]
+    assert finder.metadata.candidates['publisher'][0].to_dict() == {
+        'value': 'NIBIO',
+        'origin': {'type': 'RAPPORT_PREFIX', 'pageNumber': 3}
+    }
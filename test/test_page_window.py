@@ -0,0 +1,86 @@
+"""Test adaptive page windows: more pages are read only while required fields are missing,
+and never more than the page cap"""
+
+
+import shutil
+import zipfile
+
+import pytest
+
+from metadata_extract.meteor import ADAPTIVE_WINDOW, Meteor
+from metadata_extract.meteor_document import MeteorDocument, PageWindow
+from .helpers import CHAPTER, write_pdf
+
+
+COLOPHON = '''ISBN 978-82-8307-056-0
+Utgiver: Nasjonalbiblioteket
+© 2021 Nasjonalbiblioteket'''
+
+
+def pages_read(results):
+    return sum(stage['pagesTouched'] for stage in results['trace']['stages']
+               if stage['name'] in ('load_document', 'expand_window'))
+
+
+def test_colophon_is_found_by_expanding(tmp_path):
+    path = write_pdf(tmp_path / 'report.pdf', 30, {1: 'Rapport om metadata', 8: COLOPHON})
+    fixed = Meteor().run(path)
+    assert fixed['isbn'] is None
+    adaptive = Meteor(window=ADAPTIVE_WINDOW).run(path, trace=True)
+    assert adaptive['isbn'] == {
+        'value': '9788283070560',
+        'origin': {'type': 'PAGE', 'pageNumber': 8}
+    }
+    assert adaptive['year'] == {
+        'value': 2021,
+        'origin': {'type': 'COPYRIGHT', 'pageNumber': 8}
+    }
+    assert pages_read(adaptive) <= ADAPTIVE_WINDOW['max_pages']
+
+
+def test_no_expansion_when_fields_are_found(tmp_path):
+    path = write_pdf(tmp_path / 'report.pdf', 30, {1: COLOPHON})
+    results = Meteor(window=ADAPTIVE_WINDOW).run(path, trace=True)
+    assert results['isbn'] == {
+        'value': '9788283070560',
+        'origin': {'type': 'PAGE', 'pageNumber': 1}
+    }
+    assert 'expand_window' not in [stage['name'] for stage in results['trace']['stages']]
+
+
+def test_page_cap(tmp_path):
+    path = write_pdf(tmp_path / 'report.pdf', 30, {1: 'Rapport om metadata', 8: COLOPHON})
+    window = PageWindow(start=2, end=2, step=3, max_pages=6)
+    results = Meteor().run(path, trace=True, window=window)
+    assert results['isbn'] is None
+    assert pages_read(results) <= 6
+
+
+def test_expand_pdf(tmp_path):
+    path = write_pdf(tmp_path / 'report.pdf', 12, {})
+    with MeteorDocument(path, start=2, end=1) as doc:
+        assert list(doc.pages) == [1, 2, 12]
+        assert doc.expand(3, 8) == [3, 4, 5, 10, 11]
+        assert list(doc.pages) == [1, 2, 3, 4, 5, 10, 11, 12]
+        assert doc.pages[4] == CHAPTER.format(4) + '\n'
+        assert doc.expand(3, 20) == [6, 7, 8, 9]
+        assert doc.expand(3, 20) == []
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_expand_alto(tmp_path, packed):
+    source = 'test/resources/alto_report/alto_report_0001.xml'
+    directory = tmp_path / 'document'
+    directory.mkdir()
+    for page_nr in range(1, 11):
+        shutil.copy(source, directory / f'page_{page_nr:04}.xml')
+    path = directory
+    if packed:
+        path = tmp_path / 'document.zip'
+        with zipfile.ZipFile(path, 'w') as archive:
+            for alto_file in directory.iterdir():
+                archive.write(alto_file, alto_file.name)
+    with MeteorDocument(str(path), start=1, end=1) as doc:
+        assert doc.expand(2, 20) == [2, 3, 8, 9]
+        assert sorted(doc.page_objects) == [1, 2, 3, 8, 9, 10]
+        assert doc.pages[3] == doc.pages[1]
@@ -128,3 +128,14 @@ def test_issn():
             "pageNumber": 2
         }
     }
+
+
+def test_trace():
+    traced_results = meteor.run('test/resources/report.pdf', trace=True)
+    assert 'trace' not in results
+    stages = [stage['name'] for stage in traced_results['trace']['stages']]
+    assert stages[0] == 'load_document'
+    assert 'get_language' in stages
+    assert traced_results['trace']['stages'][0]['pagesTouched'] == 4
+    del traced_results['trace']
+    assert traced_results == results
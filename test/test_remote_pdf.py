@@ -0,0 +1,198 @@
+"""Test fetching of files, in full or partially with range requests, from a local HTTP server"""
+
+
+import asyncio
+import contextlib
+import functools
+import http.server
+import os
+import re
+import threading
+
+import fitz
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from metadata_extract.meteor import Meteor
+from src.fetcher import Fetcher, NotModified
+from src.remote_pdf import RemotePdf, RangeRequestError
+from src.settings import get_settings
+from src.util import Utils
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves files with support for single range requests and ETags, and counts the bytes
+    sent"""
+
+    ranges_supported = True
+    bytes_sent = 0
+
+    def send_not_modified(self, etag: str) -> bool:
+        if self.headers.get('If-None-Match') != etag:
+            return False
+        self.send_response(304)
+        self.end_headers()
+        return True
+
+    def do_HEAD(self) -> None:  # pylint: disable=invalid-name
+        etag = f'"{os.path.getsize(self.translate_path(self.path))}"'
+        if not self.send_not_modified(etag):
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.end_headers()
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        with open(self.translate_path(self.path), 'rb') as file:
+            data = file.read()
+        etag = f'"{len(data)}"'
+        if self.send_not_modified(etag):
+            return
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match and RangeHandler.ranges_supported:
+            first, last = match.groups()
+            if first:
+                start, end = int(first), int(last) if last else len(data) - 1
+            else:
+                start, end = max(len(data) - int(last), 0), len(data) - 1
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            # The client stopped reading, e.g. when the file is too large
+            return
+        RangeHandler.bytes_sent += len(body)
+
+    def log_message(self, *args: object) -> None:  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_server(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('files')
+    with fitz.open('test/resources/report.pdf') as report, fitz.open() as large:
+        large.insert_pdf(report, to_page=1)
+        # Filler pages with incompressible content
+        for _ in range(80):
+            page = large.new_page()
+            pixmap = fitz.Pixmap(fitz.csRGB, 128, 128, os.urandom(128 * 128 * 3), False)
+            page.insert_image(page.rect, pixmap=pixmap)
+        large.insert_pdf(report, from_page=2)
+        large.set_metadata(report.metadata)
+        large.save(directory / 'large.pdf', garbage=3, deflate=True)
+    with open('test/resources/report.pdf', 'rb') as report_file:
+        (directory / 'report.pdf').write_bytes(report_file.read())
+    handler = functools.partial(RangeHandler, directory=str(directory))
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield directory, f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+
+
+async def fetch_partial(url, filepath):
+    async with httpx.AsyncClient() as client:
+        await RemotePdf(url, client).save(filepath)
+
+
+def test_partial_file_gives_same_results(server, tmp_path):
+    directory, url = server
+    RangeHandler.bytes_sent = 0
+    asyncio.run(fetch_partial(url + '/large.pdf', str(tmp_path / 'partial.pdf')))
+    size = os.path.getsize(directory / 'large.pdf')
+    assert RangeHandler.bytes_sent < size / 4
+    meteor = Meteor()
+    assert meteor.run(str(tmp_path / 'partial.pdf')) == meteor.run(str(directory / 'large.pdf'))
+
+
+def test_small_file_needs_full_download(server, tmp_path):
+    _, url = server
+    with pytest.raises(RangeRequestError):
+        asyncio.run(fetch_partial(url + '/report.pdf', str(tmp_path / 'partial.pdf')))
+
+
+def test_server_without_range_support(server, tmp_path):
+    _, url = server
+    RangeHandler.ranges_supported = False
+    try:
+        with pytest.raises(RangeRequestError):
+            asyncio.run(fetch_partial(url + '/large.pdf', str(tmp_path / 'partial.pdf')))
+    finally:
+        RangeHandler.ranges_supported = True
+
+
+async def fetch(url, filepath, size_limit, use_range_requests=True, validators=None):
+    fetcher = Fetcher(size_limit=size_limit, use_range_requests=use_range_requests)
+    try:
+        return await fetcher.fetch(url, filepath, validators)
+    finally:
+        await fetcher.close()
+
+
+def test_fetch_falls_back_to_full_download(server, tmp_path):
+    directory, url = server
+    asyncio.run(fetch(url + '/report.pdf', str(tmp_path / 'report.pdf'), 10 * 1024 * 1024))
+    with open(tmp_path / 'report.pdf', 'rb') as downloaded, \
+            open(directory / 'report.pdf', 'rb') as original:
+        assert downloaded.read() == original.read()
+
+
+def test_fetch_size_limit(server, tmp_path):
+    _, url = server
+    for name in ('report.pdf', 'large.pdf'):
+        with pytest.raises(HTTPException):
+            asyncio.run(fetch(url + '/' + name, str(tmp_path / name), 100 * 1024))
+        assert not os.path.exists(tmp_path / name)
+
+
+@pytest.mark.parametrize('use_range_requests', [False, True])
+def test_conditional_fetch(server, tmp_path, use_range_requests):
+    _, url = server
+    filepath = str(tmp_path / 'large.pdf')
+    validators = asyncio.run(fetch(url + '/large.pdf', filepath, 100 * 1024 * 1024,
+                                   use_range_requests))
+    assert 'ETag' in validators
+    with pytest.raises(NotModified):
+        asyncio.run(fetch(url + '/large.pdf', filepath, 100 * 1024 * 1024,
+                          use_range_requests, validators))
+    assert asyncio.run(fetch(url + '/large.pdf', filepath, 100 * 1024 * 1024,
+                             use_range_requests, {'ETag': '"changed"'})) == validators
+
+
+def test_results_are_cached_until_file_changes(server, tmp_path, monkeypatch):
+    _, url = server
+    monkeypatch.setattr(get_settings(), 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(get_settings(), 'MAX_FILE_SIZE_MB', 100)
+    utils = Utils()
+    files_in_slots = []
+
+    @contextlib.asynccontextmanager
+    async def extraction_slot():
+        files_in_slots.append(os.listdir(tmp_path))
+        yield
+
+    async def process_twice():
+        first = await utils.process_url(url + '/report.pdf', extraction_slot=extraction_slot)
+        bytes_sent = RangeHandler.bytes_sent
+        second = await utils.process_url(url + '/report.pdf', extraction_slot=extraction_slot)
+        assert RangeHandler.bytes_sent == bytes_sent
+        # Traced requests are extracted again, to get their trace
+        traced = await utils.process_url(url + '/report.pdf', trace=True,
+                                         extraction_slot=extraction_slot)
+        await utils.fetcher.close()
+        return first, second, traced
+
+    first, second, traced = asyncio.run(process_twice())
+    utils.pool.close()
+    # The slot is taken once the file is downloaded, and not for cached results
+    assert len(files_in_slots) == 2 and len(files_in_slots[0]) == 1
+    assert first == second == Meteor().run('test/resources/report.pdf')
+    assert 'trace' in traced and 'trace' not in utils.url_cache.get(url + '/report.pdf')['results']
@@ -0,0 +1,37 @@
+"""Test the batch mode of run_on_file.py"""
+
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+
+def run(*args):
+    return subprocess.run([sys.executable, 'run_on_file.py', *args], capture_output=True,
+                          text=True, check=False)
+
+
+def test_batch_with_resume(tmp_path):
+    os.makedirs(tmp_path / 'folder' / 'sub')
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'report.pdf')
+    shutil.copytree('test/resources/alto_report', tmp_path / 'folder' / 'sub' / 'alto')
+    with open(tmp_path / 'folder' / 'broken.pdf', 'wb') as broken:
+        broken.write(b'not a pdf')
+    output = tmp_path / 'output.jsonl'
+    # A result from an earlier run, and an incomplete line from an interrupted one
+    output.write_text(json.dumps({'path': str(tmp_path / 'folder' / 'report.pdf')}) + '\n{"pa')
+
+    process = run(str(tmp_path / 'folder'), '-o', str(output), '-j', '2')
+    assert process.returncode == 1
+    assert '3/3' not in process.stderr and '2/2 documents, 1 errors' in process.stderr
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(lines) == 3
+    results = {line['path']: line for line in lines}
+    assert 'error' in results[str(tmp_path / 'folder' / 'broken.pdf')]
+    assert 'results' in results[str(tmp_path / 'folder' / 'sub' / 'alto')]
+
+    process = run(str(tmp_path / 'folder' / '*.pdf'), '-o', str(output))
+    assert '3 documents already done' in process.stderr
+    assert len(output.read_text().splitlines()) == 3
@@ -0,0 +1,99 @@
+"""Test the extraction of all documents in a directory, with cached results"""
+
+
+import os
+import shutil
+
+import prometheus_client
+
+from metadata_extract.meteor import Meteor
+from src.result_cache import ResultCache
+from src.scan import Scanner, find_documents
+from src.util import Utils
+
+
+meteor = Meteor()
+
+
+def make_folder(tmp_path):
+    os.makedirs(tmp_path / 'folder' / 'sub')
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'report.pdf')
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'sub' / 'other.PDF')
+    shutil.copytree('test/resources/alto_report', tmp_path / 'folder' / 'sub' / 'alto')
+    return str(tmp_path / 'folder')
+
+
+def test_find_documents(tmp_path):
+    folder = make_folder(tmp_path)
+    assert [os.path.relpath(p, folder) for p in find_documents(folder)] == [
+        'report.pdf', 'sub/other.PDF', 'sub/alto'
+    ]
+
+
+def test_find_archives(tmp_path):
+    for name in ['alto.zip', 'report.pdf.gz', 'pages.tar.gz', 'notes.txt.gz']:
+        (tmp_path / name).touch()
+    assert [os.path.basename(p) for p in find_documents(str(tmp_path))] == [
+        'alto.zip', 'pages.tar.gz', 'report.pdf.gz'
+    ]
+
+
+def test_scan_uses_cache_until_document_changes(tmp_path):
+    folder = make_folder(tmp_path)
+    extracted = []
+
+    def extract(path):
+        extracted.append(os.path.relpath(path, folder))
+        return meteor.run(path)
+
+    scanner = Scanner(extract, workers=1, cache=ResultCache(str(tmp_path / 'cache.db')))
+    results = {r['path']: r for r in scanner.scan(folder)}
+    assert sorted(extracted) == ['report.pdf', 'sub/alto', 'sub/other.PDF']
+    assert results['sub/alto']['results'] == meteor.run('test/resources/alto_report')
+    assert not any(r['cached'] for r in results.values())
+
+    extracted.clear()
+    os.utime(os.path.join(folder, 'sub', 'other.PDF'), (0, 0))
+    results = {r['path']: r for r in scanner.scan(folder)}
+    assert extracted == ['sub/other.PDF']
+    assert results['report.pdf']['cached']
+    assert results['report.pdf']['results'] == meteor.run('test/resources/report.pdf')
+
+
+def result_cache_requests(result):
+    return prometheus_client.REGISTRY.get_sample_value('meteor_result_cache_requests_total',
+                                                       {'result': result}) or 0
+
+
+def test_cache_hits_and_misses_are_counted(tmp_path):
+    folder = make_folder(tmp_path)
+    scanner = Scanner(meteor.run, workers=1, cache=ResultCache(str(tmp_path / 'cache.db')))
+    hits, misses = result_cache_requests('hit'), result_cache_requests('miss')
+    list(scanner.scan(folder))
+    list(scanner.scan(folder))
+    assert result_cache_requests('miss') - misses == 3
+    assert result_cache_requests('hit') - hits == 3
+
+
+def test_scan_reports_errors(tmp_path):
+    folder = make_folder(tmp_path)
+    with open(os.path.join(folder, 'broken.pdf'), 'wb') as broken:
+        broken.write(b'not a pdf')
+    results = {r['path']: r for r in Scanner(meteor.run, workers=1).scan(folder)}
+    assert 'error' in results['broken.pdf']
+    assert 'results' in results['report.pdf']
+
+
+def test_service_scans_in_their_own_pool(tmp_path, monkeypatch):
+    folder = make_folder(tmp_path)
+    utils = Utils()
+    monkeypatch.setattr(utils.pool, 'run', None)
+    try:
+        results = {r['path']: r for r in utils.scanner.scan(folder)}
+    finally:
+        utils.pool.close()
+        if utils.scan_pool:
+            utils.scan_pool.close()
+    assert utils.scan_pool is not None
+    assert results['report.pdf']['results'] \
+        == Utils.create_meteor().run('test/resources/report.pdf')
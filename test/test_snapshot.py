@@ -0,0 +1,89 @@
+"""Test that Meteor gives the same results from snapshots as from the original documents"""
+
+
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import pytest
+
+from metadata_extract import snapshot
+from metadata_extract.meteor import ADAPTIVE_WINDOW, Meteor
+from metadata_extract.meteor_document import MeteorDocument
+from .helpers import write_pdf
+
+
+def write_report(path, page_count):
+    return write_pdf(path, page_count, {9: 'ISBN 978-82-8307-056-0\n© 2021 Nasjonalbiblioteket'})
+
+
+def without_language(results):
+    """Languages detected in the short texts of generated documents vary between runs"""
+    return {key: value for key, value in results.items() if key != 'language'}
+
+
+@pytest.mark.parametrize('path', ['test/resources/report.pdf', 'test/resources/alto_report'])
+def test_same_results(tmp_path, path):
+    snapshot_path = snapshot.snapshot_of(path, str(tmp_path))
+    assert snapshot_path == str(tmp_path / (os.path.basename(path) + '.snapshot'))
+    assert Meteor().run(snapshot_path) == Meteor().run(path)
+    with MeteorDocument(path) as doc, MeteorDocument(snapshot_path) as snapshot_doc:
+        assert snapshot_doc.pages == doc.pages
+        assert snapshot_doc.pdfinfo == doc.pdfinfo
+        for page_nr in doc.pages:
+            assert [vars(block) for block in snapshot_doc.get_page_object(page_nr).text_blocks] \
+                == [vars(block) for block in doc.get_page_object(page_nr).text_blocks]
+
+
+def test_page_windows(tmp_path):
+    path = write_report(tmp_path / 'report.pdf', 60)
+    snapshot_path = snapshot.snapshot_of(path, str(tmp_path), pages=15)
+    with MeteorDocument(snapshot_path) as doc:
+        assert list(doc.pages) == [1, 2, 3, 4, 5, 56, 57, 58, 59, 60]
+    assert without_language(Meteor().run(snapshot_path)) == without_language(Meteor().run(path))
+    adaptive = Meteor(window=ADAPTIVE_WINDOW)
+    assert without_language(adaptive.run(snapshot_path)) == without_language(adaptive.run(path))
+
+
+def test_snapshots_are_taken_again(tmp_path):
+    path = write_report(tmp_path / 'report.pdf', 3)
+    snapshot_path = snapshot.snapshot_of(path, str(tmp_path))
+    mtime = os.stat(snapshot_path).st_mtime_ns
+    assert snapshot.snapshot_of(path, str(tmp_path)) == snapshot_path
+    assert os.stat(snapshot_path).st_mtime_ns == mtime
+    with open(snapshot_path, 'wb') as file:
+        pickle.dump({'format': snapshot.SNAPSHOT_FORMAT, 'version': 0}, file)
+    with pytest.raises(ValueError):
+        MeteorDocument(snapshot_path)
+    snapshot.snapshot_of(path, str(tmp_path))
+    assert without_language(Meteor().run(snapshot_path)) == without_language(Meteor().run(path))
+
+
+def test_snapshots_of_another_extraction_version(tmp_path, monkeypatch):
+    path = write_report(tmp_path / 'report.pdf', 3)
+    snapshot_path = snapshot.snapshot_of(path, str(tmp_path))
+    monkeypatch.setattr(snapshot, 'extraction_version', lambda: 'changed')
+    with pytest.raises(ValueError):
+        MeteorDocument(snapshot_path)
+    assert not snapshot.is_current(Path(snapshot_path), Path(path))
+    snapshot.snapshot_of(path, str(tmp_path))
+    with MeteorDocument(snapshot_path) as doc:
+        assert len(doc.pages) == 3
+
+
+def test_heuristics_are_not_in_extraction_version():
+    assert 'page.py' in snapshot.EXTRACTION_MODULES
+    assert 'text.py' not in snapshot.EXTRACTION_MODULES
+    assert 'finder.py' not in snapshot.EXTRACTION_MODULES
+
+
+def test_alto_files_changed_in_place(tmp_path):
+    path = tmp_path / 'alto_report'
+    shutil.copytree('test/resources/alto_report', path)
+    snapshot_path = Path(snapshot.snapshot_of(str(path), str(tmp_path)))
+    assert snapshot.is_current(snapshot_path, path)
+    # Editing a file in place does not change the modification time of the directory
+    later = snapshot_path.stat().st_mtime + 10
+    os.utime(next(path.iterdir()), (later, later))
+    assert not snapshot.is_current(snapshot_path, path)
@@ -0,0 +1,53 @@
+"""Test that heavy dependencies are imported lazily, and that importing Meteor is quick"""
+
+
+import subprocess
+import sys
+
+
+# Heavy dependencies must only be imported by the code paths that use them
+LAZY_MODULES = ['fitz', 'langdetect', 'dateparser', 'dateutil', 'mysql', 'httpx']
+
+# Cumulative import time of metadata_extract.meteor relative to the import time of the heavy
+# dependencies Meteor uses, measured on the same machine, best of IMPORT_TIME_RUNS runs. It was
+# above 1 when they were imported eagerly, and is about 0.2.
+IMPORT_TIME_RATIO = 0.5
+IMPORT_TIME_RUNS = 3
+
+
+def imported_lazy_modules(code):
+    code += f'\nimport sys\nprint(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def test_import_loads_no_heavy_modules():
+    assert imported_lazy_modules('import metadata_extract.meteor') == ''
+
+
+def test_no_heavy_imports():
+    assert imported_lazy_modules('from metadata_extract.meteor import Meteor\nMeteor()') == ''
+
+
+def test_warm_up_loads_lazy_modules():
+    assert imported_lazy_modules('from metadata_extract.meteor import Meteor\n'
+                                 'Meteor().warm_up()') == 'fitz,langdetect,dateparser,dateutil'
+
+
+def import_time(modules):
+    """Returns the best cumulative import time in microseconds, reported by -X importtime,
+    of importing the modules"""
+    code = 'import ' + ', '.join(modules)
+    times = []
+    for _ in range(IMPORT_TIME_RUNS):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                capture_output=True, text=True, check=True).stderr
+        # Modules imported by other modules are indented, only top-level imports are counted
+        fields = [line.split('|') for line in stderr.splitlines()]
+        times.append(sum(int(line[1]) for line in fields if line[-1][1:] in modules))
+    return min(times)
+
+
+def test_import_time():
+    baseline = import_time(['fitz', 'langdetect', 'dateparser', 'dateutil.parser'])
+    assert import_time(['metadata_extract.meteor']) < IMPORT_TIME_RATIO * baseline
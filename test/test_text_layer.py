@@ -0,0 +1,67 @@
+"""Test that PDF files without a usable text layer are rejected before being searched"""
+
+
+import fitz
+import pytest
+
+from metadata_extract.metadata import NO_TEXT_LAYER, new_results
+from metadata_extract.meteor import Meteor
+from metadata_extract.meteor_document import MeteorDocument
+from src.util import Utils
+
+
+def write_scanned_pdf(path, page_count, stamp=None):
+    """Writes a PDF file with an image on each page, and an optional stamp text"""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 50, 50), False)
+    pixmap.set_rect(pixmap.irect, (200, 200, 200))
+    with fitz.open() as doc:
+        for _ in range(page_count):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(72, 72, 522, 770), pixmap=pixmap)
+            if stamp:
+                page.insert_text((72, 800), stamp)
+        doc.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize('stamp', [None, 'Skannet'])
+def test_scanned_pdf(tmp_path, stamp):
+    path = write_scanned_pdf(tmp_path / 'scanned.pdf', 20, stamp)
+    with MeteorDocument(path) as doc:
+        assert not doc.text_layer
+        assert not doc.pages
+        assert doc.expand(5, 20) == []
+    results = Meteor().run(path, trace=True)
+    trace = results.pop('trace')
+    assert results == {**new_results(), 'status': NO_TEXT_LAYER}
+    # Without fonts, no text is extracted, else only from the sampled pages
+    assert sum(stage['pagesTouched'] for stage in trace['stages']) \
+        == (0 if stamp is None else MeteorDocument.TEXT_LAYER_SAMPLE_PAGES)
+    assert Utils.status_code(results) == 422
+
+
+def test_pdf_with_text_layer():
+    with MeteorDocument('test/resources/report.pdf') as doc:
+        assert doc.text_layer
+        assert len(doc.pages) == 4
+    results = Meteor().run('test/resources/report.pdf')
+    assert 'status' not in results
+    assert Utils.status_code(results) == 200
+
+
+def test_short_pdf_with_text_only(tmp_path):
+    path = str(tmp_path / 'short.pdf')
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), 'Årsrapport 2022\nNasjonalbiblioteket', fontsize=20)
+        doc.new_page().insert_text((300, 800), '2')
+        doc.save(path)
+    with MeteorDocument(path) as doc:
+        assert doc.text_layer
+        assert len(doc.pages) == 2
+    results = Meteor().run(path)
+    assert 'status' not in results
+    assert results['title'] == {
+        'value': 'Årsrapport 2022 Nasjonalbiblioteket',
+        'origin': {'type': 'FRONT_PAGE'}
+    }
+    assert Utils.status_code(results) == 200
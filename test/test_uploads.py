@@ -0,0 +1,108 @@
+"""Test the checks and saving of files uploaded to the API, for PDF files and ALTO documents"""
+
+
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+from metadata_extract.meteor import Meteor
+from src.settings import get_settings
+from src.util import Utils
+
+
+ALTO_DIR = Path('test/resources/alto_report')
+ALTO_FILES = sorted(ALTO_DIR.glob('*.xml'))
+
+
+def upload(name: str, content: bytes, content_type: str) -> UploadFile:
+    return UploadFile(io.BytesIO(content), size=len(content), filename=name,
+                      headers=Headers({'content-type': content_type}))
+
+
+def alto_uploads() -> list[UploadFile]:
+    return [upload(f'/client/path/{path.name}', path.read_bytes(), 'text/xml')
+            for path in ALTO_FILES]
+
+
+@pytest.fixture(name='upload_folder')
+def fixture_upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(get_settings(), 'MAX_FILE_SIZE_MB', 1)
+    return tmp_path
+
+
+@pytest.mark.usefixtures('upload_folder')
+def test_alto_files_are_saved_in_a_directory():
+    files = alto_uploads()
+    Utils.verify_files(files)
+    directory = Utils.save_files(files)
+    assert sorted(os.listdir(directory)) == [path.name for path in ALTO_FILES]
+    assert Meteor().run(directory) == Meteor().run(str(ALTO_DIR))
+    Utils.remove(directory)
+    assert not os.path.exists(directory)
+
+
+@pytest.mark.usefixtures('upload_folder')
+def test_zip_archive_is_saved_as_a_file():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        for path in ALTO_FILES:
+            zip_file.write(path, path.name)
+    files = [upload('document.zip', archive.getvalue(), 'application/zip')]
+    Utils.verify_files(files)
+    filepath = Utils.save_files(files)
+    assert filepath.endswith('.zip')
+    assert Meteor().run(filepath) == Meteor().run(str(ALTO_DIR))
+
+
+@pytest.mark.usefixtures('upload_folder')
+@pytest.mark.parametrize('files', [
+    [],
+    [upload('report.txt', b'text', 'text/plain')],
+    [upload('report.pdf', b'%PDF', 'application/pdf'), upload('page_0001.xml', b'', 'text/xml')],
+    [upload('page.xml', b'<alto/>', 'text/xml')],
+    [upload('a/page_0001.xml', b'<alto/>', 'text/xml'),
+     upload('b/page_0001.xml', b'<alto/>', 'text/xml')],
+    [upload('page_0001.xml', b' ' * 1024 * 1024, 'text/xml'),
+     upload('page_0002.xml', b'<alto/>', 'text/xml')]
+])
+def test_invalid_uploads_are_rejected(files):
+    with pytest.raises(HTTPException) as exc_info:
+        Utils.verify_files(files)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.usefixtures('upload_folder')
+def test_mets_file_referring_to_other_files_is_rejected(tmp_path):
+    outside = tmp_path / 'outside.xml'
+    outside.write_bytes(ALTO_FILES[0].read_bytes())
+    mets = f"""<mets xmlns:xlink="http://www.w3.org/1999/xlink">
+      <fileSec><fileGrp><file ID="ALTO1"><FLocat xlink:href="{outside}"/></file></fileGrp>
+      </fileSec>
+      <structMap TYPE="PHYSICAL"><div TYPE="page" ORDER="1"><fptr FILEID="ALTO1"/></div>
+      </structMap>
+    </mets>"""
+    files = [upload('mets.xml', mets.encode(), 'text/xml')]
+    with pytest.raises(HTTPException) as exc_info:
+        Utils.verify_files(files)
+    assert exc_info.value.status_code == 400
+    assert 'out of the document' in exc_info.value.detail
+    # Documents saved without the check are rejected when read
+    directory = Utils.save_files(files)
+    with pytest.raises(ValueError, match='out of the document'):
+        Meteor().run(directory)
+
+
+def test_downloaded_archives_are_renamed(tmp_path):
+    filepath = tmp_path / 'download.pdf'
+    with zipfile.ZipFile(filepath, 'w') as zip_file:
+        zip_file.writestr('page_0001.xml', '<alto/>')
+    assert Utils.with_archive_suffix(str(filepath)) == str(tmp_path / 'download.zip')
+    pdf_path = tmp_path / 'report.pdf'
+    pdf_path.write_bytes(Path('test/resources/report.pdf').read_bytes())
+    assert Utils.with_archive_suffix(str(pdf_path)) == str(pdf_path)
@@ -0,0 +1,37 @@
+"""Test the cache of results for files submitted by URL"""
+
+
+import time
+
+from metadata_extract.metadata import new_results
+from src.url_cache import UrlCache
+
+
+RESULTS = new_results()
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = UrlCache(max_entries=2, max_age=60)
+    cache.put('a', {'ETag': '"a"'}, RESULTS)
+    cache.put('b', {'ETag': '"b"'}, RESULTS)
+    assert cache.get('a') is not None
+    cache.put('c', {'ETag': '"c"'}, RESULTS)
+    assert cache.get('b') is None
+    assert cache.get('a')['validators'] == {'ETag': '"a"'}
+    assert cache.get('c')['results'] == RESULTS
+
+
+def test_old_entries_are_not_used():
+    cache = UrlCache(max_entries=2, max_age=60)
+    cache.put('a', {'ETag': '"a"'}, RESULTS)
+    cache.entries['a']['time'] = time.time() - 61
+    assert cache.get('a') is None
+
+
+def test_files_without_validators_and_traces_are_not_cached():
+    cache = UrlCache(max_entries=2, max_age=60)
+    cache.put('a', {}, RESULTS)
+    assert cache.get('a') is None
+    cache.put('b', {'Last-Modified': 'Mon, 02 Oct 2023 10:00:00 GMT'},
+              {**RESULTS, 'trace': {'wallTime': 1, 'cpuTime': 1, 'stages': []}})
+    assert 'trace' not in cache.get('b')['results']
@@ -0,0 +1,113 @@
+"""Test that the watcher extracts new documents into the result cache, retries failed ones,
+and runs in one process only"""
+
+
+import os
+import shutil
+
+from metadata_extract.meteor import Meteor
+from src.result_cache import ResultCache, document_key
+from src.watcher import Watcher
+
+
+def test_new_documents_are_extracted(tmp_path):
+    os.makedirs(tmp_path / 'folder')
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'old.pdf')
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    watcher = Watcher(str(tmp_path / 'folder'), cache, create_meteor=Meteor)
+    try:
+        watcher.poll()
+        shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'new.pdf')
+        watcher.poll()
+        # Not extracted before its size and modification time are stable
+        assert not watcher.backlog
+        watcher.poll()
+        assert [key.path for key in watcher.backlog] == \
+            [os.path.realpath(tmp_path / 'folder' / 'new.pdf')]
+        watcher.process(watcher.backlog.popleft())
+        watcher.poll()
+        assert not watcher.backlog
+    finally:
+        watcher.pool.close()
+    assert cache.get(document_key(str(tmp_path / 'folder' / 'new.pdf'))) == \
+        Meteor().run('test/resources/report.pdf')
+    assert cache.get(document_key(str(tmp_path / 'folder' / 'old.pdf'))) is None
+
+
+def test_watcher_waits_while_busy(tmp_path):
+    os.makedirs(tmp_path / 'folder')
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    watcher = Watcher(str(tmp_path / 'folder'), cache, create_meteor=Meteor, interval=0.1,
+                      is_busy=lambda: True)
+    watcher.start()
+    try:
+        # Documents present at the first poll are not extracted
+        while watcher.seen is None:
+            watcher.stopped.wait(0.01)
+        shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'new.pdf')
+        watcher.stopped.wait(0.5)
+        assert len(watcher.backlog) == 1
+    finally:
+        watcher.stop()
+
+
+def test_single_watcher_per_lock_file(tmp_path):
+    os.makedirs(tmp_path / 'folder')
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    lock_file = str(tmp_path / 'cache.db.watcher.lock')
+    first, second = (Watcher(str(tmp_path / 'folder'), cache, create_meteor=Meteor,
+                             lock_file=lock_file) for _ in range(2))
+    assert first.start()
+    assert not second.start()
+    first.stop()
+    assert second.start()
+    second.stop()
+
+
+def test_failed_extractions_are_retried(tmp_path):
+    os.makedirs(tmp_path / 'folder')
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    watcher = Watcher(str(tmp_path / 'folder'), cache, create_meteor=Meteor)
+    try:
+        watcher.poll()
+        (tmp_path / 'folder' / 'broken.pdf').write_bytes(b'%PDF-1.7 broken')
+        watcher.poll()
+        watcher.poll()
+        key = watcher.backlog.popleft()
+        for attempt in range(1, Watcher.MAX_ATTEMPTS):
+            watcher.process(key)
+            assert watcher.retries[key.path].attempts == attempt
+            watcher.poll()
+            assert not watcher.backlog
+            watcher.retries[key.path] = watcher.retries[key.path]._replace(at=0)
+            watcher.poll()
+            assert list(watcher.backlog) == [key]
+            watcher.backlog.clear()
+        watcher.process(key)
+        assert not watcher.retries
+    finally:
+        watcher.stop()
+
+
+def test_unchanged_directories_are_not_checked_again(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'folder' / 'sub')
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'sub' / 'old.pdf')
+    checked = []
+    monkeypatch.setattr('src.watcher.document_key',
+                        lambda path: checked.append(path) or document_key(path))
+    monkeypatch.setattr(Watcher, 'FULL_SCAN_POLLS', 4)
+    watcher = Watcher(str(tmp_path / 'folder'), ResultCache(str(tmp_path / 'cache.db')),
+                      create_meteor=Meteor)
+    watcher.poll()
+    assert len(checked) == 1
+    watcher.poll()
+    assert len(checked) == 1
+    shutil.copy('test/resources/report.pdf', tmp_path / 'folder' / 'sub' / 'new.pdf')
+    # Documents of a changed directory are checked until they are stable
+    watcher.poll()
+    assert len(checked) == 3 and not watcher.backlog
+    watcher.poll()
+    assert len(checked) == 4 and len(watcher.backlog) == 1
+    # Full scan
+    watcher.poll()
+    assert len(checked) == 6
@@ -0,0 +1,87 @@
+"""Test that extractions in worker processes give the same results, and that workers
+exceeding their time budget are replaced"""
+
+
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from metadata_extract.meteor import Meteor
+from metadata_extract.resource_loader import ResourceLoader
+from src.util import Utils
+from src.worker_pool import Worker, WorkerPool, ExtractionTimeout
+
+
+class SlowMeteor(Meteor):
+    """Meteor taking too long on files named 'slow'"""
+
+    def run(self, file_path, trace=False, window=None):
+        if file_path == 'slow':
+            time.sleep(10)
+        return super().run(file_path, trace=trace, window=window)
+
+
+def warmed_up_meteor():
+    return Meteor().warm_up()
+
+
+def warmed_up_slow_meteor():
+    return SlowMeteor().warm_up()
+
+
+def meteor_from_preloaded_data():
+    # pylint: disable=import-outside-toplevel, protected-access
+    from langdetect import detector_factory
+    if not ResourceLoader.get_labels() or detector_factory._factory is None:
+        raise RuntimeError('Data not preloaded before the worker was forked')
+    return Utils.create_meteor()
+
+
+def test_results_from_worker():
+    pool = WorkerPool(size=1, create_meteor=Meteor)
+    assert pool.run('test/resources/report.pdf') == Meteor().run('test/resources/report.pdf')
+    pool.close()
+
+
+def test_worker_is_replaced_after_timeout():
+    # The warm-up of the workers does not count against the timeout
+    pool = WorkerPool(size=1, create_meteor=warmed_up_slow_meteor, timeout=1)
+    first_worker = pool.idle.queue[0]
+    with pytest.raises(ExtractionTimeout):
+        pool.run('slow')
+    assert not first_worker.process.is_alive()
+    assert pool.run('test/resources/report.pdf')['isbn']['value'] == '9788217022985'
+    pool.close()
+
+
+def test_pool_is_ready_after_warm_up():
+    pool = WorkerPool(size=2, create_meteor=warmed_up_meteor)
+    assert not pool.ready
+    assert pool.wait_ready(timeout=60)
+    assert pool.ready
+    pool.close()
+
+
+def test_failed_replacement_is_started_again(monkeypatch):
+    pool = WorkerPool(size=1, create_meteor=warmed_up_slow_meteor, timeout=1)
+    with monkeypatch.context() as patch:
+        patch.setattr(Worker, '__init__', Mock(side_effect=OSError('fork failed')))
+        with pytest.raises(ExtractionTimeout):
+            pool.run('slow')
+        # The dead worker is not put back, its place is kept for a new worker
+        assert list(pool.idle.queue) == [None]
+        with pytest.raises(OSError):
+            pool.run('test/resources/report.pdf')
+        assert list(pool.idle.queue) == [None]
+    assert pool.run('test/resources/report.pdf')['isbn']['value'] == '9788217022985'
+    assert pool.idle.queue[0].process.is_alive()
+    pool.close()
+
+
+def test_service_data_is_loaded_before_workers_fork():
+    pool = WorkerPool(size=1, create_meteor=meteor_from_preloaded_data)
+    try:
+        assert pool.run('test/resources/report.pdf')['isbn']['value'] == '9788217022985'
+    finally:
+        pool.close()